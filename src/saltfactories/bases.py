@@ -24,6 +24,7 @@ from pytestshellutils.utils.processes import ProcessResult
 from pytestshellutils.utils.processes import terminate_process
 
 from saltfactories.utils import running_username
+from saltfactories.utils.events import DaemonHeartbeatLostError
 
 log = logging.getLogger(__name__)
 
@@ -541,9 +542,34 @@ class SaltDaemon(SaltMixin, Daemon):
 
         # Register before start function
         self.before_start(self._set_started_at)
+        if self.event_listener is not None:
+            # Heartbeats from a previous run of the daemon must not fail the start checks
+            self.before_start(self.event_listener.forget_heartbeat, self.id)
+            self.after_terminate(self.event_listener.forget_heartbeat, self.id)
         # Register start check function
         self.start_check(self._check_start_events)
 
+    def get_log_records(self):
+        """
+        Return, and remove, the log records buffered by the log server for this daemon.
+
+        The log server only buffers log records when salt-factories runs with
+        ``--log-server-buffer-size``, otherwise, an empty list is returned.
+        """
+        log_server = getattr(self.factories_manager, "log_server", None)
+        if log_server is None:
+            return []
+        return log_server.get_log_records(daemon_id=self.id)
+
+    def flush_log_records(self):
+        """
+        Inject the log records buffered by the log server for this daemon into the logging machinery.
+
+        This allows asserting against them using PyTest's :fixture:`caplog fixture <pytest:caplog>`.
+        """
+        for record in self.get_log_records():
+            logging.getLogger(record.name).handle(record)
+
     def _get_impl_class(self):
         if self.system_service:
             return SystemdSaltDaemonImpl
@@ -702,14 +728,18 @@ class SaltDaemon(SaltMixin, Daemon):
                 raise FactoryNotStarted(msg)
             if not check_events:
                 break
-            check_events -= {
-                (event.daemon_id, event.tag)
-                for event in self.event_listener.get_events(
-                    check_events, after_time=self._started_at
+            # The event listener wakes us up as soon as the events arrive. We just don't wait
+            # for too long at once so that we also notice if the daemon stops running.
+            try:
+                matched_events = self.event_listener.wait_for_events(
+                    check_events,
+                    after_time=self._started_at,
+                    timeout=max(min(1.5, timeout_at - time.time()), 0),
                 )
-            }
-            if check_events:
-                time.sleep(1.5)
+            except DaemonHeartbeatLostError as exc:
+                msg = f"{self} is no longer running"
+                raise FactoryNotStarted(msg) from exc
+            check_events = set(matched_events.missed)
         else:
             log.error(
                 "Failed to check events after %1.2f seconds for %s. Remaining events to check: %s",
@@ -45,6 +45,12 @@ class FactoriesManager:
             The hostname/ip address of the host running the logs server. Defaults to "localhost".
 
     Keyword Arguments:
+        log_server_control_port:
+            The port where the log server publishes the log level the daemons should forward log
+            records at. When ``None``, the daemons keep the log level they were configured with.
+        log_server:
+            The :py:class:`~saltfactories.plugins.log_server.LogServer` receiving the daemons' log
+            records, if any.
         python_executable:
             The python executable to use, where needed.
             If ``scripts_dir`` is not ``None``, then ``python_executable`` will default to
@@ -87,6 +93,7 @@ class FactoriesManager:
     log_server_port = attr.ib()
     log_server_level = attr.ib()
     log_server_host = attr.ib()
+    log_server_control_port = attr.ib(default=None)
     python_executable = attr.ib(default=None)
     scripts_dir = attr.ib(default=None, converter=cast_to_pathlib_path)
     code_dir = attr.ib(default=None)
@@ -100,6 +107,7 @@ class FactoriesManager:
     stats_processes = attr.ib(repr=False, default=None)
     system_service = attr.ib(repr=False, default=False)
     event_listener = attr.ib(repr=False)
+    log_server = attr.ib(repr=False, default=None)
 
     # Internal attributes
     tmp_root_dir = attr.ib(init=False)
@@ -139,6 +147,8 @@ class FactoriesManager:
         if self.python_executable is None and self.generate_scripts:
             self.python_executable = sys.executable
 
+        self.event_listener.start_unix_server(self.tmp_root_dir / "event-listener.sock")
+
         log.warning(self)
 
     @staticmethod
@@ -170,6 +180,10 @@ class FactoriesManager:
             event_listener_host = "127.0.0.1"
         returner_address_config.setdefault("host", event_listener_host)
         returner_address_config.setdefault("port", self.event_listener.port)
+        if self.event_listener.unix_socket_path is not None:
+            returner_address_config.setdefault("path", str(self.event_listener.unix_socket_path))
+        if self.event_listener.worker_id is not None:
+            returner_address_config.setdefault("worker_id", self.event_listener.worker_id)
         self.final_common_config_tweaks(config, "minion")
 
     def final_master_config_tweaks(self, config):
@@ -187,6 +201,10 @@ class FactoriesManager:
             event_listener_host = "127.0.0.1"
         returner_address_config.setdefault("host", event_listener_host)
         returner_address_config.setdefault("port", self.event_listener.port)
+        if self.event_listener.unix_socket_path is not None:
+            returner_address_config.setdefault("path", str(self.event_listener.unix_socket_path))
+        if self.event_listener.worker_id is not None:
+            returner_address_config.setdefault("worker_id", self.event_listener.worker_id)
         self.final_common_config_tweaks(config, "master")
 
     def final_syndic_config_tweaks(self, config):
@@ -245,6 +263,13 @@ class FactoriesManager:
         log_config.setdefault("host", self.log_server_host)
         log_config.setdefault("port", self.log_server_port)
         log_config.setdefault("level", "debug")
+        if self.log_server_control_port is not None:
+            log_config.setdefault("control_port", self.log_server_control_port)
+        if self.log_server is not None and self.log_server.broker_address is not None:
+            # Tells the broker log server to only publish the daemon log records to this worker
+            log_config.setdefault("worker_id", self.log_server.consumer_id)
+        if self.log_server is not None and self.log_server.defer_formatting:
+            log_config.setdefault("defer_formatting", True)
 
     def salt_master_daemon(
         self,
@@ -3,527 +3,217 @@ Salt Factories Event Listener.
 
 A salt events store for all daemons started by salt-factories
 """
-import asyncio
-import copy
-import fnmatch
 import logging
-import threading
-import weakref
-from collections import deque
-from datetime import datetime
-from datetime import timedelta
-from datetime import timezone
 
 import attr
-import msgpack.exceptions
 import pytest
-from pytestshellutils.utils import ports
-from pytestshellutils.utils import time
-from pytestskipmarkers.utils import platform
 
-log = logging.getLogger(__name__)
-
-
-def _convert_stamp(stamp):
-    try:
-        return datetime.fromisoformat(stamp).replace(tzinfo=timezone.utc)
-    except AttributeError:  # pragma: no cover
-        # Python < 3.7
-        return datetime.strptime(stamp, "%Y-%m-%dT%H:%M:%S.%f").replace(tzinfo=timezone.utc)
-
-
-@attr.s(kw_only=True, slots=True, hash=True, frozen=True)
-class Event:
-    """
-    Event wrapper class.
-
-    The ``Event`` class is a container for a salt event which will live on the
-    :py:class:`~saltfactories.plugins.event_listener.EventListener` store.
-
-    :keyword str daemon_id:
-        The daemon ID which received this event.
-    :keyword str tag:
-        The event tag of the event.
-    :keyword ~datetime.datetime stamp:
-        When the event occurred
-    :keyword dict data:
-        The event payload, filtered of all of Salt's private keys like ``_stamp`` which prevents proper
-        assertions against it.
-    :keyword dict full_data:
-        The full event payload, as received by the daemon, including all of Salt's private keys.
-    :keyword int,float expire_seconds:
-        The time, in seconds, after which the event should be considered as expired and removed from the store.
-    """
+from saltfactories.utils import get_xdist_broker_role
+from saltfactories.utils.event_journal import EventJournal
+from saltfactories.utils.event_listener import EventListener
+from saltfactories.utils.events import DaemonHeartbeatLostError
+from saltfactories.utils.events import Event
+from saltfactories.utils.events import EventStore
+from saltfactories.utils.events import EventSubscription
+from saltfactories.utils.events import MatchedEvents
+
+__all__ = [
+    "DaemonHeartbeatLostError",
+    "Event",
+    "EventJournal",
+    "EventListener",
+    "EventStore",
+    "EventSubscription",
+    "MatchedEvents",
+    "event_listener",
+    "pytest_addoption",
+    "pytest_configure",
+    "pytest_configure_node",
+    "pytest_terminal_summary",
+    "pytest_unconfigure",
+]
 
-    daemon_id = attr.ib()
-    tag = attr.ib()
-    stamp = attr.ib(converter=_convert_stamp)
-    data = attr.ib(hash=False)
-    full_data = attr.ib(hash=False)
-    expire_seconds = attr.ib(hash=False)
-    _expire_at = attr.ib(init=False, hash=False)
-
-    @_expire_at.default
-    def _set_expire_at(self):
-        return self.stamp + timedelta(seconds=self.expire_seconds)
+log = logging.getLogger(__name__)
 
-    @property
-    def expired(self):
-        """
-        Property to identify if the event has expired, at which time it should be removed from the store.
-        """
-        if datetime.now(tz=timezone.utc) < self._expire_at:
-            return False
-        return True
+_EVENT_LISTENER_KEY = pytest.StashKey["EventListener"]()
 
 
-@attr.s(kw_only=True, slots=True, hash=True, frozen=True)
-class MatchedEvents:
+@attr.s(slots=True, eq=False)
+class _EventListenerTestTracker:
     """
-    MatchedEvents implementation.
-
-    The ``MatchedEvents`` class is a container which is returned by
-    :py:func:`~saltfactories.plugins.event_listener.EventListener.wait_for_events`.
-
-    :keyword set matches:
-        A :py:class:`set` of :py:class:`~saltfactories.plugins.event_listener.Event` instances that matched.
-    :keyword set missed:
-        A :py:class:`set` of :py:class:`~saltfactories.plugins.event_listener.Event` instances that remained
-        unmatched.
-
-    One can also easily iterate through all matched events of this class:
+    Let the event listener know which test is running.
 
-    .. code-block:: python
-
-        matched_events = MatchedEvents(..., ...)
-        for event in matched_events:
-            print(event.tag)
+    Pytest keeps track of the plugins in sets, they must hash by identity.
     """
 
-    matches = attr.ib()
-    missed = attr.ib()
+    config = attr.ib()
+    nodeid = attr.ib(default=None)
 
-    @property
-    def found_all_events(self):
+    def pytest_runtest_logstart(self, nodeid):
         """
-        :return bool: :py:class:`True` if all events were matched, or :py:class:`False` otherwise.
+        Tag the events received from now on with the test node ID.
         """
-        return (not self.missed) is True
+        self.nodeid = nodeid
+        listener = self.config.stash.get(_EVENT_LISTENER_KEY, None)
+        if listener is not None:
+            listener.start_test(nodeid)
 
-    def __iter__(self):
+    def pytest_runtest_logfinish(self, nodeid):
         """
-        Iterate through the matched events.
+        Release the events received while the test was running.
         """
-        return iter(self.matches)
+        self.nodeid = None
+        listener = self.config.stash.get(_EVENT_LISTENER_KEY, None)
+        if listener is not None:
+            listener.finish_test(nodeid)
 
 
-class EventListenerServer(asyncio.Protocol):
+def pytest_addoption(parser):
+    """
+    Register argparse-style options and ini-style config values.
+    """
+    group = parser.getgroup("Salt Factories")
+    group.addoption(
+        "--event-listener-drop-tag",
+        dest="event_listener_drop_tags",
+        action="append",
+        default=[],
+        help=(
+            "Event tag pattern which the salt daemons started by salt-factories can drop "
+            "instead of forwarding it to the event listener, unless a test is waiting for it. "
+            "Can be passed multiple times."
+        ),
+    )
+    group.addoption(
+        "--event-listener-unix-socket",
+        default=False,
+        action="store_true",
+        help=(
+            "Forward the events of the salt daemons started by salt-factories over a unix "
+            "socket, created under the factories root directory, instead of TCP. Daemons "
+            "which cannot reach the unix socket, like the ones running in containers, still "
+            "forward their events over TCP."
+        ),
+    )
+    group.addoption(
+        "--salt-factories-broker",
+        default=False,
+        action="store_true",
+        help=(
+            "When distributing the tests with pytest-xdist, run a single event listener and a "
+            "single log server on the controller process, which the workers subscribe to, "
+            "instead of one of each per worker."
+        ),
+    )
+    group.addoption(
+        "--event-listener-keep-test-events",
+        default=False,
+        action="store_true",
+        help=(
+            "Keep the events received while a test was running on the event listener store, "
+            "until they expire, instead of removing them once the test finishes."
+        ),
+    )
+    group.addoption(
+        "--event-listener-stats",
+        default=False,
+        action="store_true",
+        help="Show the event listener throughput and latency metrics in the terminal summary.",
+    )
+    group.addoption(
+        "--event-listener-journal",
+        default=None,
+        help=(
+            "Path to a file where all the events received by the event listener are appended, "
+            "along with an index file, for post-mortem analysis."
+        ),
+    )
+
+
+def pytest_configure(config):
     """
-    TCP Server to receive events forwarded.
+    Register the event listener test tracker and, on the pytest-xdist controller, start the broker.
     """
+    config.pluginmanager.register(
+        _EventListenerTestTracker(config), "saltfactories-event-listener-test-tracker"
+    )
+    if get_xdist_broker_role(config) == "controller":
+        listener = EventListener(
+            drop_tags=config.getoption("event_listener_drop_tags"),
+            journal_path=config.getoption("--event-listener-journal"),
+            broker=True,
+        )
+        listener.start()
+        config.stash[_EVENT_LISTENER_KEY] = listener
 
-    def __init__(self, _event_listener, *args, **kwargs) -> None:
-        self._event_listener = _event_listener
-        super().__init__(*args, **kwargs)
 
-    def connection_made(self, transport):
-        """
-        Connection established.
-        """
-        peername = transport.get_extra_info("peername")
-        log.debug("Connection from %s", peername)
-        # pylint: disable=attribute-defined-outside-init
-        self.transport = transport
-        self.unpacker = msgpack.Unpacker(raw=False, strict_map_key=False)
-        # pylint: enable=attribute-defined-outside-init
-
-    def data_received(self, data):
-        """
-        Received data.
-        """
-        try:
-            self.unpacker.feed(data)
-        except msgpack.exceptions.BufferFull:
-            # Start over loosing some data?!
-            self.unpacker = msgpack.Unpacker(  # pylint: disable=attribute-defined-outside-init
-                raw=False,
-                strict_map_key=False,
-            )
-            self.unpacker.feed(data)
-        for payload in self.unpacker:
-            if payload is None:
-                self.transport.close()
-                break
-            self._event_listener._process_event_payload(payload)  # noqa: SLF001
+def pytest_unconfigure(config):
+    """
+    Stop the broker event listener, if running.
+    """
+    listener = config.stash.get(_EVENT_LISTENER_KEY, None)
+    if listener is not None and listener.broker:
+        listener.stop()
 
 
-@attr.s(kw_only=True, slots=True, hash=False)
-class EventListener:
+@pytest.hookimpl(optionalhook=True)
+def pytest_configure_node(node):
     """
-    EventListener implementation.
+    Pass the broker event listener address to the pytest-xdist workers.
+    """
+    listener = node.config.stash.get(_EVENT_LISTENER_KEY, None)
+    if listener is not None and listener.broker:
+        node.workerinput["saltfactories_event_listener"] = ["127.0.0.1", listener.port]
 
-    The ``EventListener`` is a service started by salt-factories which receives all the events of all the
-    salt masters that it starts. The service runs throughout the whole pytest session.
 
-    :keyword int timeout:
-        How long, in seconds, should a forwarded event stay in the store, after which, it will be deleted.
+def pytest_terminal_summary(terminalreporter, config):
     """
-
-    timeout = attr.ib(default=120)
-    host = attr.ib(init=False, repr=False)
-    port = attr.ib(init=False, repr=False)
-    address = attr.ib(init=False)
-    store = attr.ib(init=False, repr=False, hash=False)
-    running_event = attr.ib(init=False, repr=False, hash=False)
-    running_thread = attr.ib(init=False, repr=False, hash=False)
-    cleanup_thread = attr.ib(init=False, repr=False, hash=False)
-    auth_event_handlers = attr.ib(init=False, repr=False, hash=False)
-    server = attr.ib(init=False, repr=False, hash=False)
-    server_running_event = attr.ib(init=False, repr=False, hash=False)
-
-    @host.default
-    def _default_host(self):
-        if platform.is_windows():
-            # Windows cannot bind to 0.0.0.0
-            return "127.0.0.1"
-        return "0.0.0.0"  # noqa: S104
-
-    @port.default
-    def _default_port(self):
-        return ports.get_unused_localhost_port()
-
-    @address.default
-    def _default_address(self):
-        return f"tcp://{self.host}:{self.port}"
-
-    def __attrs_post_init__(self):
-        """
-        Post attrs initialization routines.
-        """
-        self.store = deque(maxlen=10000)
-        self.running_event = threading.Event()
-        self.cleanup_thread = threading.Thread(target=self._cleanup)
-        self.auth_event_handlers = weakref.WeakValueDictionary()
-        self.server_running_event = threading.Event()
-        self.server = None
-        self.running_thread = None
-
-    def start_server(self):
-        """
-        Start the TCP server.
-        """
-        if self.server_running_event.is_set():
-            return
-        if self.running_thread:
-            # If this attribute is set it means something happened to make
-            # the server crash. Let's join the thread to restart it all.
-            self.running_thread.join()
-            self.running_thread = None
-            log.info("%s server is re-starting", self)
-        else:
-            log.info("%s server is starting", self)
-        self.running_thread = threading.Thread(target=self._run_loop_in_thread)
-        self.running_thread.start()
-
-    def _run_loop_in_thread(self):
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            loop.run_until_complete(self._run_server())
-        except Exception:  # pylint: disable=broad-except
-            self.server_running_event.clear()
-            log.exception("%s: Exception raised while the running the server", self)
-        finally:
-            log.debug("shutdown asyncgens")
-            loop.run_until_complete(loop.shutdown_asyncgens())
-            log.debug("loop close")
-            loop.close()
-
-    async def _run_server(self):
-        loop = asyncio.get_running_loop()
-        if self.server:
-            self.server.close()
-            await self.server.wait_closed()
-            self.server = None
-        self.server = await loop.create_server(
-            lambda: EventListenerServer(self),
-            self.host,
-            self.port,
-            start_serving=False,
+    Report the events which the salt daemons failed to forward in time and the event listener metrics.
+    """
+    listener = config.stash.get(_EVENT_LISTENER_KEY, None)
+    if listener is None:
+        return
+    if listener.forward_gaps:
+        terminalreporter.section("Salt Factories Event Forwarding Gaps")
+        terminalreporter.line(
+            "Some daemons reconnected to the event listener after more events were lost than "
+            "they keep around to forward again. Consider tuning the 'replay_buffer' setting of "
+            "the 'engine' section in their 'pytest-<role>' configuration."
         )
-        try:
-            async with self.server:
-                loop.call_soon(self.server_running_event.set)
-                log.debug("%s server is starting", self)
-                await self.server.start_serving()
-                while self.server_running_event.is_set():
-                    await asyncio.sleep(1)
-        finally:
-            if self.server:
-                self.server.close()
-                log.debug("%s server await server close", self)
-                await self.server.wait_closed()
-                log.debug("%s server stoppped", self)
-                self.server = None
-
-    def _process_event_payload(self, decoded):
-        try:
-            daemon_id = decoded["id"]
-            tag = decoded["tag"]
-            data = decoded["data"]
-            # Salt's event data has some "private" keys, for example, "_stamp" which
-            # get in the way of direct assertions.
-            # We'll just store a full_data attribute and clean up the regular data of these keys
-            full_data = copy.deepcopy(data)
-            for key in list(data):
-                if key.startswith("_"):
-                    data.pop(key)
-            event = Event(
-                daemon_id=daemon_id,
-                tag=tag,
-                stamp=full_data["_stamp"],
-                data=data,
-                full_data=full_data,
-                expire_seconds=self.timeout,
-            )
-            log.info("%s received event: %s", self, event)
-            self.store.append(event)
-            if tag == "salt/auth":
-                auth_event_callback = self.auth_event_handlers.get(daemon_id)
-                if auth_event_callback:
-                    try:
-                        auth_event_callback(data)
-                    except Exception:  # pragma: no cover pylint: disable=broad-except
-                        log.exception(
-                            "%s Error calling %r",
-                            self,
-                            auth_event_callback,
-                        )
-            log.debug(
-                "%s store(id: %s) size after event received: %d",
-                self,
-                id(self.store),
-                len(self.store),
-            )
-        except Exception:  # pragma: no cover pylint: disable=broad-except
-            log.exception("%s Something funky happened", self)
-
-    def _cleanup(self):
-        cleanup_at = time.time() + 30
-        while self.running_event.is_set():
-            if time.time() < cleanup_at:
-                time.sleep(1)
-                continue
-
-            # Reset cleanup time
-            cleanup_at = time.time() + 30
-
-            # Cleanup expired events
-            to_remove = []
-            for event in self.store:
-                if event.expired:
-                    to_remove.append(event)
-
-            for event in to_remove:
-                log.debug("%s Removing from event store: %s", self, event)
-                self.store.remove(event)
-            log.debug("%s store size after cleanup: %s", self, len(self.store))
-
-    def __enter__(self):
-        """
-        Context manager support to start the event listener.
-        """
-        self.start()
-        return self
-
-    def __exit__(self, *_):
-        """
-        Context manager support to stop the event listener.
-        """
-        self.stop()
-
-    def start(self):
-        """
-        Start the event listener.
-        """
-        if self.running_event.is_set():  # pragma: no cover
-            return
-        log.debug("%s is starting", self)
-        self.running_event.set()
-        self.start_server()
-        # Wait for the thread to start
-        if self.server_running_event.wait(5) is not True:
-            self.server_running_event.clear()
-            msg = "Failed to start the event listener"
-            raise RuntimeError(msg)
-        log.debug("%s is started", self)
-        self.cleanup_thread.start()
-
-    def stop(self):
-        """
-        Stop the event listener.
-        """
-        if self.running_event.is_set() is False:  # pragma: no cover
-            return
-        log.debug("%s is stopping", self)
-        self.store.clear()
-        self.auth_event_handlers.clear()
-        self.running_event.clear()
-        self.server_running_event.clear()
-        log.debug("%s Joining running thread...", self)
-        self.running_thread.join(7)
-        if self.running_thread.is_alive():  # pragma: no cover
-            log.debug("%s The running thread is still alive. Waiting a little longer...", self)
-            self.running_thread.join(5)
-            if self.running_thread.is_alive():
-                log.debug(
-                    "%s The running thread is still alive. Exiting anyway and let GC take care of it",
-                    self,
-                )
-        log.debug("%s Joining cleanup thread...", self)
-        self.cleanup_thread.join(7)
-        if self.cleanup_thread.is_alive():  # pragma: no cover
-            log.debug("%s The cleanup thread is still alive. Waiting a little longer...", self)
-            self.cleanup_thread.join(5)
-            if self.cleanup_thread.is_alive():
-                log.debug(
-                    "%s The cleanup thread is still alive. Exiting anyway and let GC take care of it",
-                    self,
-                )
-        log.debug("%s stopped", self)
-
-    def get_events(self, patterns, after_time=None):
-        """
-        Get events from the internal store.
-
-        :param ~collections.abc.Sequence pattern:
-            An iterable of tuples in the form of ``("<daemon-id>", "<event-tag-pattern>")``, ie, which daemon ID
-            we're targeting and the event tag pattern which will be passed to :py:func:`~fnmatch.fnmatch` to
-            assert a match.
-        :keyword ~datetime.datetime,float after_time:
-            After which time to start matching events.
-        :return set: A set of matched events
-        """
-        if after_time is None:
-            after_time = datetime.now(tz=timezone.utc)
-        elif isinstance(after_time, float):
-            after_time = datetime.fromtimestamp(after_time, tz=timezone.utc)
-        after_time_iso = after_time.isoformat()
-        log.debug(
-            "%s is checking for event patterns happening after %s: %s",
-            self,
-            after_time_iso,
-            set(patterns),
+        for daemon_id, missed in sorted(listener.forward_gaps.items()):
+            terminalreporter.line(f"  {daemon_id}: {missed} events missed")
+    if listener.forward_stats:
+        terminalreporter.section("Salt Factories Event Forwarding")
+        terminalreporter.line(
+            "Some daemons queued events faster than they could forward them. Consider tuning "
+            "the 'queue_capacity' and 'overflow' settings of the 'engine' section in their "
+            "'pytest-<role>' configuration."
         )
-        found_events = set()
-        patterns = set(patterns)
-        for event in copy.copy(self.store):
-            if event.expired:
-                # Too old, carry on
-                continue
-            if event.stamp < after_time:
-                continue
-            for pattern in set(patterns):
-                _daemon_id, _pattern = pattern
-                if event.daemon_id != _daemon_id:
-                    continue
-                if fnmatch.fnmatch(event.tag, _pattern):
-                    log.debug("%s Found matching pattern: %s", self, pattern)
-                    found_events.add(event)
-        if found_events:
-            log.debug(
-                "%s found the following patterns happening after %s: %s",
-                self,
-                after_time_iso,
-                found_events,
+        for daemon_id, stats in sorted(listener.forward_stats.items()):
+            terminalreporter.line(
+                f"  {daemon_id}: {stats['dropped']} dropped, {stats['spilled']} spilled "
+                f"(capacity: {stats['capacity']}, overflow: {stats['overflow']})"
             )
-        else:
-            log.debug(
-                "%s did not find any matching event patterns happening after %s",
-                self,
-                after_time_iso,
+    if config.getoption("--event-listener-stats"):
+        stats = listener.stats()
+        terminalreporter.section("Salt Factories Event Listener Stats")
+        terminalreporter.line("  Events received:")
+        for daemon_id, events in stats["events"].items():
+            terminalreporter.line(f"    {daemon_id}: {events['count']} ({events['rate']:.2f}/s)")
+        for key, title in (("latency", "Event latency"), ("waiter_blocked", "Waiters blocked")):
+            histogram = stats[key]
+            terminalreporter.line(
+                f"  {title}: {histogram['count']} samples, mean {histogram['mean']:.4f}s, "
+                f"p50 <= {histogram['p50']}s, p99 <= {histogram['p99']}s, max {histogram['max']:.4f}s"
             )
-        return found_events
-
-    def wait_for_events(self, patterns, timeout=30, after_time=None):
-        """
-        Wait for a set of patterns to match or until timeout is reached.
-
-        :param ~collections.abc.Sequence pattern:
-            An iterable of tuples in the form of ``("<daemon-id>", "<event-tag-pattern>")``, ie, which daemon ID
-            we're targeting and the event tag pattern which will be passed to :py:func:`~fnmatch.fnmatch` to
-            assert a match.
-        :keyword int,float timeout:
-            The amount of time to wait for the events, in seconds.
-        :keyword ~datetime.datetime,float after_time:
-            After which time to start matching events.
-
-        :return:
-            An instance of :py:class:`~saltfactories.plugins.event_listener.MatchedEvents`.
-        :rtype ~saltfactories.plugins.event_listener.MatchedEvents:
-        """
-        if after_time is None:
-            after_time = datetime.now(tz=timezone.utc)
-        elif isinstance(after_time, float):
-            after_time = datetime.fromtimestamp(after_time, tz=timezone.utc)
-        after_time_iso = after_time.isoformat()
-        log.debug(
-            "%s is waiting for event patterns happening after %s: %s",
-            self,
-            after_time_iso,
-            set(patterns),
+        terminalreporter.line(
+            f"  Store: {stats['store']['size']} events, {stats['store']['bytes']} bytes. "
+            f"Waiters: {stats['waiters']}"
         )
-        found_events = set()
-        patterns = set(patterns)
-        timeout_at = time.time() + timeout
-        while True:
-            if not patterns:
-                return True
-            for event in copy.copy(self.store):
-                if event.expired:
-                    # Too old, carry on
-                    continue
-                if event.stamp < after_time:
-                    continue
-                for pattern in set(patterns):
-                    _daemon_id, _pattern = pattern
-                    if event.daemon_id != _daemon_id:
-                        continue
-                    if fnmatch.fnmatch(event.tag, _pattern):
-                        log.debug("%s Found matching pattern: %s", self, pattern)
-                        found_events.add(event)
-                        patterns.remove((event.daemon_id, _pattern))
-            if not patterns:
-                break
-            if time.time() > timeout_at:
-                break
-            time.sleep(0.5)
-        return MatchedEvents(matches=found_events, missed=patterns)
-
-    def register_auth_event_handler(self, master_id, callback):
-        """
-        Register a callback to run for every authentication event, to accept or reject the minion authenticating.
-
-        :param str master_id:
-            The master ID for which the callback should run
-        :type callback: ~collections.abc.Callable
-        :param callback:
-            The function while should be called
-        """
-        self.auth_event_handlers[master_id] = callback
-
-    def unregister_auth_event_handler(self, master_id):
-        """
-        Un-register the authentication event callback, if any, for the provided master ID.
-
-        :param str master_id:
-            The master ID for which the callback is registered
-        """
-        self.auth_event_handlers.pop(master_id, None)
 
 
 @pytest.fixture(scope="session")
-def event_listener():
+def event_listener(request):
     """
     Event listener session scoped fixture.
 
@@ -564,7 +254,26 @@ def event_listener():
                 assert event.data["cmd"] == "_minion_event"
                 assert "event.fire" in event.data["data"]
     """
-    with EventListener() as _event_listener:
+    broker_address = getattr(request.config, "workerinput", {}).get("saltfactories_event_listener")
+    journal_path = None
+    if broker_address is None:
+        # When subscribed to a broker, the broker writes the journal
+        journal_path = request.config.getoption("--event-listener-journal")
+    with EventListener(
+        drop_tags=request.config.getoption("event_listener_drop_tags"),
+        unix_socket=request.config.getoption("--event-listener-unix-socket"),
+        journal_path=journal_path,
+        release_test_events=not request.config.getoption("--event-listener-keep-test-events"),
+        broker_address=broker_address,
+        worker_id=request.config.workerinput["workerid"] if broker_address is not None else None,
+    ) as _event_listener:
+        request.config.stash[_EVENT_LISTENER_KEY] = _event_listener
+        test_tracker = request.config.pluginmanager.get_plugin(
+            "saltfactories-event-listener-test-tracker"
+        )
+        if test_tracker is not None and test_tracker.nodeid is not None:
+            # The event listener is only instantiated while setting up the first test using it
+            _event_listener.start_test(test_tracker.nodeid)
         yield _event_listener
 
 
@@ -29,6 +29,7 @@ def _salt_factories_config(request):  # noqa: PT005
         "log_server_host": log_server.log_host,
         "log_server_port": log_server.log_port,
         "log_server_level": log_server.log_level,
+        "log_server_control_port": log_server.control_port,
         "system_service": (
             request.config.getoption("--system-service")
             or os.environ.get("SALT_FACTORIES_SYSTEM_SERVICE", "0") == "1"
@@ -74,6 +75,7 @@ def salt_factories_default_root_dir():
 
 @pytest.fixture(scope="session")
 def salt_factories(
+    request,
     event_listener,
     stats_processes,
     salt_factories_default_root_dir,  # pylint: disable=redefined-outer-name
@@ -103,7 +105,10 @@ def salt_factories(
         pprint.pformat(factories_config),
     )
     return FactoriesManager(
-        stats_processes=stats_processes, event_listener=event_listener, **factories_config
+        stats_processes=stats_processes,
+        event_listener=event_listener,
+        log_server=request.config.pluginmanager.get_plugin("saltfactories-log-server"),
+        **factories_config,
     )
 
 
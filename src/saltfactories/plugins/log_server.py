@@ -23,8 +23,11 @@ As an example:
             assert record.levelname != "CRITICAL"
         assert "wally" not in caplog.text
 """
+import contextlib
 import logging
+import queue
 import threading
+from collections import deque
 
 import attr
 import msgpack
@@ -34,25 +37,85 @@ from pytestshellutils.utils import ports
 from pytestshellutils.utils import time
 from pytestskipmarkers.utils import platform
 
+from saltfactories.utils import get_xdist_broker_role
+
 log = logging.getLogger(__name__)
 
+# Tells the log server to stop processing log records
+_STOP_SENTINEL = msgpack.dumps(None)
+# First frame of the messages requesting a log level from the log server
+_LOG_LEVEL_FRAME = b"log-level"
+# First frame of the log record batches meant for a pytest-xdist worker, same as the log handler's
+_TOPIC_PREFIX = b"topic:"
+# The topic the broker publishes the log records meant for all the workers to
+_BROADCAST_TOPIC = _TOPIC_PREFIX + b"*/"
+
+
+def _get_topic(worker_id):
+    # The trailing slash keeps the gw1 subscription from matching the gw10 topic
+    return _TOPIC_PREFIX + worker_id.encode() + b"/"
+
 
 @attr.s(kw_only=True, slots=True, hash=True)
 class LogServer:
     """
     Log server plugin.
+
+    When running the tests with pytest-xdist and ``--salt-factories-broker``, the controller
+    process runs the only log server receiving log records, with ``broker=True``, and publishes
+    them to the workers. The workers' log servers, created with the controller's
+    ``broker_address``, subscribe to those records instead of binding their own ports. The log
+    records of the salt daemons started by a worker, whose log handler was passed the worker's
+    ``consumer_id`` as ``worker_id``, are only published to that worker, the log records of the
+    other salt daemons are published to all of them.
+
+    Every time the log server wakes up, it drains all the log records waiting to be received,
+    up to ``max_batch_size`` of them, and decodes them in one go. With ``dispatch_thread=True``,
+    the decoded log records are handed to a separate thread to be injected into the logging
+    machinery, so that receiving log records doesn't wait on the logging handlers.
+
+    With ``log_level_pushdown=True``, the log server which binds ``log_port`` also publishes, on
+    ``control_port``, the lowest log level requested by its consumers through
+    :py:meth:`~LogServer.set_log_level`. The salt daemons' log handlers subscribe to it and drop the
+    log records below that level before serializing them. Until a log level is requested, they keep
+    the log level they were configured with.
+
+    With a ``buffer_size``, the log records of each salt daemon are kept, up to ``buffer_size`` of
+    them, instead of being injected into the logging machinery as they arrive. The buffers are
+    cleared when each test starts and, when a test fails, their log records are added to its report.
+    See :py:meth:`~saltfactories.bases.SaltDaemon.get_log_records` and
+    :py:meth:`~saltfactories.bases.SaltDaemon.flush_log_records` to access them from a test.
+
+    With ``defer_formatting=True``, the salt daemons send their log records unformatted, whenever
+    possible, leaving the formatting to the logging handlers which accept them.
     """
 
+    broker = attr.ib(default=False)
+    broker_address = attr.ib(default=None)
     log_host = attr.ib()
     log_port = attr.ib()
     log_level = attr.ib()
     socket_hwm = attr.ib()
+    publish_port = attr.ib()
+    log_level_pushdown = attr.ib(default=False)
+    control_port = attr.ib()
+    consumer_id = attr.ib(default="main")
+    max_batch_size = attr.ib(default=10000)
+    dispatch_thread = attr.ib(default=False)
+    buffer_size = attr.ib(default=None)
+    defer_formatting = attr.ib(default=False)
     running_event = attr.ib(init=False, repr=False, hash=False)
     sentinel_event = attr.ib(init=False, repr=False, hash=False)
     process_queue_thread = attr.ib(init=False, repr=False, hash=False)
+    dispatch_queue = attr.ib(init=False, repr=False, hash=False, default=None)
+    consumer_log_levels = attr.ib(init=False, repr=False, hash=False, factory=dict)
+    log_buffers = attr.ib(init=False, repr=False, hash=False, factory=dict)
+    log_buffers_lock = attr.ib(init=False, repr=False, hash=False, factory=threading.Lock)
 
     @log_host.default
     def _default_log_host(self):
+        if self.broker_address is not None:
+            return self.broker_address[0]
         if platform.is_windows():
             # Windows cannot bind to 0.0.0.0
             return "127.0.0.1"
@@ -60,8 +123,26 @@ class LogServer:
 
     @log_port.default
     def _default_log_port(self):
+        if self.broker_address is not None:
+            return self.broker_address[1]
         return ports.get_unused_localhost_port()
 
+    @publish_port.default
+    def _default_publish_port(self):
+        if self.broker_address is not None:
+            return self.broker_address[2]
+        if self.broker:
+            return ports.get_unused_localhost_port()
+        return None
+
+    @control_port.default
+    def _default_control_port(self):
+        if self.broker_address is not None:
+            return self.broker_address[3]
+        if self.log_level_pushdown:
+            return ports.get_unused_localhost_port()
+        return None
+
     @socket_hwm.default
     def _default_socket_hwm(self):
         # ~1MB
@@ -88,21 +169,9 @@ class LogServer:
         Stop the log server.
         """
         log.info("%s stopping...", self)
-        address = f"tcp://{self.log_host}:{self.log_port}"
-        context = zmq.Context()
-        sender = context.socket(zmq.PUSH)  # pylint: disable=no-member
-        sender.connect(address)
-        try:
-            sender.send(msgpack.dumps(None))
-            log.debug("%s Sent sentinel to trigger log server shutdown", self)
-            if self.sentinel_event.wait(5) is not True:  # pragma: no cover
-                log.warning(
-                    "%s Failed to wait for the reception of the stop sentinel message. Stopping anyway.",
-                    self,
-                )
-        finally:
-            sender.close(1000)
-            context.term()
+        if self.broker_address is None:
+            # Subscribers must not stop the broker's log server
+            self._send_stop_sentinel()
 
         # Clear the running even, the log process thread know it should stop
         self.running_event.clear()
@@ -120,40 +189,147 @@ class LogServer:
             else:
                 log.warning("%s The logging server thread is still running...", self)
 
-    def process_logs(self):  # noqa: PLR0915
+    def get_log_records(self, daemon_id=None):
         """
-        Process the logs returned.
+        Return, and remove, the log records buffered for the ``daemon_id`` salt daemon, or all of them.
+        """
+        with self.log_buffers_lock:
+            if daemon_id is None:
+                record_dicts = [
+                    record_dict for buffer in self.log_buffers.values() for record_dict in buffer
+                ]
+                self.log_buffers.clear()
+            else:
+                record_dicts = list(self.log_buffers.pop(daemon_id, ()))
+        return [logging.makeLogRecord(record_dict) for record_dict in record_dicts]
+
+    def flush_log_records(self, daemon_id=None):
+        """
+        Inject the log records buffered for the ``daemon_id`` salt daemon, or all of them, into the logging machinery.
+
+        This allows asserting against them using PyTest's :fixture:`caplog fixture <pytest:caplog>`.
+        """
+        for record in self.get_log_records(daemon_id=daemon_id):
+            logging.getLogger(record.name).handle(record)
+
+    def clear_log_records(self):
         """
+        Drop all the buffered log records.
+        """
+        with self.log_buffers_lock:
+            self.log_buffers.clear()
+
+    def set_log_level(self, level):
+        """
+        Request the salt daemons to forward the log records at, or above, ``level``.
+
+        The salt daemons forward the log records at the lowest log level requested by any of the
+        log server consumers, for example, each of the pytest-xdist workers.
+        """
+        if isinstance(level, str):
+            level = logging.getLevelName(level.upper())
+        self._send_log_level(level)
+
+    def reset_log_level(self):
+        """
+        Withdraw the log level requested by :py:meth:`~LogServer.set_log_level`.
+        """
+        self._send_log_level(None)
+
+    def _send_log_level(self, level):
+        self._send(
+            [_LOG_LEVEL_FRAME, msgpack.dumps([self.consumer_id, level])],
+            f"Requested the log level {logging.getLevelName(level)}",
+        )
+
+    def _send_stop_sentinel(self):
+        self._send([_STOP_SENTINEL], "Sent sentinel to trigger log server shutdown")
+        if self.sentinel_event.wait(5) is not True:  # pragma: no cover
+            log.warning(
+                "%s Failed to wait for the reception of the stop sentinel message. Stopping anyway.",
+                self,
+            )
+
+    def _send(self, msgs, description):
         address = f"tcp://{self.log_host}:{self.log_port}"
         context = zmq.Context()
+        sender = context.socket(zmq.PUSH)  # pylint: disable=no-member
+        sender.connect(address)
+        try:
+            sender.send_multipart(msgs)
+            log.debug("%s %s", self, description)
+        finally:
+            sender.close(1000)
+            context.term()
+
+    def _bind_sockets(self, context):
+        """
+        Bind the log server sockets.
+
+        Return the socket to receive log records from, the socket to publish them to, if any, and
+        the socket to publish the log level to, if any.
+        """
+        if self.broker_address is not None:
+            subscriber = context.socket(zmq.SUB)  # pylint: disable=no-member
+            subscriber.set_hwm(self.socket_hwm)
+            for topic in (_get_topic(self.consumer_id), _BROADCAST_TOPIC):
+                subscriber.setsockopt(zmq.SUBSCRIBE, topic)  # pylint: disable=no-member
+            subscriber.connect(f"tcp://{self.log_host}:{self.publish_port}")
+            return subscriber, None, None
         puller = context.socket(zmq.PULL)  # pylint: disable=no-member
         puller.set_hwm(self.socket_hwm)
-        exit_timeout_seconds = 5
+        puller.bind(f"tcp://{self.log_host}:{self.log_port}")
+        controller = publisher = None
+        try:
+            if self.control_port is not None:
+                controller = context.socket(zmq.PUB)  # pylint: disable=no-member
+                controller.bind(f"tcp://{self.log_host}:{self.control_port}")
+            if self.broker:
+                publisher = context.socket(zmq.PUB)  # pylint: disable=no-member
+                publisher.set_hwm(self.socket_hwm)
+                publisher.bind(f"tcp://{self.log_host}:{self.publish_port}")
+        except zmq.ZMQError:  # pragma: no cover
+            puller.close(1)
+            if controller is not None:
+                controller.close(1)
+            if publisher is not None:
+                publisher.close(1)
+            raise
+        return puller, publisher, controller
+
+    def process_logs(self):
+        """
+        Process the logs returned.
+        """
+        context = zmq.Context()
         exit_timeout = None
         if msgpack.version >= (0, 5, 2):
             msgpack_kwargs = {"raw": False}
         else:  # pragma: no cover
             msgpack_kwargs = {"encoding": "utf-8"}
         try:
-            puller.bind(address)
+            puller, publisher, controller = self._bind_sockets(context)
         except zmq.ZMQError:  # pragma: no cover
-            log.exception("%s Unable to bind to puller at %s", self, address)
+            log.exception("%s Unable to bind the log server sockets", self)
+            context.term()
             return
+        dispatcher = self._start_dispatch_thread()
         try:
             self.running_event.set()
             poller = zmq.Poller()
             poller.register(puller, zmq.POLLIN)
+            log_level_published_at = 0
             while True:
+                if controller is not None and time.time() - log_level_published_at >= 1:
+                    # Republished every second, for the salt daemons which just subscribed
+                    self._publish_log_level(controller)
+                    log_level_published_at = time.time()
                 if not self.running_event.is_set():
+                    if self.broker_address is not None:
+                        # The broker keeps running, there's no sentinel to wait for
+                        break
                     if exit_timeout is None:
-                        log.debug(
-                            "%s Waiting %d seconds to process any remaning log messages "
-                            "before exiting...",
-                            self,
-                            exit_timeout_seconds,
-                        )
-                        exit_timeout = time.time() + exit_timeout_seconds
-
+                        exit_timeout = self._get_exit_timeout()
                     if time.time() >= exit_timeout:
                         log.debug(
                             "%s Unable to process remaining log messages in time. Exiting anyway.",
@@ -163,32 +339,14 @@ class LogServer:
                 try:
                     if not poller.poll(1000):
                         continue
-                    msg = puller.recv()
-                    record_dict = msgpack.loads(msg, **msgpack_kwargs)
-                    if record_dict is None:
+                    stop = self._dispatch_messages(
+                        self._receive_messages(puller), publisher, controller, msgpack_kwargs
+                    )
+                    if stop:
                         # A sentinel to stop processing the queue
                         log.info("%s Received the sentinel to shutdown", self)
                         self.sentinel_event.set()
                         break
-                    try:
-                        record_dict["message"]
-                    except KeyError:  # pragma: no cover
-                        # This log record was msgpack dumped from Py2
-                        for key, value in record_dict.copy().items():
-                            skip_update = True
-                            if isinstance(value, bytes):
-                                value = value.decode("utf-8")  # noqa: PLW2901
-                                skip_update = False
-                            if isinstance(key, bytes):
-                                key = key.decode("utf-8")  # noqa: PLW2901
-                                skip_update = False
-                            if skip_update is False:
-                                record_dict[key] = value
-                    # Just log everything, filtering will happen on the main process
-                    # logging handlers
-                    record = logging.makeLogRecord(record_dict)
-                    logger = logging.getLogger(record.name)
-                    logger.handle(record)
                 except (EOFError, KeyboardInterrupt, SystemExit):  # pragma: no cover
                     break
                 except Exception as exc:  # pragma: no cover pylint: disable=broad-except
@@ -199,10 +357,231 @@ class LogServer:
                         exc_info=True,
                     )
         finally:
-            puller.close(1)
+            for sock in (puller, publisher, controller):
+                if sock is not None:
+                    sock.close(1)
             context.term()
+            self._stop_dispatch_thread(dispatcher)
         log.debug("%s Process log thread terminated", self)
 
+    def _get_exit_timeout(self, seconds=5):
+        log.debug(
+            "%s Waiting %d seconds to process any remaning log messages before exiting...",
+            self,
+            seconds,
+        )
+        return time.time() + seconds
+
+    def _start_dispatch_thread(self):
+        if not self.dispatch_thread:
+            return None
+        self.dispatch_queue = queue.Queue()
+        dispatcher = threading.Thread(target=self._process_dispatch_queue)
+        dispatcher.start()
+        return dispatcher
+
+    def _stop_dispatch_thread(self, dispatcher):
+        if dispatcher is None:
+            return
+        # Let the dispatch thread handle the log records it was handed before exiting
+        self.dispatch_queue.put(None)
+        dispatcher.join()
+        self.dispatch_queue = None
+
+    def _receive_messages(self, puller):
+        """
+        Receive all the messages waiting to be received, up to ``max_batch_size`` log records.
+        """
+        # The log handlers send the log records in batches
+        messages = [puller.recv_multipart()]
+        received = len(messages[0])
+        while received < self.max_batch_size:
+            try:
+                parts = puller.recv_multipart(zmq.NOBLOCK)  # pylint: disable=no-member
+            except zmq.error.Again:
+                break
+            messages.append(parts)
+            received += len(parts)
+        return messages
+
+    def _dispatch_messages(self, messages, publisher, controller, msgpack_kwargs):
+        """
+        Handle the received messages, returning ``True`` when the stop sentinel was received.
+        """
+        msgs_by_topic = {}
+        stop = log_level_changed = False
+        for parts in messages:
+            if parts == [_STOP_SENTINEL]:
+                stop = True
+                break
+            if parts[0] == _LOG_LEVEL_FRAME:
+                self._update_log_level(parts[1], msgpack_kwargs)
+                log_level_changed = True
+                continue
+            if parts[0].startswith(_TOPIC_PREFIX):
+                msgs_by_topic.setdefault(parts[0], []).extend(parts[1:])
+            else:
+                msgs_by_topic.setdefault(_BROADCAST_TOPIC, []).extend(parts)
+        if log_level_changed and controller is not None:
+            self._publish_log_level(controller)
+        if publisher is not None:
+            # The subscribers handle the log records, only publish them to the worker they belong to
+            for topic, msgs in msgs_by_topic.items():
+                publisher.send_multipart([topic, *msgs])
+        elif msgs_by_topic:
+            msgs = [msg for msgs in msgs_by_topic.values() for msg in msgs]
+            self._dispatch_log_records(self._decode_log_records(msgs, msgpack_kwargs))
+        return stop
+
+    def _update_log_level(self, msg, msgpack_kwargs):
+        consumer_id, level = msgpack.loads(msg, **msgpack_kwargs)
+        if level is None:
+            self.consumer_log_levels.pop(consumer_id, None)
+        else:
+            self.consumer_log_levels[consumer_id] = level
+        log.debug(
+            "%s The log level requested by %r is now %s",
+            self,
+            consumer_id,
+            logging.getLevelName(level),
+        )
+
+    def _publish_log_level(self, controller):
+        # None tells the log handlers to go back to the log level they were configured with
+        level = min(self.consumer_log_levels.values(), default=None)
+        with contextlib.suppress(zmq.error.Again):
+            controller.send(msgpack.dumps(level), flags=zmq.NOBLOCK)
+
+    @staticmethod
+    def _decode_log_records(msgs, msgpack_kwargs):
+        """
+        Decode a batch of log records.
+        """
+        record_dicts = []
+        for msg in msgs:
+            record_dict = msgpack.loads(msg, **msgpack_kwargs)
+            try:
+                record_dict["message"]
+            except KeyError:  # pragma: no cover
+                # This log record was msgpack dumped from Py2
+                for key, value in record_dict.copy().items():
+                    skip_update = True
+                    if isinstance(value, bytes):
+                        value = value.decode("utf-8")  # noqa: PLW2901
+                        skip_update = False
+                    if isinstance(key, bytes):
+                        key = key.decode("utf-8")  # noqa: PLW2901
+                        skip_update = False
+                    if skip_update is False:
+                        record_dict[key] = value
+            if isinstance(record_dict.get("args"), list):
+                # The log record was sent unformatted, msgpack turned its arguments into a list
+                record_dict["args"] = tuple(record_dict["args"])
+            record_dicts.append(record_dict)
+        return record_dicts
+
+    def _dispatch_log_records(self, record_dicts):
+        """
+        Inject the decoded log records into the logging machinery, or hand them to the dispatch thread.
+        """
+        if self.dispatch_queue is not None:
+            self.dispatch_queue.put(record_dicts)
+            return
+        self._handle_log_records(record_dicts)
+
+    def _handle_log_records(self, record_dicts):
+        if self.buffer_size:
+            record_dicts = self._buffer_log_records(record_dicts)
+        for record_dict in record_dicts:
+            # Just log everything, filtering will happen on the main process
+            # logging handlers
+            record = logging.makeLogRecord(record_dict)
+            logger = logging.getLogger(record.name)
+            logger.handle(record)
+
+    def _buffer_log_records(self, record_dicts):
+        """
+        Buffer the log records of the salt daemons, returning the ones which are not theirs.
+        """
+        unbuffered = []
+        with self.log_buffers_lock:
+            for record_dict in record_dicts:
+                daemon_id = record_dict.get("pytest_daemon_id")
+                if daemon_id is None:
+                    unbuffered.append(record_dict)
+                    continue
+                try:
+                    buffer = self.log_buffers[daemon_id]
+                except KeyError:
+                    buffer = self.log_buffers[daemon_id] = deque(maxlen=self.buffer_size)
+                buffer.append(record_dict)
+        return unbuffered
+
+    def _process_dispatch_queue(self):
+        """
+        Inject the log records handed by the log server thread into the logging machinery.
+        """
+        dispatch_queue = self.dispatch_queue
+        while True:
+            record_dicts = dispatch_queue.get()
+            if record_dicts is None:
+                break
+            try:
+                self._handle_log_records(record_dicts)
+            except Exception as exc:  # pragma: no cover pylint: disable=broad-except
+                log.warning(
+                    "%s An exception occurred in the log records dispatch thread: %s",
+                    self,
+                    exc,
+                    exc_info=True,
+                )
+        log.debug("%s Log records dispatch thread terminated", self)
+
+
+def pytest_addoption(parser):
+    """
+    Register argparse-style options and ini-style config values.
+    """
+    group = parser.getgroup("Salt Factories")
+    group.addoption(
+        "--log-server-dispatch-thread",
+        default=False,
+        action="store_true",
+        help=(
+            "Inject the log records forwarded by the salt daemons into the logging machinery "
+            "from a separate thread, instead of the thread receiving them."
+        ),
+    )
+    group.addoption(
+        "--log-server-level-pushdown",
+        default=False,
+        action="store_true",
+        help=(
+            "Have the salt daemons started by salt-factories drop the log records below the "
+            "log level captured by pytest, instead of forwarding them all to the log server. "
+            "Tests can still lower it at runtime with the log server's set_log_level()."
+        ),
+    )
+    group.addoption(
+        "--log-server-buffer-size",
+        default=None,
+        type=int,
+        help=(
+            "Keep up to this many log records of each salt daemon started by salt-factories in "
+            "memory, instead of injecting them into the logging machinery, and only add them to "
+            "the reports of the failing tests."
+        ),
+    )
+    group.addoption(
+        "--log-server-defer-formatting",
+        default=False,
+        action="store_true",
+        help=(
+            "Have the salt daemons started by salt-factories send their log records unformatted, "
+            "whenever possible, and only format them in the test process, when needed."
+        ),
+    )
+
 
 @pytest.hookimpl(trylast=True)
 def pytest_configure(config):
@@ -232,11 +611,57 @@ def pytest_configure(config):
         levels.pop(levels.index(logging.NOTSET))
 
     log_level = logging.getLevelName(min(levels))
+    log_level_pushdown = config.getoption("--log-server-level-pushdown", default=False)
+    dispatch_thread = config.getoption("--log-server-dispatch-thread", default=False)
+    buffer_size = config.getoption("--log-server-buffer-size", default=None)
+    defer_formatting = config.getoption("--log-server-defer-formatting", default=False)
 
-    log_server = LogServer(log_level=log_level)
+    broker_role = get_xdist_broker_role(config)
+    if broker_role == "controller":
+        # The broker publishes the log records to the workers, which buffer them
+        log_server = LogServer(
+            log_level=log_level,
+            broker=True,
+            log_level_pushdown=log_level_pushdown,
+            dispatch_thread=dispatch_thread,
+            defer_formatting=defer_formatting,
+        )
+    elif broker_role == "worker":
+        log_server = LogServer(
+            log_level=log_level,
+            broker_address=config.workerinput["saltfactories_log_server"],
+            consumer_id=config.workerinput["workerid"],
+            log_level_pushdown=log_level_pushdown,
+            dispatch_thread=dispatch_thread,
+            buffer_size=buffer_size,
+            defer_formatting=defer_formatting,
+        )
+    else:
+        log_server = LogServer(
+            log_level=log_level,
+            log_level_pushdown=log_level_pushdown,
+            dispatch_thread=dispatch_thread,
+            buffer_size=buffer_size,
+            defer_formatting=defer_formatting,
+        )
     config.pluginmanager.register(log_server, "saltfactories-log-server")
 
 
+@pytest.hookimpl(optionalhook=True)
+def pytest_configure_node(node):
+    """
+    Pass the broker log server address to the pytest-xdist workers.
+    """
+    log_server = node.config.pluginmanager.get_plugin("saltfactories-log-server")
+    if log_server is not None and log_server.broker:
+        node.workerinput["saltfactories_log_server"] = [
+            "127.0.0.1",
+            log_server.log_port,
+            log_server.publish_port,
+            log_server.control_port,
+        ]
+
+
 @pytest.hookimpl(tryfirst=True)
 def pytest_sessionstart(session):
     """
@@ -244,6 +669,42 @@ def pytest_sessionstart(session):
     """
     log_server = session.config.pluginmanager.get_plugin("saltfactories-log-server")
     log_server.start()
+    if log_server.log_level_pushdown and not log_server.broker:
+        # The broker doesn't consume log records, it publishes them to the workers
+        log_server.set_log_level(log_server.log_level)
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtest_setup(item):
+    """
+    Drop the log records buffered before the test starts.
+    """
+    log_server = item.config.pluginmanager.get_plugin("saltfactories-log-server")
+    if log_server is not None and log_server.buffer_size:
+        log_server.clear_log_records()
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    """
+    Add the buffered salt daemons log records to the reports of the failing tests.
+    """
+    outcome = yield
+    report = outcome.get_result()
+    log_server = item.config.pluginmanager.get_plugin("saltfactories-log-server")
+    if not report.failed or log_server is None or not log_server.buffer_size:
+        return
+    formatter = logging.Formatter("%(asctime)s %(levelname)-8s %(name)s:%(lineno)d %(message)s")
+    records_by_daemon = {}
+    for record in log_server.get_log_records():
+        records_by_daemon.setdefault(record.pytest_daemon_id, []).append(record)
+    for daemon_id, records in sorted(records_by_daemon.items()):
+        report.sections.append(
+            (
+                f"Captured salt daemon log {call.when} ({daemon_id})",
+                "\n".join(formatter.format(record) for record in records),
+            )
+        )
 
 
 @pytest.hookimpl(trylast=True)
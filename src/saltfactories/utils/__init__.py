@@ -133,3 +133,23 @@ def warn_until(
             category,
             stacklevel=stacklevel,
         )
+
+
+def get_xdist_broker_role(config):
+    """
+    Return the broker role of the current pytest process.
+
+    When ``--salt-factories-broker`` is passed and pytest-xdist is distributing the tests, the
+    controller process hosts the event listener and the log server, and the worker processes
+    subscribe to them.
+
+    :param ~_pytest.config.Config config: The pytest configuration
+    :return str: ``"controller"``, ``"worker"``, or ``None`` when not using a broker.
+    """
+    if not config.getoption("--salt-factories-broker", default=False):
+        return None
+    if hasattr(config, "workerinput"):
+        return "worker"
+    if getattr(config.option, "dist", "no") != "no":
+        return "controller"
+    return None
@@ -0,0 +1,70 @@
+"""
+Salt Factories event broker.
+
+When running under pytest-xdist, a single event listener on the controller process receives the
+events forwarded by all salt daemons and relays them to the event listeners of the workers.
+"""
+import attr
+import msgpack
+
+
+@attr.s(kw_only=True, slots=True, hash=False)
+class EventBroker:
+    """
+    Relay the payloads received by the broker event listener to its subscribers.
+
+    Subscribers are the event listeners of the pytest-xdist workers. The salt engines can tell
+    which worker started the daemon they forward the events of, in which case its payloads are
+    only relayed to that worker.
+    """
+
+    subscribers = attr.ib(init=False, repr=False, hash=False, factory=dict)
+    engine_workers = attr.ib(init=False, repr=False, hash=False, factory=dict)
+    subscribers_keep_tags = attr.ib(init=False, repr=False, hash=False, factory=dict)
+
+    def add_subscriber(self, connection, worker_id=None):
+        """
+        Relay payloads to ``connection``, the event listener of the ``worker_id`` worker.
+        """
+        self.subscribers[connection] = worker_id
+
+    def add_engine(self, connection, worker_id):
+        """
+        Only relay the payloads received on the salt engine ``connection`` to the ``worker_id`` worker.
+        """
+        self.engine_workers[connection] = worker_id
+
+    def set_keep_tags(self, connection, keep_tags):
+        """
+        Set the ``(daemon_id, tag)`` patterns the subscriber on ``connection`` is waiting for.
+        """
+        self.subscribers_keep_tags[connection] = {tuple(pattern) for pattern in keep_tags}
+
+    def get_keep_tags(self):
+        """
+        Return the ``(daemon_id, tag)`` patterns all subscribers are waiting for.
+        """
+        keep_tags = set()
+        for subscriber_keep_tags in list(self.subscribers_keep_tags.values()):
+            keep_tags.update(subscriber_keep_tags)
+        return keep_tags
+
+    def relay(self, payload, connection):
+        """
+        Relay a payload to the subscribers, only to the worker the sending salt daemon belongs to, if known.
+        """
+        if not self.subscribers:
+            return
+        worker_id = self.engine_workers.get(connection)
+        frame = msgpack.packb(payload, use_bin_type=True)
+        for subscriber, subscriber_worker_id in list(self.subscribers.items()):
+            if worker_id is None or subscriber_worker_id == worker_id:
+                subscriber.send_frame(frame)
+
+    def remove_connection(self, connection):
+        """
+        Forget about ``connection``, returning ``True`` if the patterns waited for changed.
+        """
+        self.subscribers.pop(connection, None)
+        self.engine_workers.pop(connection, None)
+        return bool(self.subscribers_keep_tags.pop(connection, None))
@@ -0,0 +1,162 @@
+"""
+Salt events journal.
+"""
+import fnmatch
+import logging
+import pathlib
+
+import attr
+import msgpack
+import msgpack.exceptions
+
+from saltfactories.utils.events import convert_stamp_ns
+from saltfactories.utils.events import get_payload_stamp
+
+log = logging.getLogger(__name__)
+
+
+@attr.s(kw_only=True, slots=True, hash=False, eq=False)
+class EventJournal:
+    """
+    Append-only journal of the events received by the event listener.
+
+    Every event payload is appended to the journal file as a msgpack frame, as it was forwarded,
+    with the event data still packed. An index file, next to the journal file, gets a
+    ``[daemon_id, tag, stamp, offset, size]`` msgpack record for every frame, which allows
+    reading back only the matching frames without unpacking the whole journal.
+
+    Both files are written, and read, as streams, the journal never keeps events in memory.
+
+    .. code-block:: python
+
+        journal = EventJournal(path="events.journal")
+        for payload in journal.payloads([(salt_master.id, "salt/job/*")]):
+            print(payload["tag"])
+
+    A journal can also be replayed into an event listener, check
+    :py:meth:`~saltfactories.plugins.event_listener.EventListener.replay_journal`.
+
+    :keyword ~pathlib.Path path:
+        The path to the journal file. The index file path is the same with an ``.idx`` suffix appended.
+    """
+
+    path = attr.ib(converter=pathlib.Path)
+    index_path = attr.ib(init=False)
+    _journal_file = attr.ib(init=False, repr=False, default=None)
+    _index_file = attr.ib(init=False, repr=False, default=None)
+    _offset = attr.ib(init=False, repr=False, default=0)
+
+    @index_path.default
+    def _default_index_path(self):
+        return self.path.with_name(f"{self.path.name}.idx")
+
+    def open_for_writing(self):
+        """
+        Open the journal for writing, appending to it if it already exists.
+        """
+        if self._journal_file is not None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._journal_file = self.path.open("ab")
+        self._index_file = self.index_path.open("ab")
+        self._offset = self._journal_file.tell()
+        log.debug("%s is open", self)
+
+    def close(self):
+        """
+        Close the journal.
+        """
+        if self._journal_file is None:
+            return
+        self._journal_file.close()
+        self._index_file.close()
+        self._journal_file = self._index_file = None
+        log.debug("%s is closed", self)
+
+    def flush(self):
+        """
+        Flush the journal to disk.
+        """
+        if self._journal_file is None:
+            return
+        self._journal_file.flush()
+        self._index_file.flush()
+
+    def write(self, payload):
+        """
+        Append a forwarded event payload to the journal.
+        """
+        frame = msgpack.packb(payload, use_bin_type=True)
+        self._journal_file.write(frame)
+        self._index_file.write(
+            msgpack.packb(
+                [
+                    payload["id"],
+                    payload["tag"],
+                    get_payload_stamp(payload),
+                    self._offset,
+                    len(frame),
+                ],
+                use_bin_type=True,
+            )
+        )
+        self._offset += len(frame)
+
+    def entries(self, patterns=None, after_time=None, before_time=None):
+        """
+        Iterate through the index entries matching the provided criteria.
+
+        :keyword ~collections.abc.Sequence patterns:
+            An iterable of tuples in the form of ``("<daemon-id>", "<event-tag-pattern>")``. ``None``
+            matches all entries.
+        :keyword ~datetime.datetime after_time:
+            Only match the events which happened at, or after, this time. Also accepts a timestamp.
+        :keyword ~datetime.datetime before_time:
+            Only match the events which happened before this time. Also accepts a timestamp.
+        :return: An iterator of ``(daemon_id, tag, stamp, offset, size)`` tuples.
+        """
+        if patterns is not None:
+            patterns = set(patterns)
+        if after_time is not None:
+            after_time = convert_stamp_ns(after_time)
+        if before_time is not None:
+            before_time = convert_stamp_ns(before_time)
+        self.flush()
+        with self.index_path.open("rb") as rfh:
+            for daemon_id, tag, stamp, offset, size in msgpack.Unpacker(rfh, raw=False):
+                if patterns is not None and not any(
+                    pattern[0] == daemon_id and fnmatch.fnmatch(tag, pattern[1])
+                    for pattern in patterns
+                ):
+                    continue
+                if after_time is not None or before_time is not None:
+                    event_time = convert_stamp_ns(stamp)
+                    if after_time is not None and event_time < after_time:
+                        continue
+                    if before_time is not None and event_time >= before_time:
+                        continue
+                yield daemon_id, tag, stamp, offset, size
+
+    def payloads(self, patterns=None, after_time=None, before_time=None):
+        """
+        Iterate through the event payloads matching the provided criteria, in the order they were received.
+
+        Check :py:meth:`entries` for the accepted arguments.
+        """
+        with self.path.open("rb") as rfh:
+            for _, _, _, offset, size in self.entries(patterns, after_time, before_time):
+                rfh.seek(offset)
+                yield msgpack.unpackb(rfh.read(size), raw=False, strict_map_key=False)
+
+    def __enter__(self):
+        """
+        Context manager support to open the journal for writing.
+        """
+        self.open_for_writing()
+        return self
+
+    def __exit__(self, *_):
+        """
+        Context manager support to close the journal.
+        """
+        self.close()
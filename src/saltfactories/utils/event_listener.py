@@ -0,0 +1,1040 @@
+"""
+Salt Factories event listener.
+"""
+import asyncio
+import logging
+import pathlib
+import threading
+import time
+import weakref
+from datetime import datetime
+from datetime import timezone
+
+import attr
+import msgpack
+import msgpack.exceptions
+from pytestshellutils.utils import ports
+from pytestskipmarkers.utils import platform
+
+from saltfactories.utils.event_broker import EventBroker
+from saltfactories.utils.event_journal import EventJournal
+from saltfactories.utils.events import DaemonHeartbeatLostError
+from saltfactories.utils.events import EventListenerStats
+from saltfactories.utils.events import EventStore
+from saltfactories.utils.events import EventSubscription
+from saltfactories.utils.events import EventsWaiter
+from saltfactories.utils.events import SequenceWaiter
+from saltfactories.utils.events import convert_stamp_ns
+from saltfactories.utils.events import event_from_payload
+from saltfactories.utils.events import get_payload_stamp
+from saltfactories.utils.events import match_pattern
+from saltfactories.utils.events import normalize_patterns
+
+log = logging.getLogger(__name__)
+
+# The longest unix socket path, sun_path is 108 bytes on Linux, 104 on macOS and the BSDs, NUL included
+_UNIX_SOCKET_PATH_MAX_LENGTH = 107 if platform.is_linux() else 103
+
+
+class EventListenerServer(asyncio.Protocol):
+    """
+    TCP Server to receive events forwarded.
+    """
+
+    def __init__(self, _event_listener, *args, **kwargs) -> None:
+        self._event_listener = _event_listener
+        super().__init__(*args, **kwargs)
+
+    def connection_made(self, transport):
+        """
+        Connection established.
+        """
+        peername = transport.get_extra_info("peername")
+        log.debug("Connection from %s", peername)
+        # pylint: disable=attribute-defined-outside-init
+        self.transport = transport
+        self.unpacker = msgpack.Unpacker(raw=False, strict_map_key=False)
+        # pylint: enable=attribute-defined-outside-init
+        self._event_listener._add_connection(self)  # noqa: SLF001
+
+    def connection_lost(self, exc):  # noqa: ARG002
+        """
+        Connection lost.
+        """
+        self._event_listener._remove_connection(self)  # noqa: SLF001
+
+    def send_payload(self, payload):
+        """
+        Send a control payload to the connected engine.
+        """
+        self.send_frame(msgpack.packb(payload, use_bin_type=True))
+
+    def send_frame(self, frame):
+        """
+        Send an already packed payload to the connected peer.
+        """
+        if not self.transport.is_closing():
+            self.transport.write(frame)
+
+    def data_received(self, data):
+        """
+        Received data.
+        """
+        try:
+            self.unpacker.feed(data)
+        except msgpack.exceptions.BufferFull:
+            # Start over loosing some data?!
+            self.unpacker = msgpack.Unpacker(  # pylint: disable=attribute-defined-outside-init
+                raw=False,
+                strict_map_key=False,
+            )
+            self.unpacker.feed(data)
+        for payload in self.unpacker:
+            if payload is None:
+                self.transport.close()
+                break
+            if "ctl" in payload:
+                self._event_listener._process_control_payload(payload, self)  # noqa: SLF001
+                continue
+            self._event_listener._process_event_payload(payload, self)  # noqa: SLF001
+
+
+@attr.s(kw_only=True, slots=True, hash=False)
+class EventListener:
+    """
+    EventListener implementation.
+
+    The ``EventListener`` is a service started by salt-factories which receives all the events of all the
+    salt masters that it starts. The service runs throughout the whole pytest session.
+
+    :keyword int timeout:
+        How long, in seconds, should a forwarded event stay in the store, after which, it will be deleted.
+    :keyword ~collections.abc.Sequence drop_tags:
+        Event tag patterns which the salt daemons can drop instead of forwarding them, for example,
+        high frequency events like ``salt/job/*/prog/*``. Events matching any pattern which is being
+        waited for, or subscribed to, are still forwarded.
+    :keyword bool unix_socket:
+        Also accept forwarded events on a unix socket, see :py:meth:`start_unix_server`.
+        The TCP server keeps running for the daemons which cannot reach the unix socket, like
+        the ones running in containers.
+    :keyword ~pathlib.Path journal_path:
+        When passed, every received event is also appended to an
+        :py:class:`~saltfactories.plugins.event_listener.EventJournal` at this path, which outlives the
+        events store, for post-mortem analysis.
+    :keyword bool release_test_events:
+        Remove the events received while a test was running from the store once that test finishes,
+        see :py:meth:`start_test` and :py:meth:`finish_test`. Events received outside of a test just
+        expire.
+    :keyword bool broker:
+        Relay the received events to the subscribed event listeners, instead of storing them. This
+        is how the pytest-xdist controller runs the only event listener receiving events when
+        ``--salt-factories-broker`` is passed. The events of the salt daemons started by a worker
+        are only relayed to that worker, the events of the other daemons are relayed to all of them.
+    :keyword ~collections.abc.Sequence broker_address:
+        The ``(host, port)`` of a broker event listener to subscribe to, instead of listening for
+        events. The salt daemons are then told to forward their events to the broker.
+    :keyword str worker_id:
+        The ID of the pytest-xdist worker subscribing to the broker. The salt daemons are told to
+        pass it along to the broker, which then only relays their events to this event listener.
+    :keyword int heartbeat_tolerance:
+        How many heartbeat intervals can go by without receiving a heartbeat from a daemon before
+        the waits on its events fail with :py:class:`~saltfactories.plugins.event_listener.DaemonHeartbeatLostError`.
+        Only the daemons which sent heartbeats are tracked, see :py:meth:`forget_heartbeat`.
+    """
+
+    timeout = attr.ib(default=120)
+    drop_tags = attr.ib(default=(), converter=tuple)
+    unix_socket = attr.ib(default=False)
+    journal_path = attr.ib(default=None)
+    release_test_events = attr.ib(default=True)
+    broker = attr.ib(default=False)
+    broker_address = attr.ib(default=None)
+    worker_id = attr.ib(default=None)
+    heartbeat_tolerance = attr.ib(default=5)
+    current_test = attr.ib(init=False, default=None)
+    current_test_start = attr.ib(init=False, repr=False, hash=False, default=None)
+    _stats = attr.ib(init=False, repr=False, hash=False, factory=EventListenerStats)
+    journal = attr.ib(init=False, repr=False, hash=False)
+    host = attr.ib(init=False, repr=False)
+    port = attr.ib(init=False, repr=False)
+    address = attr.ib(init=False)
+    store = attr.ib(init=False, repr=False, hash=False)
+    running_event = attr.ib(init=False, repr=False, hash=False)
+    running_thread = attr.ib(init=False, repr=False, hash=False)
+    loop = attr.ib(init=False, repr=False, hash=False)
+    auth_event_handlers = attr.ib(init=False, repr=False, hash=False)
+    waiters = attr.ib(init=False, repr=False, hash=False)
+    waiters_lock = attr.ib(init=False, repr=False, hash=False)
+    server = attr.ib(init=False, repr=False, hash=False)
+    server_running_event = attr.ib(init=False, repr=False, hash=False)
+    connections = attr.ib(init=False, repr=False, hash=False)
+    forward_filter = attr.ib(init=False, repr=False, hash=False)
+    forward_stats = attr.ib(init=False, repr=False, hash=False)
+    forward_sequences = attr.ib(init=False, repr=False, hash=False, factory=dict)
+    engine_sessions = attr.ib(init=False, repr=False, hash=False, factory=dict)
+    forward_gaps = attr.ib(init=False, repr=False, hash=False, factory=dict)
+    heartbeats = attr.ib(init=False, repr=False, hash=False, factory=dict)
+    lost_heartbeats = attr.ib(init=False, repr=False, hash=False, factory=set)
+    unix_socket_path = attr.ib(init=False, default=None)
+    unix_server = attr.ib(init=False, repr=False, hash=False, default=None)
+    event_broker = attr.ib(init=False, repr=False, hash=False, factory=EventBroker)
+
+    @host.default
+    def _default_host(self):
+        if self.broker_address is not None:
+            return self.broker_address[0]
+        if platform.is_windows():
+            # Windows cannot bind to 0.0.0.0
+            return "127.0.0.1"
+        return "0.0.0.0"  # noqa: S104
+
+    @port.default
+    def _default_port(self):
+        if self.broker_address is not None:
+            return self.broker_address[1]
+        return ports.get_unused_localhost_port()
+
+    @address.default
+    def _default_address(self):
+        return f"tcp://{self.host}:{self.port}"
+
+    def __attrs_post_init__(self):
+        """
+        Post attrs initialization routines.
+        """
+        self.store = EventStore(maxlen=10000)
+        self.running_event = threading.Event()
+        self.auth_event_handlers = weakref.WeakValueDictionary()
+        self.waiters = {}
+        self.waiters_lock = threading.Lock()
+        self.server_running_event = threading.Event()
+        self.server = None
+        self.running_thread = None
+        self.loop = None
+        self.connections = set()
+        self.forward_filter = None
+        self.forward_stats = {}
+        self.journal = None
+        if self.journal_path is not None:
+            self.journal = EventJournal(path=self.journal_path)
+
+    def start_server(self):
+        """
+        Start the TCP server.
+        """
+        if self.server_running_event.is_set():
+            return
+        if self.running_thread:
+            # If this attribute is set it means something happened to make
+            # the server crash. Let's join the thread to restart it all.
+            self.running_thread.join()
+            self.running_thread = None
+            log.info("%s server is re-starting", self)
+        else:
+            log.info("%s server is starting", self)
+        self.running_thread = threading.Thread(target=self._run_loop_in_thread)
+        self.running_thread.start()
+
+    def start_unix_server(self, path):
+        """
+        Also accept forwarded events on a unix socket.
+
+        This is a no-op unless the event listener was created with ``unix_socket=True``, on
+        Windows, when subscribed to a broker, or if the event listener is already listening on a
+        unix socket.
+
+        :param ~pathlib.Path path:
+            The path to the unix socket
+        """
+        if (
+            not self.unix_socket
+            or platform.is_windows()
+            or self.broker_address is not None
+            or self.unix_socket_path is not None
+        ):
+            return
+        if len(str(path).encode()) > _UNIX_SOCKET_PATH_MAX_LENGTH:
+            log.warning("%s The unix socket path %s is too long. Only listening on TCP", self, path)
+            return
+        self.unix_socket_path = path
+        if self.server_running_event.is_set() and self.loop is not None:
+            asyncio.run_coroutine_threadsafe(self._start_unix_server(), self.loop).result(
+                timeout=10
+            )
+
+    async def _start_unix_server(self):
+        loop = asyncio.get_running_loop()
+        path = pathlib.Path(self.unix_socket_path)
+        if path.exists():
+            path.unlink()
+        self.unix_server = await loop.create_unix_server(
+            lambda: EventListenerServer(self), str(path)
+        )
+        log.debug("%s is also listening on %s", self, path)
+
+    async def _stop_unix_server(self):
+        if self.unix_server is None:
+            return
+        self.unix_server.close()
+        await self.unix_server.wait_closed()
+        self.unix_server = None
+        path = pathlib.Path(self.unix_socket_path)
+        if path.exists():
+            path.unlink()
+
+    def _run_loop_in_thread(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self.loop = loop
+        try:
+            loop.run_until_complete(self._run_server())
+        except Exception:  # pylint: disable=broad-except
+            self.server_running_event.clear()
+            log.exception("%s: Exception raised while the running the server", self)
+        finally:
+            self.loop = None
+            # Cancel anything still waiting on events
+            pending = asyncio.all_tasks(loop)
+            for task in pending:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            log.debug("shutdown asyncgens")
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            log.debug("loop close")
+            loop.close()
+
+    async def _run_server(self):
+        if self.broker_address is not None:
+            await self._run_broker_subscriber()
+            return
+        loop = asyncio.get_running_loop()
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        self.server = await loop.create_server(
+            lambda: EventListenerServer(self),
+            self.host,
+            self.port,
+            start_serving=False,
+        )
+        try:
+            async with self.server:
+                loop.call_soon(self.server_running_event.set)
+                log.debug("%s server is starting", self)
+                await self.server.start_serving()
+                if self.unix_socket_path is not None:
+                    await self._start_unix_server()
+                while self.server_running_event.is_set():
+                    await asyncio.sleep(1)
+                    self._check_heartbeats()
+        finally:
+            await self._stop_unix_server()
+            if self.server:
+                self.server.close()
+                log.debug("%s server await server close", self)
+                await self.server.wait_closed()
+                log.debug("%s server stoppped", self)
+                self.server = None
+
+    async def _run_broker_subscriber(self):
+        loop = asyncio.get_running_loop()
+        transport, connection = await loop.create_connection(
+            lambda: EventListenerServer(self), self.host, self.port
+        )
+        try:
+            connection.send_payload({"ctl": "subscribe", "worker": self.worker_id})
+            self.server_running_event.set()
+            log.debug("%s is subscribed to the broker at %s:%s", self, self.host, self.port)
+            while self.server_running_event.is_set():
+                if transport.is_closing():
+                    # Clear the event so that start_server() re-subscribes
+                    log.warning("%s lost the connection to the broker", self)
+                    self.server_running_event.clear()
+                    break
+                await asyncio.sleep(1)
+                self._check_heartbeats()
+        finally:
+            transport.close()
+
+    def _check_event_sequence(self, decoded, connection):
+        """
+        Return ``False`` if the event was already received, reporting any events missed before it.
+        """
+        # A syndic's engines all forward events under the syndic's ID, but each numbers its own
+        session_key = self.engine_sessions.get(connection)
+        seq = decoded.get("seq")
+        if session_key is None or seq is None:
+            # Not an engine which numbers the events it forwards
+            return True
+        last_seq = self.forward_sequences[session_key]
+        if seq <= last_seq:
+            # Forwarded again after a reconnect
+            return False
+        if seq > last_seq + 1:
+            missed = seq - last_seq - 1
+            log.warning(
+                "%s missed %d events forwarded by %r, sequence numbers %d to %d",
+                self,
+                missed,
+                decoded["id"],
+                last_seq + 1,
+                seq - 1,
+            )
+            self.forward_gaps[decoded["id"]] = self.forward_gaps.get(decoded["id"], 0) + missed
+        self.forward_sequences[session_key] = seq
+        return True
+
+    def _process_event_payload(self, decoded, connection=None):
+        try:
+            if not self._check_event_sequence(decoded, connection):
+                log.debug("%s skipping an event received twice: %s", self, decoded)
+                return
+            event = event_from_payload(
+                decoded, expire_seconds=self.timeout, test_nodeid=self.current_test
+            )
+            log.info("%s received event: %s", self, event)
+            self._stats.record_event(event)
+            if self.journal is not None:
+                self.journal.write(decoded)
+            self.event_broker.relay(decoded, connection)
+            if self.broker:
+                # The subscribers store, and wait for, the events
+                return
+            self._store_event(event)
+            if event.tag == "salt/auth":
+                auth_event_callback = self.auth_event_handlers.get(event.daemon_id)
+                if auth_event_callback:
+                    try:
+                        auth_event_callback(event.data)
+                    except Exception:  # pragma: no cover pylint: disable=broad-except
+                        log.exception(
+                            "%s Error calling %r",
+                            self,
+                            auth_event_callback,
+                        )
+        except Exception:  # pragma: no cover pylint: disable=broad-except
+            log.exception("%s Something funky happened", self)
+
+    def _store_event(self, event):
+        with self.waiters_lock:
+            self.store.append(event)
+            for waiter in list(self.waiters.get(event.daemon_id, ())):
+                waiter.feed(event)
+        log.debug(
+            "%s store(id: %s) size after event received: %d",
+            self,
+            id(self.store),
+            len(self.store),
+        )
+
+    def _forget_engine_sessions(self, daemon_id):
+        """
+        Forget the sequence numbers of the engines of ``daemon_id`` which are no longer connected.
+        """
+        connected = set(self.engine_sessions.values())
+        for session_key in list(self.forward_sequences):
+            if session_key[0] == daemon_id and session_key not in connected:
+                del self.forward_sequences[session_key]
+
+    def _process_control_payload(self, payload, connection=None):
+        try:
+            if payload["ctl"] == "hello":
+                # An engine (re)connected, tell it where to resume forwarding events from
+                session_key = (payload["id"], payload["session"])
+                if session_key not in self.forward_sequences:
+                    # The daemon (re)started, its sequence numbers start over
+                    self._forget_engine_sessions(payload["id"])
+                    self.forward_sequences[session_key] = 0
+                self.engine_sessions[connection] = session_key
+                if payload.get("worker") is not None:
+                    # The daemon was started by a pytest-xdist worker, only relay its events there
+                    self.event_broker.add_engine(connection, payload["worker"])
+                connection.send_payload(
+                    {"ctl": "resume", "seq": self.forward_sequences[session_key]}
+                )
+            elif payload["ctl"] == "heartbeat":
+                daemon_id = payload["id"]
+                if daemon_id in self.lost_heartbeats:
+                    log.info("%s is receiving heartbeats from %r again", self, daemon_id)
+                    self.lost_heartbeats.discard(daemon_id)
+                self.heartbeats[daemon_id] = {
+                    "interval": payload["interval"],
+                    "last": time.monotonic(),
+                }
+                self.event_broker.relay(payload, connection)
+            elif payload["ctl"] == "subscribe":
+                log.debug("%s has a new subscriber: %s", self, connection)
+                self.event_broker.add_subscriber(connection, payload.get("worker"))
+            elif payload["ctl"] == "filter":
+                if self.broker_address is not None:
+                    # The broker's filter is meant for the salt engines
+                    return
+                # A subscriber telling which events it's waiting for
+                self.event_broker.set_keep_tags(connection, payload["keep"])
+                self._update_forward_filter()
+            elif payload["ctl"] == "stats":
+                daemon_id = payload["id"]
+                if daemon_id not in self.forward_stats:
+                    log.warning(
+                        "%s The %r daemon's event forward queue overflowed",
+                        self,
+                        daemon_id,
+                    )
+                self.forward_stats[daemon_id] = {
+                    key: payload[key] for key in ("capacity", "overflow", "dropped", "spilled")
+                }
+            else:  # pragma: no cover
+                log.warning("%s received an unknown control payload: %s", self, payload)
+        except Exception:  # pragma: no cover pylint: disable=broad-except
+            log.exception("%s Something funky happened", self)
+
+    def __enter__(self):
+        """
+        Context manager support to start the event listener.
+        """
+        self.start()
+        return self
+
+    def __exit__(self, *_):
+        """
+        Context manager support to stop the event listener.
+        """
+        self.stop()
+
+    def start(self):
+        """
+        Start the event listener.
+        """
+        if self.running_event.is_set():  # pragma: no cover
+            return
+        log.debug("%s is starting", self)
+        self.running_event.set()
+        if self.journal is not None:
+            self.journal.open_for_writing()
+        self.start_server()
+        # Wait for the thread to start
+        if self.server_running_event.wait(5) is not True:
+            self.server_running_event.clear()
+            msg = "Failed to start the event listener"
+            raise RuntimeError(msg)
+        log.debug("%s is started", self)
+
+    def stop(self):
+        """
+        Stop the event listener.
+        """
+        if self.running_event.is_set() is False:  # pragma: no cover
+            return
+        log.debug("%s is stopping", self)
+        self.store.clear()
+        self.auth_event_handlers.clear()
+        with self.waiters_lock:
+            waiters = {
+                waiter for daemon_waiters in self.waiters.values() for waiter in daemon_waiters
+            }
+        for waiter in waiters:
+            waiter.close()
+        self.running_event.clear()
+        self.server_running_event.clear()
+        log.debug("%s Joining running thread...", self)
+        self.running_thread.join(7)
+        if self.running_thread.is_alive():  # pragma: no cover
+            log.debug("%s The running thread is still alive. Waiting a little longer...", self)
+            self.running_thread.join(5)
+            if self.running_thread.is_alive():
+                log.debug(
+                    "%s The running thread is still alive. Exiting anyway and let GC take care of it",
+                    self,
+                )
+        if self.journal is not None:
+            self.journal.close()
+        log.debug("%s stopped", self)
+
+    def get_events(self, patterns, after_time=None):
+        """
+        Get events from the internal store.
+
+        :param ~collections.abc.Sequence pattern:
+            An iterable of tuples in the form of ``("<daemon-id>", "<event-tag-pattern>")``, ie, which daemon ID
+            we're targeting and the event tag pattern which will be passed to :py:func:`~fnmatch.fnmatch` to
+            assert a match. A data predicate can be passed as a third item, check
+            :py:meth:`~saltfactories.plugins.event_listener.EventListener.wait_for_events`.
+        :keyword ~datetime.datetime,float after_time:
+            After which time to start matching events. Defaults to when the current test started, or,
+            outside of a test, to the current time.
+        :return set: A set of matched events
+        """
+        after_time = self._get_after_time(after_time)
+        patterns = normalize_patterns(patterns)
+        after_time_iso = after_time.isoformat()
+        log.debug(
+            "%s is checking for event patterns happening after %s: %s",
+            self,
+            after_time_iso,
+            patterns,
+        )
+        found_events = set()
+        for pattern in patterns:
+            for event in self.store.query(pattern[0], pattern[1], after_time):
+                if event.expired:
+                    # Too old, carry on
+                    continue
+                if not match_pattern(event, pattern):
+                    continue
+                log.debug("%s Found matching pattern: %s", self, pattern)
+                found_events.add(event)
+        if found_events:
+            log.debug(
+                "%s found the following patterns happening after %s: %s",
+                self,
+                after_time_iso,
+                found_events,
+            )
+        else:
+            log.debug(
+                "%s did not find any matching event patterns happening after %s",
+                self,
+                after_time_iso,
+            )
+        return found_events
+
+    def wait_for_events(self, patterns, timeout=30, after_time=None):
+        """
+        Wait for a set of patterns to match or until timeout is reached.
+
+        :param ~collections.abc.Sequence pattern:
+            An iterable of tuples in the form of ``("<daemon-id>", "<event-tag-pattern>")``, ie, which daemon ID
+            we're targeting and the event tag pattern which will be passed to :py:func:`~fnmatch.fnmatch` to
+            assert a match.
+
+            A data predicate can be passed as a third item, in which case, only the events whose
+            data also matches it, match the pattern. It's either a mapping of ``:`` separated key
+            paths to their expected values, or a callable which gets passed the event data and
+            returns a boolean. The predicate is evaluated as the events are received, so, the
+            events which don't match never wake the waiter:
+
+            .. code-block:: python
+
+                matched_events = event_listener.wait_for_events(
+                    [
+                        (salt_master.id, f"salt/job/{jid}/ret/*", {"id": salt_minion.id}),
+                        (salt_master.id, "salt/job/*/ret/*", lambda data: data["retcode"] != 0),
+                    ],
+                    timeout=30,
+                )
+        :keyword int,float timeout:
+            The amount of time to wait for the events, in seconds.
+        :keyword ~datetime.datetime,float after_time:
+            After which time to start matching events. Defaults to when the current test started, or,
+            outside of a test, to the current time.
+
+        :return:
+            An instance of :py:class:`~saltfactories.plugins.event_listener.MatchedEvents`.
+        :rtype ~saltfactories.plugins.event_listener.MatchedEvents:
+        """
+        after_time = self._get_after_time(after_time)
+        after_time_iso = after_time.isoformat()
+        patterns = normalize_patterns(patterns)
+        log.debug(
+            "%s is waiting for event patterns happening after %s: %s",
+            self,
+            after_time_iso,
+            patterns,
+        )
+        if not patterns:
+            return True
+        return self._wait(EventsWaiter(patterns=patterns, after_time=after_time), timeout)
+
+    def wait_for_sequence(self, patterns, timeout=30, after_time=None):
+        """
+        Wait for a sequence of patterns to match, in order, or until timeout is reached.
+
+        Each step of the sequence only matches events which happened at, or after, the events which
+        matched the previous step. The events are matched against the current step as they're
+        received and, since events from different daemons can arrive out of order, against the next
+        step once the current one completes.
+
+        .. code-block:: python
+
+            matched_events = event_listener.wait_for_sequence(
+                [
+                    (salt_master.id, "salt/job/*/new"),
+                    {
+                        (salt_master.id, f"salt/job/*/ret/{salt_minion_1.id}"),
+                        (salt_master.id, f"salt/job/*/ret/{salt_minion_2.id}"),
+                    },
+                    (salt_master.id, "salt/run/*/ret"),
+                ],
+                timeout=120,
+            )
+            assert matched_events.found_all_events
+
+        :param ~collections.abc.Sequence pattern:
+            An ordered sequence of steps. Each step is either a pattern, as accepted by
+            :py:meth:`~saltfactories.plugins.event_listener.EventListener.wait_for_events`, or a set
+            of patterns which can match in any order, but must all match before the next step.
+        :keyword int,float timeout:
+            The amount of time to wait for the events, in seconds.
+        :keyword ~datetime.datetime,float after_time:
+            After which time to start matching events. Defaults to when the current test started, or,
+            outside of a test, to the current time.
+
+        :return:
+            An instance of :py:class:`~saltfactories.plugins.event_listener.MatchedEvents`, whose
+            ``matches`` and ``missed`` attributes are lists, ordered as the sequence.
+        :rtype ~saltfactories.plugins.event_listener.MatchedEvents:
+        """
+        after_time = self._get_after_time(after_time)
+        steps = [
+            normalize_patterns(step)
+            if isinstance(step, (set, frozenset))
+            else normalize_patterns([step])
+            for step in patterns
+        ]
+        log.debug(
+            "%s is waiting for the event patterns sequence happening after %s: %s",
+            self,
+            after_time.isoformat(),
+            steps,
+        )
+        if not steps:
+            return True
+        return self._wait(SequenceWaiter(steps=steps, after_time=after_time), timeout)
+
+    def _wait(self, waiter, timeout):
+        wait_start = time.monotonic()
+        self._register_waiter(waiter)
+        try:
+            self._check_waiter_heartbeats(waiter)
+            waiter.done.wait(timeout)
+        finally:
+            self._unregister_waiter(waiter)
+            self._stats.record_wait(time.monotonic() - wait_start)
+        self._check_waiter_heartbeats(waiter)
+        return waiter.result()
+
+    async def wait_for_events_async(self, patterns, timeout=30, after_time=None):
+        """
+        Asynchronously wait for a set of patterns to match or until timeout is reached.
+
+        The wait happens on the event listener's own event loop, so, no threads are used and it can
+        be awaited from any event loop.
+
+        :param ~collections.abc.Sequence pattern:
+            An iterable of tuples in the form of ``("<daemon-id>", "<event-tag-pattern>")``, ie, which daemon ID
+            we're targeting and the event tag pattern which will be passed to :py:func:`~fnmatch.fnmatch` to
+            assert a match. A data predicate can be passed as a third item, check
+            :py:meth:`~saltfactories.plugins.event_listener.EventListener.wait_for_events`.
+        :keyword int,float timeout:
+            The amount of time to wait for the events, in seconds.
+        :keyword ~datetime.datetime,float after_time:
+            After which time to start matching events. Defaults to when the current test started, or,
+            outside of a test, to the current time.
+
+        :return:
+            An instance of :py:class:`~saltfactories.plugins.event_listener.MatchedEvents`.
+        :rtype ~saltfactories.plugins.event_listener.MatchedEvents:
+        """
+        after_time = self._get_after_time(after_time)
+        patterns = normalize_patterns(patterns)
+        log.debug(
+            "%s is asynchronously waiting for event patterns happening after %s: %s",
+            self,
+            after_time.isoformat(),
+            patterns,
+        )
+        if not patterns:
+            return True
+        return await self._run_in_loop(self._wait_for_events(patterns, timeout, after_time))
+
+    async def _wait_for_events(self, patterns, timeout, after_time):
+        waiter = EventsWaiter(
+            patterns=patterns,
+            after_time=after_time,
+            future=asyncio.get_running_loop().create_future(),
+        )
+        wait_start = time.monotonic()
+        self._register_waiter(waiter)
+        try:
+            self._check_waiter_heartbeats(waiter)
+            await asyncio.wait_for(waiter.future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._unregister_waiter(waiter)
+            self._stats.record_wait(time.monotonic() - wait_start)
+        self._check_waiter_heartbeats(waiter)
+        return waiter.result()
+
+    def subscribe(self, patterns, maxsize=1000):
+        """
+        Subscribe to the events matching the provided patterns.
+
+        Only the events received after subscribing are passed to the subscription. Since matching
+        events are queued on the subscription as soon as they're received, they can't be missed
+        because they were discarded from the events store.
+
+        :param ~collections.abc.Sequence pattern:
+            An iterable of tuples in the form of ``("<daemon-id>", "<event-tag-pattern>")``, ie, which daemon ID
+            we're targeting and the event tag pattern which will be passed to :py:func:`~fnmatch.fnmatch` to
+            assert a match. A data predicate can be passed as a third item, check
+            :py:meth:`~saltfactories.plugins.event_listener.EventListener.wait_for_events`.
+        :keyword int maxsize:
+            The maximum number of events to keep queued on the subscription, waiting to be consumed.
+            Once reached, the oldest queued events are discarded. ``0`` means no limit.
+
+        :return:
+            An instance of :py:class:`~saltfactories.plugins.event_listener.EventSubscription`.
+        :rtype ~saltfactories.plugins.event_listener.EventSubscription:
+        """
+        subscription = EventSubscription(event_listener=self, patterns=patterns, maxsize=maxsize)
+        log.debug("%s is adding subscription %s", self, subscription)
+        with self.waiters_lock:
+            for daemon_id in subscription.daemon_ids:
+                self.waiters.setdefault(daemon_id, set()).add(subscription)
+        self._update_forward_filter()
+        return subscription
+
+    def replay_journal(self, journal, patterns=None, after_time=None, before_time=None):
+        """
+        Feed the events of a journal into the events store, as if they were just received.
+
+        Waiters and subscriptions get the replayed events too, but the authentication event
+        handlers don't. Replayed events expire ``timeout`` seconds after being replayed, and they
+        are not appended to this event listener's own journal.
+
+        :param journal:
+            An instance of :py:class:`~saltfactories.plugins.event_listener.EventJournal`, or the path to one.
+        :keyword ~collections.abc.Sequence patterns:
+            An iterable of tuples in the form of ``("<daemon-id>", "<event-tag-pattern>")``. ``None``
+            replays all events.
+        :keyword ~datetime.datetime after_time:
+            Only replay the events which happened at, or after, this time. Also accepts a timestamp.
+        :keyword ~datetime.datetime before_time:
+            Only replay the events which happened before this time. Also accepts a timestamp.
+        :return int: The number of replayed events
+        """
+        if not isinstance(journal, EventJournal):
+            journal = EventJournal(path=journal)
+        if after_time is not None:
+            # Unlike when waiting for events, not passing an after time replays the whole journal
+            after_time = self._get_after_time(after_time)
+        replayed = 0
+        for payload in journal.payloads(patterns, after_time, before_time):
+            age = (time.time_ns() - convert_stamp_ns(get_payload_stamp(payload))) / 1e9
+            self._store_event(
+                event_from_payload(
+                    payload,
+                    expire_seconds=max(age, 0) + self.timeout,
+                    test_nodeid=self.current_test,
+                )
+            )
+            replayed += 1
+        log.debug("%s replayed %d events from %s", self, replayed, journal)
+        return replayed
+
+    def stats(self):
+        """
+        Return the event listener throughput and latency metrics.
+
+        All durations are in seconds. Histograms are dictionaries holding the ``count``, ``mean``,
+        ``max``, ``p50`` and ``p99`` values, the percentiles being the upper boundary of the bucket
+        they fall in, and the per bucket counts, keyed by the bucket upper boundary, under ``buckets``.
+
+        :return dict:
+            A dictionary with the following keys:
+
+            * ``uptime``: How long the event listener has been collecting metrics.
+            * ``events``: Per daemon ID, the ``count`` of received events and their average ``rate``
+              per second.
+            * ``latency``: Histogram of the time between an event's ``_stamp`` and it being
+              received by the event listener.
+            * ``store``: The number of events in the store, ``size``, and their packed size, ``bytes``.
+            * ``waiters``: The number of registered waiters and subscriptions.
+            * ``waiter_blocked``: Histogram of the time spent waiting on events.
+        """
+        stats = self._stats.as_dict()
+        stats["store"] = {"size": len(self.store), "bytes": self.store.nbytes}
+        with self.waiters_lock:
+            stats["waiters"] = len(
+                {waiter for daemon_waiters in self.waiters.values() for waiter in daemon_waiters}
+            )
+        return stats
+
+    def start_test(self, nodeid):
+        """
+        Tag the events received from now on with the provided test node ID.
+
+        Called by the ``pytest_runtest_logstart`` hook.
+
+        :param str nodeid:
+            The node ID of the test which is starting.
+        """
+        self.current_test_start = datetime.now(tz=timezone.utc)
+        self.current_test = nodeid
+
+    def finish_test(self, nodeid):
+        """
+        Stop tagging the received events with the provided test node ID.
+
+        Called by the ``pytest_runtest_logfinish`` hook. Unless ``release_test_events`` is
+        ``False``, the events received while the test was running are removed from the store.
+
+        :param str nodeid:
+            The node ID of the test which finished.
+        """
+        if self.current_test == nodeid:
+            self.current_test = self.current_test_start = None
+        if not self.release_test_events:
+            return
+        released = self.store.release(nodeid)
+        if released:
+            log.debug("%s released %d events received while running %s", self, released, nodeid)
+
+    def _get_after_time(self, after_time):
+        if after_time is None:
+            if self.current_test_start is not None:
+                return self.current_test_start
+            return datetime.now(tz=timezone.utc)
+        if isinstance(after_time, float):
+            return datetime.fromtimestamp(after_time, tz=timezone.utc)
+        return after_time
+
+    async def _run_in_loop(self, coro):
+        """
+        Run the coroutine on the event listener's event loop and wait for its result.
+        """
+        loop = self.loop
+        if loop is None:
+            coro.close()
+            msg = f"{self} is not running"
+            raise RuntimeError(msg)
+        if asyncio.get_running_loop() is loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+    def _register_waiter(self, waiter):
+        with self.waiters_lock:
+            # Match against the events already stored and register the waiter under the same
+            # lock used when storing new events, so that no event falls in between.
+            waiter.seed(self.store)
+            if waiter.patterns:
+                for daemon_id in waiter.daemon_ids:
+                    self.waiters.setdefault(daemon_id, set()).add(waiter)
+        self._update_forward_filter()
+
+    def _unregister_waiter(self, waiter):
+        with self.waiters_lock:
+            for daemon_id, daemon_waiters in list(self.waiters.items()):
+                daemon_waiters.discard(waiter)
+                if not daemon_waiters:
+                    self.waiters.pop(daemon_id)
+        self._update_forward_filter()
+
+    def _check_heartbeats(self):
+        """
+        Wake up the waits on the events of the daemons which stopped sending heartbeats.
+        """
+        now = time.monotonic()
+        for daemon_id, heartbeat in list(self.heartbeats.items()):
+            if daemon_id in self.lost_heartbeats:
+                continue
+            if now - heartbeat["last"] <= heartbeat["interval"] * self.heartbeat_tolerance:
+                continue
+            log.error(
+                "%s stopped receiving heartbeats from %r %1.2f seconds ago",
+                self,
+                daemon_id,
+                now - heartbeat["last"],
+            )
+            self.lost_heartbeats.add(daemon_id)
+            with self.waiters_lock:
+                waiters = list(self.waiters.get(daemon_id, ()))
+            for waiter in waiters:
+                if not isinstance(waiter, EventSubscription):
+                    waiter.close()
+
+    def _check_waiter_heartbeats(self, waiter):
+        """
+        Raise if any of the daemons whose events the waiter still waits on stopped sending heartbeats.
+        """
+        if not self.lost_heartbeats:
+            return
+        patterns = waiter.result().missed
+        lost_daemon_ids = {pattern[0] for pattern in patterns} & self.lost_heartbeats
+        if lost_daemon_ids:
+            raise DaemonHeartbeatLostError(sorted(lost_daemon_ids), patterns)
+
+    def forget_heartbeat(self, daemon_id):
+        """
+        Stop tracking the heartbeats of the provided daemon ID until it sends a heartbeat again.
+
+        The salt daemon factories call this method before starting, and after terminating, a daemon.
+
+        :param str daemon_id:
+            The daemon ID whose heartbeats should no longer be tracked
+        """
+        self.heartbeats.pop(daemon_id, None)
+        self.lost_heartbeats.discard(daemon_id)
+
+    def _add_connection(self, connection):
+        self.connections.add(connection)
+        if self.drop_tags:
+            connection.send_payload(self._get_forward_filter())
+
+    def _remove_connection(self, connection):
+        self.connections.discard(connection)
+        self.engine_sessions.pop(connection, None)
+        if self.event_broker.remove_connection(connection):
+            self._update_forward_filter()
+
+    def _get_forward_filter(self):
+        """
+        Return the control payload telling the salt engines which events they can drop.
+        """
+        keep_tags = set()
+        with self.waiters_lock:
+            for daemon_waiters in self.waiters.values():
+                for waiter in daemon_waiters:
+                    # The salt engines only know about daemon IDs and tags
+                    keep_tags.update(pattern[:2] for pattern in waiter.patterns)
+        keep_tags.update(self.event_broker.get_keep_tags())
+        return {"ctl": "filter", "drop": list(self.drop_tags), "keep": sorted(keep_tags)}
+
+    def _update_forward_filter(self):
+        """
+        Send the salt engines an updated filter, if the patterns being waited for have changed.
+        """
+        if not self.drop_tags:
+            return
+        forward_filter = self._get_forward_filter()
+        if forward_filter == self.forward_filter:
+            return
+        self.forward_filter = forward_filter
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return
+        for connection in list(self.connections):
+            loop.call_soon_threadsafe(connection.send_payload, forward_filter)
+
+    def register_auth_event_handler(self, master_id, callback):
+        """
+        Register a callback to run for every authentication event, to accept or reject the minion authenticating.
+
+        :param str master_id:
+            The master ID for which the callback should run
+        :type callback: ~collections.abc.Callable
+        :param callback:
+            The function while should be called
+        """
+        self.auth_event_handlers[master_id] = callback
+
+    def unregister_auth_event_handler(self, master_id):
+        """
+        Un-register the authentication event callback, if any, for the provided master ID.
+
+        :param str master_id:
+            The master ID for which the callback is registered
+        """
+        self.auth_event_handlers.pop(master_id, None)
@@ -0,0 +1,1070 @@
+"""
+Salt events, their store and the waiters on them.
+"""
+import asyncio
+import bisect
+import fnmatch
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from collections.abc import Mapping
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+
+import attr
+import msgpack
+import msgpack.exceptions
+
+log = logging.getLogger(__name__)
+
+
+class DaemonHeartbeatLostError(RuntimeError):
+    """
+    Raised when waiting on events from a daemon which stopped sending heartbeats.
+
+    :param ~collections.abc.Sequence daemon_ids:
+        The IDs of the daemons which stopped sending heartbeats.
+    :param ~collections.abc.Sequence patterns:
+        The patterns which were still to match.
+    """
+
+    def __init__(self, daemon_ids, patterns):
+        self.daemon_ids = daemon_ids
+        self.patterns = patterns
+        super().__init__(
+            "Stopped receiving heartbeats from {} while waiting for the event patterns: {}".format(
+                ", ".join(repr(daemon_id) for daemon_id in daemon_ids), patterns
+            )
+        )
+
+
+def _convert_stamp(stamp):
+    try:
+        return datetime.fromisoformat(stamp).replace(tzinfo=timezone.utc)
+    except AttributeError:  # pragma: no cover
+        # Python < 3.7
+        return datetime.strptime(stamp, "%Y-%m-%dT%H:%M:%S.%f").replace(tzinfo=timezone.utc)
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_ONE_MICROSECOND = timedelta(microseconds=1)
+
+
+def convert_stamp_ns(stamp):
+    """
+    Convert an ISO formatted stamp, a datetime, or a timestamp, to an integer of nanoseconds since the epoch.
+    """
+    if isinstance(stamp, int):
+        return stamp
+    if isinstance(stamp, float):
+        stamp = datetime.fromtimestamp(stamp, tz=timezone.utc)
+    elif isinstance(stamp, str):
+        stamp = _convert_stamp(stamp)
+    elif stamp.tzinfo is None:
+        stamp = stamp.replace(tzinfo=timezone.utc)
+    return (stamp - _EPOCH) // _ONE_MICROSECOND * 1000
+
+
+def _ns_to_datetime(stamp_ns):
+    return _EPOCH + timedelta(microseconds=stamp_ns // 1000)
+
+
+@attr.s(kw_only=True, slots=True, eq=False, frozen=True)
+class Event:
+    """
+    Event wrapper class.
+
+    The ``Event`` class is a container for a salt event which will live on the
+    :py:class:`~saltfactories.plugins.event_listener.EventListener` store.
+
+    The event payload is kept as it was received, packed, and it's only unpacked when first accessed.
+    The event times are kept as integers of nanoseconds since the epoch, the
+    :py:class:`~datetime.datetime` attributes are computed from those when accessed.
+
+    Events compare equal when their daemon ID, tag, stamp, expiry and payload are equal. The payload
+    is not hashable, so it's left out of the event hash.
+
+    :keyword str daemon_id:
+        The daemon ID which received this event.
+    :keyword str tag:
+        The event tag of the event.
+    :keyword ~datetime.datetime,str,int stamp:
+        When the event occurred, as a datetime, an ISO formatted string, or nanoseconds since the epoch.
+    :keyword bytes raw_data:
+        The msgpack packed event payload, as forwarded by the daemon.
+    :keyword dict data:
+        The event payload, filtered of all of Salt's private keys like ``_stamp`` which prevents proper
+        assertions against it. Defaults to a filtered copy of ``full_data``, made when first accessed.
+    :keyword dict full_data:
+        The full event payload, as received by the daemon, including all of Salt's private keys.
+        Only needed when ``raw_data`` is not passed.
+    :keyword int,float expire_seconds:
+        The time, in seconds, after which the event should be considered as expired and removed from the store.
+    :keyword str test_nodeid:
+        The node ID of the test which was running when the event was received, if any.
+
+    .. attribute:: stamp_ns
+
+        When the event occurred, in nanoseconds since the epoch.
+
+    .. attribute:: expire_at_ns
+
+        When the event expires, in nanoseconds since the epoch.
+    """
+
+    daemon_id = attr.ib()
+    tag = attr.ib()
+    stamp_ns = attr.ib(converter=convert_stamp_ns, alias="stamp")
+    raw_data = attr.ib(default=None, hash=False, eq=False, repr=False)
+    _data = attr.ib(default=None, hash=False, eq=False, repr=False)
+    _full_data = attr.ib(default=None, hash=False, eq=False, repr=False)
+    expire_seconds = attr.ib(hash=False)
+    test_nodeid = attr.ib(default=None, hash=False, eq=False, repr=False)
+    expire_at_ns = attr.ib(init=False, hash=False, eq=False, repr=False)
+
+    @expire_at_ns.default
+    def _set_expire_at_ns(self):
+        # Keep microsecond precision, like the stamps
+        return self.stamp_ns + round(self.expire_seconds * 1_000_000) * 1000
+
+    def __eq__(self, other):  # noqa: D105
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        if (self.daemon_id, self.tag, self.stamp_ns, self.expire_seconds) != (
+            other.daemon_id,
+            other.tag,
+            other.stamp_ns,
+            other.expire_seconds,
+        ):
+            return False
+        if self.raw_data is not None and self.raw_data == other.raw_data:
+            # No need to unpack the payloads
+            return self._data is None and other._data is None or self.data == other.data
+        return self.full_data == other.full_data and self.data == other.data
+
+    def __hash__(self):  # noqa: D105
+        return hash((self.daemon_id, self.tag, self.stamp_ns))
+
+    @property
+    def stamp(self):
+        """
+        The :py:class:`~datetime.datetime` at which the event occurred.
+        """
+        return _ns_to_datetime(self.stamp_ns)
+
+    @property
+    def expire_at(self):
+        """
+        The :py:class:`~datetime.datetime` at which the event expires.
+        """
+        return _ns_to_datetime(self.expire_at_ns)
+
+    @property
+    def full_data(self):
+        """
+        The full event payload, as received by the daemon, including all of Salt's private keys.
+        """
+        if self._full_data is None and self.raw_data is not None:
+            # The class is frozen, hence, the object.__setattr__ call
+            object.__setattr__(
+                self,
+                "_full_data",
+                msgpack.unpackb(self.raw_data, raw=False, strict_map_key=False),
+            )
+        return self._full_data
+
+    @property
+    def data(self):
+        """
+        The event payload, filtered of all of Salt's private keys like ``_stamp``.
+
+        Those private keys prevent proper assertions against the payload.
+        """
+        if self._data is None and self.full_data is not None:
+            object.__setattr__(
+                self,
+                "_data",
+                {
+                    key: value
+                    for key, value in self.full_data.items()
+                    if not (isinstance(key, str) and key.startswith("_"))
+                },
+            )
+        return self._data
+
+    @property
+    def expired(self):
+        """
+        Property to identify if the event has expired, at which time it should be removed from the store.
+        """
+        if time.time_ns() < self.expire_at_ns:
+            return False
+        return True
+
+
+@attr.s(kw_only=True, slots=True, hash=True, frozen=True)
+class MatchedEvents:
+    """
+    MatchedEvents implementation.
+
+    The ``MatchedEvents`` class is a container which is returned by
+    :py:func:`~saltfactories.plugins.event_listener.EventListener.wait_for_events` and
+    :py:func:`~saltfactories.plugins.event_listener.EventListener.wait_for_sequence`, in which case,
+    ``matches`` and ``missed`` are lists, ordered as the sequence.
+
+    :keyword set matches:
+        A :py:class:`set` of :py:class:`~saltfactories.plugins.event_listener.Event` instances that matched.
+    :keyword set missed:
+        A :py:class:`set` of :py:class:`~saltfactories.plugins.event_listener.Event` instances that remained
+        unmatched.
+
+    One can also easily iterate through all matched events of this class:
+
+    .. code-block:: python
+
+        matched_events = MatchedEvents(..., ...)
+        for event in matched_events:
+            print(event.tag)
+    """
+
+    matches = attr.ib()
+    missed = attr.ib()
+
+    @property
+    def found_all_events(self):
+        """
+        :return bool: :py:class:`True` if all events were matched, or :py:class:`False` otherwise.
+        """
+        return (not self.missed) is True
+
+    def __iter__(self):
+        """
+        Iterate through the matched events.
+        """
+        return iter(self.matches)
+
+
+def _get_literal_prefix(pattern):
+    """
+    Return the leading part of an :py:func:`~fnmatch.fnmatch` pattern which holds no wildcards.
+    """
+    for idx, char in enumerate(pattern):
+        if char in "*?[":
+            return pattern[:idx]
+    return pattern
+
+
+@attr.s(slots=True, hash=False)
+class _TagEvents:
+    """
+    Events sharing the same daemon ID and tag, ordered by their stamp, in nanoseconds.
+    """
+
+    stamps = attr.ib(init=False, factory=list)
+    events = attr.ib(init=False, factory=list)
+
+    def add(self, event):
+        """
+        Add an event, after the ones with the same stamp.
+        """
+        idx = bisect.bisect_right(self.stamps, event.stamp_ns)
+        self.stamps.insert(idx, event.stamp_ns)
+        self.events.insert(idx, event)
+
+    def remove(self, event):
+        """
+        Remove an event, if present.
+        """
+        idx = bisect.bisect_left(self.stamps, event.stamp_ns)
+        while idx < len(self.events):
+            if self.events[idx] is event:
+                del self.stamps[idx]
+                del self.events[idx]
+                return
+            idx += 1
+
+    def after(self, after_time):
+        """
+        Return the events stamped at, or after, ``after_time``, in nanoseconds.
+        """
+        return self.events[bisect.bisect_left(self.stamps, after_time) :]
+
+
+@attr.s(kw_only=True, slots=True, hash=False)
+class EventStore:
+    """
+    Indexed event store.
+
+    Events are indexed by daemon ID and, within each daemon, by tag. The known tags are kept
+    sorted, so that the literal prefix of a tag pattern, the part before any wildcard, narrows
+    the tags to check down to a contiguous range. Each tag keeps its events ordered by their
+    stamp, which allows skipping all events older than the requested time.
+
+    All events are also kept on a heap ordered by their expiry time. Expired events are popped
+    from the front of that heap whenever events are added or queried, so the store never needs
+    to be scanned for expired events.
+
+    :keyword int maxlen:
+        The maximum number of events to keep. Once reached, the events closer to expiring are discarded.
+    """
+
+    maxlen = attr.ib(default=10000)
+    _expiry = attr.ib(init=False, repr=False)
+    _counter = attr.ib(init=False, repr=False)
+    _tags = attr.ib(init=False, repr=False)
+    _index = attr.ib(init=False, repr=False)
+    _lock = attr.ib(init=False, repr=False)
+
+    def __attrs_post_init__(self):
+        """
+        Post attrs initialization routines.
+        """
+        self._expiry = []
+        # Ties on the expiry time are broken by insertion order
+        self._counter = itertools.count()
+        self._tags = {}
+        self._index = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        """
+        Return the number of events in the store.
+        """
+        return len(self._expiry)
+
+    def __iter__(self):
+        """
+        Iterate over a snapshot of the stored events, ordered by their expiry time.
+        """
+        with self._lock:
+            return iter([event for _, _, event in sorted(self._expiry)])
+
+    def append(self, event):
+        """
+        Add an event to the store.
+        """
+        with self._lock:
+            self.expire()
+            if len(self._expiry) >= self.maxlen:
+                self._remove(heapq.heappop(self._expiry)[-1])
+            heapq.heappush(self._expiry, (event.expire_at_ns, next(self._counter), event))
+            daemon_index = self._index.setdefault(event.daemon_id, {})
+            tag_events = daemon_index.get(event.tag)
+            if tag_events is None:
+                tag_events = daemon_index[event.tag] = _TagEvents()
+                bisect.insort(self._tags.setdefault(event.daemon_id, []), event.tag)
+            tag_events.add(event)
+
+    def expire(self, now=None):
+        """
+        Remove the expired events from the store.
+
+        :keyword ~datetime.datetime,int now:
+            The time against which to check for expired events, as a datetime or nanoseconds since
+            the epoch. Defaults to the current time.
+        """
+        now = time.time_ns() if now is None else convert_stamp_ns(now)
+        with self._lock:
+            while self._expiry and self._expiry[0][0] <= now:
+                event = heapq.heappop(self._expiry)[-1]
+                log.debug("%s Removing from event store: %s", self, event)
+                self._remove(event)
+
+    def _remove(self, event):
+        daemon_index = self._index[event.daemon_id]
+        tag_events = daemon_index[event.tag]
+        tag_events.remove(event)
+        if tag_events.events:
+            return
+        daemon_index.pop(event.tag)
+        tags = self._tags[event.daemon_id]
+        del tags[bisect.bisect_left(tags, event.tag)]
+        if not tags:
+            self._index.pop(event.daemon_id)
+            self._tags.pop(event.daemon_id)
+
+    def release(self, test_nodeid):
+        """
+        Remove the events received while the provided test was running.
+
+        :param str test_nodeid:
+            The test node ID the events are tagged with.
+        :return int: The number of removed events
+        """
+        with self._lock:
+            released = [item for item in self._expiry if item[-1].test_nodeid == test_nodeid]
+            if not released:
+                return 0
+            self._expiry = [item for item in self._expiry if item[-1].test_nodeid != test_nodeid]
+            heapq.heapify(self._expiry)
+            for _, _, event in released:
+                self._remove(event)
+        return len(released)
+
+    @property
+    def nbytes(self):
+        """
+        The size, in bytes, of the packed payloads of the stored events.
+        """
+        with self._lock:
+            return sum(len(event.raw_data) for _, _, event in self._expiry if event.raw_data)
+
+    def clear(self):
+        """
+        Remove all events from the store.
+        """
+        with self._lock:
+            self._expiry.clear()
+            self._tags.clear()
+            self._index.clear()
+
+    def _get_matching_tags(self, daemon_id, pattern):
+        tags = self._tags.get(daemon_id)
+        if not tags:
+            return
+        prefix = _get_literal_prefix(pattern)
+        if prefix == pattern:
+            if pattern in self._index[daemon_id]:
+                yield pattern
+            return
+        for idx in range(bisect.bisect_left(tags, prefix), len(tags)):
+            tag = tags[idx]
+            if not tag.startswith(prefix):
+                break
+            if fnmatch.fnmatch(tag, pattern):
+                yield tag
+
+    def query(self, daemon_id, pattern, after_time):
+        """
+        Return the events matching the provided daemon ID and tag pattern.
+
+        :param str daemon_id:
+            The daemon ID which received the events.
+        :param str pattern:
+            The event tag pattern which will be passed to :py:func:`~fnmatch.fnmatch` to assert a match.
+        :param ~datetime.datetime,int after_time:
+            Only events which happened at, or after, this time are returned. Either a datetime or
+            nanoseconds since the epoch.
+        :return list: The matched events, ordered by their stamp.
+        """
+        after_time = convert_stamp_ns(after_time)
+        with self._lock:
+            self.expire()
+            matches = []
+            daemon_index = self._index.get(daemon_id)
+            for tag in self._get_matching_tags(daemon_id, pattern):
+                matches.extend(daemon_index[tag].after(after_time))
+        if len(matches) > 1:
+            matches.sort(key=lambda event: event.stamp_ns)
+        return matches
+
+
+@attr.s(slots=True, hash=False)
+class _Histogram:
+    """
+    Fixed buckets histogram.
+    """
+
+    buckets = attr.ib(converter=tuple)
+    counts = attr.ib(init=False)
+    count = attr.ib(init=False, default=0)
+    total = attr.ib(init=False, default=0.0)
+    max_value = attr.ib(init=False, default=0.0)
+
+    @counts.default
+    def _default_counts(self):
+        # The last bucket collects everything above the highest bucket boundary
+        return [0] * (len(self.buckets) + 1)
+
+    def observe(self, value):
+        """
+        Count a value in the bucket it falls in.
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max_value = max(self.max_value, value)
+
+    def quantile(self, quantile):
+        """
+        Return the upper boundary of the bucket holding the provided quantile.
+        """
+        if not self.count:
+            return 0.0
+        rank = quantile * self.count
+        seen = 0
+        for idx, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                if idx < len(self.buckets):
+                    return self.buckets[idx]
+                break
+        return self.max_value
+
+    def as_dict(self):
+        """
+        Return the histogram summary, and its per bucket counts, as a dictionary.
+        """
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "max": self.max_value,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "buckets": dict(zip((*self.buckets, float("inf")), self.counts)),
+        }
+
+
+# Bucket boundaries, in seconds
+_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+_BLOCKED_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+@attr.s(kw_only=True, slots=True, hash=False)
+class EventListenerStats:
+    """
+    Event listener throughput and latency counters.
+    """
+
+    started_at = attr.ib(init=False, factory=time.monotonic)
+    events = attr.ib(init=False, factory=dict)
+    latency = attr.ib(init=False, factory=lambda: _Histogram(_LATENCY_BUCKETS))
+    waiter_blocked = attr.ib(init=False, factory=lambda: _Histogram(_BLOCKED_BUCKETS))
+    _lock = attr.ib(init=False, factory=threading.Lock)
+
+    def record_event(self, event):
+        """
+        Count a received event, and how long it took to reach the event listener.
+        """
+        latency = (time.time_ns() - event.stamp_ns) / 1e9
+        with self._lock:
+            self.events[event.daemon_id] = self.events.get(event.daemon_id, 0) + 1
+            # Clock skew between the daemons and the event listener could make this negative
+            self.latency.observe(max(latency, 0.0))
+
+    def record_wait(self, seconds):
+        """
+        Record how long a waiter was blocked waiting for events.
+        """
+        with self._lock:
+            self.waiter_blocked.observe(seconds)
+
+    def as_dict(self):
+        """
+        Return the metrics as a dictionary, check :py:meth:`EventListener.stats`.
+        """
+        with self._lock:
+            uptime = time.monotonic() - self.started_at
+            return {
+                "uptime": uptime,
+                "events": {
+                    daemon_id: {"count": count, "rate": count / uptime if uptime else 0.0}
+                    for daemon_id, count in sorted(self.events.items())
+                },
+                "latency": self.latency.as_dict(),
+                "waiter_blocked": self.waiter_blocked.as_dict(),
+            }
+
+
+def _set_future_result(future, result=None):
+    if not future.done():
+        future.set_result(result)
+
+
+def _notify_future(future, result=None):
+    """
+    Set the result of an asyncio future, from any thread.
+    """
+    loop = future.get_loop()
+    if not loop.is_closed():
+        loop.call_soon_threadsafe(_set_future_result, future, result)
+
+
+_MISSING = object()
+# The index of the optional data predicate in the event patterns
+_PREDICATE_INDEX = 2
+
+
+@attr.s(frozen=True, slots=True, eq=False)
+class _KeyPathPredicate:
+    """
+    Match the event data against ``{"<key>:<nested-key>": <expected-value>}`` mappings.
+
+    Nested keys are separated by ``:``, like on Salt's ``pillar.get``. Digits also index lists.
+    """
+
+    expected = attr.ib(converter=dict)
+
+    @staticmethod
+    def _traverse(data, key_path):
+        for key in key_path.split(":"):
+            if isinstance(data, Mapping):
+                data = data.get(key, _MISSING)
+            elif isinstance(data, (list, tuple)) and key.isdigit() and int(key) < len(data):
+                data = data[int(key)]
+            else:
+                return _MISSING
+            if data is _MISSING:
+                break
+        return data
+
+    def __call__(self, data):
+        return all(
+            self._traverse(data, key_path) == value for key_path, value in self.expected.items()
+        )
+
+
+def normalize_patterns(patterns):
+    """
+    Return the patterns as a set of hashable tuples.
+
+    Patterns are ``(daemon_id, tag_pattern)`` tuples with an optional third item, the data predicate,
+    which is either a callable, or a mapping of key paths to their expected values.
+    """
+    normalized = set()
+    for pattern in patterns:
+        normalized_pattern = tuple(pattern)
+        if len(pattern) > _PREDICATE_INDEX and isinstance(pattern[_PREDICATE_INDEX], Mapping):
+            normalized_pattern = (
+                pattern[0],
+                pattern[1],
+                _KeyPathPredicate(pattern[_PREDICATE_INDEX]),
+            )
+        normalized.add(normalized_pattern)
+    return normalized
+
+
+def match_pattern(event, pattern):
+    """
+    Return ``True`` if the event matches the ``(daemon_id, tag_pattern[, predicate])`` pattern.
+    """
+    if event.daemon_id != pattern[0]:
+        return False
+    if not fnmatch.fnmatch(event.tag, pattern[1]):
+        return False
+    if len(pattern) <= _PREDICATE_INDEX:
+        return True
+    try:
+        return bool(pattern[_PREDICATE_INDEX](event.data))
+    except Exception:  # pylint: disable=broad-except
+        log.exception(
+            "Error evaluating the data predicate of pattern %s against %s", pattern, event
+        )
+        return False
+
+
+@attr.s(kw_only=True, slots=True, hash=False, eq=False)
+class EventsWaiter:
+    """
+    A registered interest on a set of event patterns.
+
+    The event listener feeds every event it receives to the registered waiters, which remove the
+    patterns an event matches and signal the waiting thread, or coroutine, once no patterns remain.
+    """
+
+    patterns = attr.ib(converter=set)
+    after_time = attr.ib(converter=convert_stamp_ns)
+    future = attr.ib(default=None)
+    matches = attr.ib(init=False, factory=set)
+    done = attr.ib(init=False, factory=threading.Event)
+
+    @property
+    def daemon_ids(self):
+        """
+        The IDs of the daemons whose events can still match.
+        """
+        return {pattern[0] for pattern in self.patterns}
+
+    def seed(self, store):
+        """
+        Feed the matching events already in the store.
+        """
+        for pattern in set(self.patterns):
+            for event in store.query(pattern[0], pattern[1], self.after_time):
+                self.feed(event)
+                if pattern not in self.patterns:
+                    break
+
+    def feed(self, event):
+        """
+        Match a received event against the patterns still to match.
+        """
+        if event.stamp_ns < self.after_time or event.expired:
+            return
+        for pattern in list(self.patterns):
+            if match_pattern(event, pattern):
+                log.debug("%s Found matching pattern: %s", self, pattern)
+                self.matches.add(event)
+                self.patterns.remove(pattern)
+        if not self.patterns:
+            self.close()
+
+    def close(self):
+        """
+        Signal the waiting thread, or coroutine.
+        """
+        self.done.set()
+        if self.future is not None:
+            _notify_future(self.future)
+
+    def result(self):
+        """
+        Return the matched events, and the patterns which didn't match any.
+        """
+        return MatchedEvents(matches=set(self.matches), missed=set(self.patterns))
+
+
+@attr.s(kw_only=True, slots=True, hash=False, eq=False)
+class SequenceWaiter:
+    """
+    A registered interest on an ordered sequence of event patterns.
+
+    Only the current step of the sequence is matched against the events fed, and each step only
+    accepts events which happened at, or after, the events which completed the previous step.
+    Events from different daemons don't necessarily arrive in order, so, once a step completes,
+    the events stored since the previous step completed are matched against the next step.
+    """
+
+    steps = attr.ib()
+    after_time = attr.ib(converter=convert_stamp_ns)
+    future = attr.ib(default=None)
+    matches = attr.ib(init=False, factory=list)
+    done = attr.ib(init=False, factory=threading.Event)
+    _step = attr.ib(init=False, default=0)
+    _step_after_time = attr.ib(init=False)
+    _step_stamp = attr.ib(init=False, default=None)
+    _store = attr.ib(init=False, default=None)
+
+    @_step_after_time.default
+    def _default_step_after_time(self):
+        return self.after_time
+
+    @property
+    def patterns(self):
+        """
+        The patterns still to match, in order.
+        """
+        return [pattern for step in self.steps[self._step :] for pattern in sorted(step, key=repr)]
+
+    @property
+    def daemon_ids(self):
+        """
+        The IDs of the daemons whose events can still match.
+        """
+        return {pattern[0] for step in self.steps for pattern in step}
+
+    def seed(self, store):
+        """
+        Feed the matching events already in the store, ordered by their stamp.
+        """
+        self._store = store
+        if self._match_stored_events():
+            self._next_step()
+
+    def feed(self, event):
+        """
+        Match a received event against the current step, moving on to the next one once it completes.
+        """
+        if self.done.is_set():
+            return
+        if self._match(event) and not self.steps[self._step]:
+            self._next_step()
+
+    def _match(self, event):
+        """
+        Match the event against the current step, returning ``True`` if it matched.
+        """
+        if event.stamp_ns < self._step_after_time or event.expired:
+            return False
+        if any(event is match for match in self.matches):
+            # An event only completes one step
+            return False
+        step = self.steps[self._step]
+        matched = False
+        for pattern in list(step):
+            if match_pattern(event, pattern):
+                log.debug("%s Found matching pattern: %s", self, pattern)
+                step.remove(pattern)
+                matched = True
+        if not matched:
+            return False
+        self.matches.append(event)
+        if self._step_stamp is None or event.stamp_ns > self._step_stamp:
+            self._step_stamp = event.stamp_ns
+        return True
+
+    def _match_stored_events(self):
+        """
+        Match the stored events against the current step, returning ``True`` if it completed.
+        """
+        step = self.steps[self._step]
+        events = set()
+        for pattern in step:
+            events.update(self._store.query(pattern[0], pattern[1], self._step_after_time))
+        for event in sorted(events, key=lambda event: event.stamp_ns):
+            self._match(event)
+            if not step:
+                return True
+        return False
+
+    def _next_step(self):
+        while True:
+            self._step += 1
+            self._step_after_time = self._step_stamp
+            self._step_stamp = None
+            if self._step == len(self.steps):
+                self.close()
+                return
+            # The events matching this step might have been received before the previous one completed
+            if self._store is None or not self._match_stored_events():
+                return
+
+    def close(self):
+        """
+        Signal the waiting thread, or coroutine.
+        """
+        self.done.set()
+        if self.future is not None:
+            _notify_future(self.future)
+
+    def result(self):
+        """
+        Return the matched events, in order, and the patterns still to match.
+        """
+        return MatchedEvents(matches=list(self.matches), missed=self.patterns)
+
+
+@attr.s(kw_only=True, slots=True, hash=False, eq=False)
+class EventSubscription:
+    """
+    A subscription to the events received by the event listener.
+
+    Instances of this class are returned by
+    :py:func:`~saltfactories.plugins.event_listener.EventListener.subscribe`, and they receive every
+    matching event as soon as the event listener receives it, regardless of the events store.
+    Iterate through the subscription to get those events:
+
+    .. code-block:: python
+
+        with event_listener.subscribe([(salt_master.id, "salt/job/*/ret/*")]) as subscription:
+            for event in subscription:
+                print(event.tag)
+
+    Or, asynchronously:
+
+    .. code-block:: python
+
+        async with event_listener.subscribe([(salt_master.id, "salt/job/*/ret/*")]) as subscription:
+            async for event in subscription:
+                print(event.tag)
+
+    Iteration stops once the subscription is closed and all queued events were consumed.
+
+    :keyword ~saltfactories.plugins.event_listener.EventListener event_listener:
+        The event listener instance.
+    :keyword set patterns:
+        A set of tuples in the form of ``("<daemon-id>", "<event-tag-pattern>")``, optionally with a data
+        predicate as a third item. Check
+        :py:meth:`~saltfactories.plugins.event_listener.EventListener.wait_for_events`.
+    :keyword int maxsize:
+        The maximum number of events to keep queued. Once reached, the oldest queued events are
+        discarded and accounted for in the ``dropped`` attribute. ``0`` means no limit.
+    """
+
+    event_listener = attr.ib(repr=False)
+    patterns = attr.ib(converter=lambda patterns: frozenset(normalize_patterns(patterns)))
+    maxsize = attr.ib(default=1000)
+    closed = attr.ib(init=False, default=False)
+    dropped = attr.ib(init=False, default=0)
+    _events = attr.ib(init=False, repr=False, factory=deque)
+    _getters = attr.ib(init=False, repr=False, factory=deque)
+    _lock = attr.ib(init=False, repr=False, factory=threading.Condition)
+
+    @property
+    def daemon_ids(self):
+        """
+        The daemon IDs targeted by this subscription.
+        """
+        return {pattern[0] for pattern in self.patterns}
+
+    def feed(self, event):
+        """
+        Queue the event if it matches any of the subscription patterns.
+        """
+        for pattern in self.patterns:
+            if match_pattern(event, pattern):
+                self._push(event)
+                return
+
+    def _push(self, event):
+        with self._lock:
+            if self.closed:
+                return
+            while self._getters:
+                getter = self._getters.popleft()
+                loop = getter.get_loop()
+                if not getter.done() and not loop.is_closed():
+                    loop.call_soon_threadsafe(self._deliver, getter, event)
+                    return
+            if self.maxsize and len(self._events) >= self.maxsize:
+                if not self.dropped:
+                    log.warning(
+                        "%s is full. Discarding the oldest events. Consider a bigger maxsize.", self
+                    )
+                self._events.popleft()
+                self.dropped += 1
+            self._events.append(event)
+            self._lock.notify()
+
+    def _deliver(self, getter, event):
+        if getter.done():
+            # The getter was cancelled meanwhile
+            self._push(event)
+        else:
+            getter.set_result(event)
+
+    def close(self):
+        """
+        Close the subscription.
+
+        Any events still queued can still be consumed, after which, iteration stops.
+        """
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            getters = list(self._getters)
+            self._getters.clear()
+            self._lock.notify_all()
+        self.event_listener._unregister_waiter(self)  # noqa: SLF001
+        for getter in getters:
+            _notify_future(getter)
+
+    def get(self, timeout=None):
+        """
+        Return the next received event.
+
+        :keyword int,float timeout:
+            The amount of time to wait for an event, in seconds. ``None`` means wait until an event
+            is received or the subscription is closed.
+        :return:
+            An instance of :py:class:`~saltfactories.plugins.event_listener.Event` or ``None`` if
+            no event was received in time or the subscription was closed.
+        """
+        with self._lock:
+            self._lock.wait_for(lambda: self._events or self.closed, timeout)
+            if self._events:
+                return self._events.popleft()
+            return None
+
+    def __iter__(self):
+        """
+        Iterate through the received events, blocking while waiting for them.
+        """
+        return self
+
+    def __next__(self):
+        """
+        Return the next received event.
+        """
+        event = self.get()
+        if event is None:
+            raise StopIteration
+        return event
+
+    def __enter__(self):
+        """
+        Context manager support.
+        """
+        return self
+
+    def __exit__(self, *_):
+        """
+        Close the subscription when exiting the context manager.
+        """
+        self.close()
+
+    async def _get(self):
+        with self._lock:
+            if self._events:
+                return self._events.popleft()
+            if self.closed:
+                return None
+            getter = asyncio.get_running_loop().create_future()
+            self._getters.append(getter)
+        try:
+            return await getter
+        finally:
+            if getter.cancelled():
+                with self._lock:
+                    if getter in self._getters:
+                        self._getters.remove(getter)
+
+    def __aiter__(self):
+        """
+        Asynchronously iterate through the received events.
+        """
+        return self
+
+    async def __anext__(self):
+        """
+        Return the next received event.
+        """
+        event = await self.event_listener._run_in_loop(self._get())  # noqa: SLF001
+        if event is None:
+            raise StopAsyncIteration
+        return event
+
+    async def __aenter__(self):
+        """
+        Async context manager support.
+        """
+        return self
+
+    async def __aexit__(self, *_):
+        """
+        Close the subscription when exiting the async context manager.
+        """
+        self.close()
+
+
+def get_payload_stamp(payload):
+    """
+    Return the stamp of a forwarded event payload.
+    """
+    data = payload["data"]
+    if isinstance(data, bytes):
+        return payload["stamp"]
+    # Events forwarded by older versions of the pytest salt engine
+    return data["_stamp"]
+
+
+def event_from_payload(payload, expire_seconds, test_nodeid=None):
+    """
+    Return an :py:class:`~saltfactories.plugins.event_listener.Event` out of a forwarded event payload.
+    """
+    data = payload["data"]
+    if isinstance(data, bytes):
+        # The event data is still packed. Store it as is, it will only get unpacked
+        # if accessed.
+        return Event(
+            daemon_id=payload["id"],
+            tag=payload["tag"],
+            stamp=payload["stamp"],
+            raw_data=data,
+            expire_seconds=expire_seconds,
+            test_nodeid=test_nodeid,
+        )
+    # Events forwarded by older versions of the pytest salt engine
+    return Event(
+        daemon_id=payload["id"],
+        tag=payload["tag"],
+        stamp=data["_stamp"],
+        full_data=data,
+        expire_seconds=expire_seconds,
+        test_nodeid=test_nodeid,
+    )
@@ -6,10 +6,16 @@ when a daemon is up and running
 """
 import asyncio
 import atexit
+import contextlib
 import datetime
+import fnmatch
 import logging
+import os
+import struct
+import tempfile
 import threading
 import time
+import uuid
 from collections import deque
 from collections.abc import MutableMapping
 
@@ -89,23 +95,261 @@ def ext_type_encoder(obj):
     return obj
 
 
+def pack_event(payload, seq=None):
+    """
+    Pack an event to forward.
+
+    The event data is packed on its own, allowing the event listener to keep it packed
+    and only unpack it if needed. When passed, ``seq`` is the event's forward sequence number.
+    """
+    data = payload["data"]
+    envelope = {
+        "id": payload["id"],
+        "tag": payload["tag"],
+        "stamp": data.get("_stamp"),
+        "data": msgpack.packb(data, use_bin_type=True, default=ext_type_encoder),
+    }
+    if seq is not None:
+        envelope["seq"] = seq
+    return msgpack.packb(envelope, use_bin_type=True)
+
+
+class PyTestEventForwardReplayBuffer:
+    """
+    Number the forwarded events and keep the last ``size`` of them around.
+
+    Sequence numbers start at 1 for every ``session``, that is, for every engine start. After
+    a reconnect, the event listener tells which is the last sequence number it received and the
+    buffered events after it are forwarded again. Any event which already left the buffer is
+    lost, and reported as such by the event listener.
+    """
+
+    __slots__ = ("session", "size", "last_seq", "_frames")
+
+    def __init__(self, size=1000):
+        self.session = uuid.uuid4().hex
+        self.size = size
+        self.last_seq = 0
+        self._frames = deque(maxlen=size)
+
+    def add(self, payload):
+        """
+        Pack an event with the next sequence number, returning the packed event.
+
+        Events restored from the spill file are already packed, without a sequence number.
+        """
+        seq = self.last_seq + 1
+        if isinstance(payload, bytes):
+            # Only the envelope gets unpacked, the event data is packed on its own
+            envelope = msgpack.unpackb(payload, raw=False)
+            envelope["seq"] = seq
+            packed = msgpack.packb(envelope, use_bin_type=True)
+        else:
+            packed = pack_event(payload, seq=seq)
+        self.last_seq = seq
+        if self.size:
+            self._frames.append((seq, packed))
+        return packed
+
+    def since(self, seq):
+        """
+        Return the buffered packed events with a sequence number greater than ``seq``.
+        """
+        if seq >= self.last_seq:
+            return []
+        return [packed for frame_seq, packed in self._frames if frame_seq > seq]
+
+
+class PyTestEventForwardQueue:
+    """
+    Bounded queue of events to forward.
+
+    What happens when the queue is full depends on the overflow policy:
+
+    * ``drop-oldest``: The oldest queued event is dropped to make room for the new one.
+    * ``block``: Wait, up to ``block_timeout`` seconds, for the client to make room in the
+      queue. If it doesn't, the new event is dropped.
+    * ``spill``: The new event, and all others after it, are written to ``spill_path`` until
+      the client catches up.
+
+    Dropped and spilled events are accounted for and reported to the event listener.
+    """
+
+    OVERFLOW_POLICIES = ("drop-oldest", "block", "spill")
+
+    __slots__ = (
+        "daemon_id",
+        "capacity",
+        "overflow",
+        "spill_path",
+        "block_timeout",
+        "dropped",
+        "spilled",
+        "_queue",
+        "_cond",
+        "_spill_pending",
+        "_spill_write",
+        "_spill_read",
+        "_stop_pending",
+        "_reported_stats",
+    )
+
+    def __init__(
+        self, daemon_id, capacity=1000, overflow="drop-oldest", spill_path=None, block_timeout=5
+    ):
+        if overflow not in self.OVERFLOW_POLICIES:
+            msg = "Unknown overflow policy {!r}. Choose one of: {}".format(
+                overflow, ", ".join(self.OVERFLOW_POLICIES)
+            )
+            raise ValueError(msg)
+        if overflow == "spill" and not spill_path:
+            msg = "The 'spill' overflow policy requires a spill path"
+            raise ValueError(msg)
+        self.daemon_id = daemon_id
+        self.capacity = capacity
+        self.overflow = overflow
+        self.spill_path = spill_path
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        self.spilled = 0
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._spill_pending = 0
+        self._spill_write = None
+        self._spill_read = None
+        self._stop_pending = False
+        self._reported_stats = None
+
+    def __len__(self):  # noqa: D105
+        return len(self._queue) + self._spill_pending + self._stop_pending
+
+    def append(self, payload):
+        """
+        Queue an event to forward, ``None`` tells the client to stop.
+        """
+        with self._cond:
+            if payload is None and self._spill_pending:
+                # Only stop once the spilled events are forwarded
+                self._stop_pending = True
+                return
+            if payload is not None and (self._spill_pending or len(self._queue) >= self.capacity):
+                if self.overflow == "spill":
+                    self._spill(payload)
+                    return
+                if self.overflow == "block":
+                    if not self._cond.wait_for(
+                        lambda: len(self._queue) < self.capacity, timeout=self.block_timeout
+                    ):
+                        self.dropped += 1
+                        return
+                else:
+                    self._queue.popleft()
+                    self.dropped += 1
+            self._queue.append(payload)
+
+    def popleft(self):
+        """
+        Pop the oldest queued event, raising ``IndexError`` if there's none.
+
+        Events restored from the spill file are returned already packed.
+        """
+        with self._cond:
+            if not self._queue and self._spill_pending:
+                self._unspill()
+            payload = self._queue.popleft()
+            if self.overflow == "block":
+                self._cond.notify()
+            return payload
+
+    def get_stats(self):
+        """
+        Return the overflow statistics if they changed since the last call, else ``None``.
+        """
+        with self._cond:
+            stats = (self.dropped, self.spilled)
+            if stats == (self._reported_stats or (0, 0)):
+                return None
+            self._reported_stats = stats
+        return {
+            "ctl": "stats",
+            "id": self.daemon_id,
+            "capacity": self.capacity,
+            "overflow": self.overflow,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+        }
+
+    def _spill(self, payload):
+        try:
+            packed = pack_event(payload)
+        except Exception:  # pylint: disable=broad-except
+            log.exception("Failed to pack event to spill: %r", payload)
+            self.dropped += 1
+            return
+        if self._spill_write is None:
+            self._spill_write = open(self.spill_path, "wb")  # noqa: SIM115
+            self._spill_read = open(self.spill_path, "rb")  # noqa: SIM115
+        self._spill_write.write(struct.pack("!I", len(packed)) + packed)
+        self._spill_write.flush()
+        self._spill_pending += 1
+        self.spilled += 1
+
+    def _unspill(self):
+        for _ in range(min(self.capacity, self._spill_pending)):
+            (size,) = struct.unpack("!I", self._spill_read.read(4))
+            self._queue.append(self._spill_read.read(size))
+            self._spill_pending -= 1
+        if not self._spill_pending:
+            # The client caught up, start over
+            self._spill_write.close()
+            self._spill_read.close()
+            self._spill_write = self._spill_read = None
+            os.unlink(self.spill_path)
+            if self._stop_pending:
+                self._stop_pending = False
+                self._queue.append(None)
+
+
 class PyTestEventForwardClient(asyncio.Protocol):
     """
     TCP Client to forward events.
     """
 
-    def __init__(self, queue, client_running_event):
+    def __init__(
+        self,
+        queue,
+        client_running_event,
+        control_handler=None,
+        flush_window=0,
+        replay=None,
+        heartbeat_interval=0,
+        worker_id=None,
+    ):
         self.queue = queue
+        self.worker_id = worker_id
+        self.flush_window = flush_window
+        self.replay = replay
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_task = None
         self.running = client_running_event
+        self.control_handler = control_handler
         self.task = None
         self.transport = None
+        self.unpacker = msgpack.Unpacker(raw=False)
         try:
             loop = asyncio.get_running_loop()
         except AttributeError:
             # Python < 3.7
             loop = asyncio.get_event_loop()
+        self.loop = loop
         self._connected = loop.create_future()
         self._disconnected = loop.create_future()
+        # Resolved with the last sequence number the event listener received from us
+        self._resumed = loop.create_future()
+        # Set while the queue processing task waits for new events to get queued. It's checked
+        # from the threads which queue events, hence a threading event.
+        self._idle = threading.Event()
+        self._wakeup = asyncio.Event()
 
     def connection_made(self, transport):
         """
@@ -116,12 +360,20 @@ class PyTestEventForwardClient(asyncio.Protocol):
         self._connected.set_result(True)
         # pylint: disable=attribute-defined-outside-init
         self.transport = transport
+        if self.replay is not None:
+            hello = {"ctl": "hello", "id": self.queue.daemon_id, "session": self.replay.session}
+            if self.worker_id is not None:
+                # Lets a broker event listener only relay our events to that pytest-xdist worker
+                hello["worker"] = self.worker_id
+            transport.write(msgpack.packb(hello, use_bin_type=True))
         try:
             loop = asyncio.get_running_loop()
         except AttributeError:
             # Python < 3.7
             loop = asyncio.get_event_loop()
         self.task = loop.create_task(self._process_queue())
+        if self.heartbeat_interval:
+            self.heartbeat_task = loop.create_task(self._send_heartbeats())
         # pylint: enable=attribute-defined-outside-init
 
     def connection_lost(self, exc):  # noqa: ARG002
@@ -129,9 +381,47 @@ class PyTestEventForwardClient(asyncio.Protocol):
         Connection lost.
         """
         log.debug("%s: The server closed the connection", self.__class__.__name__)
-        self._disconnected.set_result(True)
+        if not self._disconnected.done():
+            self._disconnected.set_result(True)
         if self.task is not None:
             self.task.cancel()
+        if self.heartbeat_task is not None:
+            self.heartbeat_task.cancel()
+
+    def data_received(self, data):
+        """
+        Received control data from the server.
+        """
+        self.unpacker.feed(data)
+        for payload in self.unpacker:
+            log.debug("%s: Received control payload: %r", self.__class__.__name__, payload)
+            if payload.get("ctl") == "resume":
+                if not self._resumed.done():
+                    self._resumed.set_result(payload["seq"])
+                continue
+            if self.control_handler is not None:
+                self.control_handler(payload)
+
+    def notify(self):
+        """
+        Wake up the queue processing task, if idle.
+
+        This method is meant to be called, from any thread, after appending to the queue.
+        """
+        if not self._idle.is_set():
+            return
+        self._idle.clear()
+        # The loop might be closed
+        with contextlib.suppress(RuntimeError):
+            self.loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _wait_for_queue(self):
+        self._wakeup.clear()
+        self._idle.set()
+        # Check again, an event might have been queued before we were flagged as idle
+        if not self.queue:
+            await self._wakeup.wait()
+        self._idle.clear()
 
     async def wait_connected(self):
         """
@@ -145,29 +435,105 @@ class PyTestEventForwardClient(asyncio.Protocol):
         """
         return await self._disconnected
 
+    def _drain_queue(self):
+        """
+        Pack all queued events.
+
+        Returns a tuple with the list of packed events and a boolean which is ``True`` if
+        the stop sentinel was found in the queue.
+        """
+        batch = []
+        while True:
+            try:
+                payload = self.queue.popleft()
+            except IndexError:
+                return batch, False
+            if payload is None:
+                return batch, True
+            try:
+                if self.replay is not None:
+                    batch.append(self.replay.add(payload))
+                elif isinstance(payload, bytes):
+                    # Already packed
+                    batch.append(payload)
+                else:
+                    batch.append(pack_event(payload))
+            except Exception:  # pylint: disable=broad-except
+                log.exception(
+                    "%s: Failed to pack event: %r",
+                    self.__class__.__name__,
+                    payload,
+                )
+
+    async def _send_heartbeats(self):
+        """
+        Let the event listener know, every ``heartbeat_interval`` seconds, that the daemon is alive.
+        """
+        heartbeat = msgpack.packb(
+            {"ctl": "heartbeat", "id": self.queue.daemon_id, "interval": self.heartbeat_interval},
+            use_bin_type=True,
+        )
+        while not self.transport.is_closing():
+            self.transport.write(heartbeat)
+            await asyncio.sleep(self.heartbeat_interval)
+
+    async def _resume(self):
+        """
+        Forward again the events which the event listener did not receive.
+        """
+        try:
+            seq = await asyncio.wait_for(self._resumed, timeout=5)
+        except asyncio.TimeoutError:
+            log.warning(
+                "%s: The event listener did not tell where to resume forwarding from",
+                self.__class__.__name__,
+            )
+            return
+        frames = self.replay.since(seq)
+        if frames:
+            log.info(
+                "%s: Forwarding %d events again after reconnecting",
+                self.__class__.__name__,
+                len(frames),
+            )
+            self.transport.writelines(frames)
+
     async def _process_queue(self):
+        if self.replay is not None:
+            await self._resume()
         self.running.set()
         log.info("%s: Now processing the queue", self.__class__.__name__)
         restarts = 0
         max_restarts = 10
         while True:
-            if restarts > max_restarts:
-                self._disconnected.set_result(True)
-                break
-            if not self.running.is_set():
-                self._disconnected.set_result(True)
+            if restarts > max_restarts or not self.running.is_set():
+                if not self._disconnected.done():
+                    self._disconnected.set_result(True)
                 break
             try:
-                try:
-                    payload = self.queue.popleft()
-                except IndexError:
-                    await asyncio.sleep(1)
+                if not self.queue:
+                    await self._wait_for_queue()
                     continue
-                if payload is None:
-                    return
-                dumped = msgpack.packb(payload, use_bin_type=True, default=ext_type_encoder)
-                self.transport.write(dumped)
-                log.debug("%s: forwarded event: %r", self.__class__.__name__, payload)
+                if self.flush_window:
+                    # Give the engine some time to queue more events to send in one go
+                    await asyncio.sleep(self.flush_window)
+                batch, stop = self._drain_queue()
+                stats = self.queue.get_stats()
+                if stats is not None:
+                    log.warning(
+                        "%s: The forward queue is full. Dropped events: %d; Spilled events: %d",
+                        self.__class__.__name__,
+                        stats["dropped"],
+                        stats["spilled"],
+                    )
+                    batch.append(msgpack.packb(stats, use_bin_type=True))
+                if batch:
+                    self.transport.writelines(batch)
+                    log.debug("%s: forwarded %d events", self.__class__.__name__, len(batch))
+                if stop:
+                    if not self._disconnected.done():
+                        self._disconnected.set_result(True)
+                    break
             except asyncio.CancelledError:
                 break
             except Exception:  # pylint: disable=broad-except
@@ -189,30 +555,66 @@ class PyTestEventForwardEngine:
         "role",
         "returner_address_host",
         "returner_address_port",
+        "returner_address_path",
+        "worker_id",
         "running_event",
         "client_running_event",
         "loop",
         "client",
         "queue",
+        "replay",
         "running_thread",
+        "drop_tags",
+        "keep_tags",
+        "flush_window",
+        "heartbeat_interval",
     )
 
     def __init__(self, opts):
         self.opts = opts
         self.id = self.opts["id"]  # pylint: disable=invalid-name
         self.role = self.opts["__role"]
-        returner_address = self.opts["pytest-{}".format(self.role)]["returner_address"]
+        pytest_config = self.opts["pytest-{}".format(self.role)]
+        returner_address = pytest_config["returner_address"]
+        engine_config = pytest_config.get("engine") or {}
         self.returner_address_host = returner_address["host"]
         self.returner_address_port = returner_address["port"]
+        # When set, and reachable, the unix socket is preferred over TCP
+        self.returner_address_path = returner_address.get("path")
+        # The pytest-xdist worker which started this daemon, when sharing a broker event listener
+        self.worker_id = returner_address.get("worker_id")
         self.running_event = threading.Event()
         self.client_running_event = threading.Event()
         self.loop = asyncio.new_event_loop()
         self.client = None
-        self.queue = deque(maxlen=1000)
+        spill_path = engine_config.get("spill_path")
+        if not spill_path:
+            spill_path = os.path.join(
+                self.opts.get("cachedir") or tempfile.gettempdir(),
+                "pytest-{}-{}-events.spill".format(self.role, self.id),
+            )
+        self.queue = PyTestEventForwardQueue(
+            self.id,
+            capacity=int(engine_config.get("queue_capacity") or 1000),
+            overflow=engine_config.get("overflow") or "drop-oldest",
+            spill_path=spill_path,
+        )
+        # The forwarded events kept around to forward them again after reconnecting
+        replay_buffer = engine_config.get("replay_buffer")
+        self.replay = PyTestEventForwardReplayBuffer(
+            size=int(1000 if replay_buffer is None else replay_buffer)
+        )
         self.running_thread = threading.Thread(target=self._run_loop_in_thread, args=(self.loop,))
+        # The event listener tells us which events we can avoid forwarding
+        self.drop_tags = ()
+        self.keep_tags = ()
+        # How long, in seconds, to wait for more events to be queued before forwarding them
+        self.flush_window = float(engine_config.get("flush_window") or 0)
+        # How often, in seconds, to let the event listener know that the daemon is alive, 0 disables it
+        heartbeat_interval = engine_config.get("heartbeat_interval")
+        self.heartbeat_interval = float(1 if heartbeat_interval is None else heartbeat_interval)
 
     def _run_loop_in_thread(self, loop):
-        loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
         try:
             loop.run_until_complete(self._run_client(loop))
@@ -221,18 +623,70 @@ class PyTestEventForwardEngine:
             loop.close()
 
     async def _run_client(self, loop):
+        # Seconds to wait before reconnecting, doubled after each failed attempt
+        backoff = min_backoff = 0.1
+        max_backoff = 5
+        while self.running_event.is_set():
+            if await self._run_client_connection(loop):
+                backoff = min_backoff
+            if not self.running_event.is_set():
+                break
+            log.info("%s client reconnecting in %.1f seconds", self.__class__.__name__, backoff)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, max_backoff)
+
+    async def _connect(self, loop):
+        if self.returner_address_path and os.path.exists(self.returner_address_path):
+            try:
+                transport, _ = await loop.create_unix_connection(
+                    lambda: self.client, self.returner_address_path
+                )
+            except OSError as exc:
+                # For example, a daemon running in a container with the socket path mounted
+                log.warning(
+                    "%s client failed to connect to %s, falling back to TCP: %s",
+                    self.__class__.__name__,
+                    self.returner_address_path,
+                    exc,
+                )
+            else:
+                log.debug(
+                    "%s client connected to %s",
+                    self.__class__.__name__,
+                    self.returner_address_path,
+                )
+                return transport
+        transport, _ = await loop.create_connection(
+            lambda: self.client,
+            self.returner_address_host,
+            self.returner_address_port,
+        )
+        return transport
+
+    async def _run_client_connection(self, loop):
+        """
+        Forward events until disconnected, returning ``True`` if the connection was successful.
+        """
         log.debug(
             "%s client connecting to %s:%s",
             self.__class__.__name__,
             self.returner_address_host,
             self.returner_address_port,
         )
-        self.client = PyTestEventForwardClient(self.queue, self.client_running_event)
-        transport, _ = await loop.create_connection(
-            lambda: self.client,
-            self.returner_address_host,
-            self.returner_address_port,
+        self.client = PyTestEventForwardClient(
+            self.queue,
+            self.client_running_event,
+            control_handler=self._handle_control_payload,
+            flush_window=self.flush_window,
+            replay=self.replay,
+            heartbeat_interval=self.heartbeat_interval,
+            worker_id=self.worker_id,
         )
+        try:
+            transport = await self._connect(loop)
+        except OSError as exc:
+            log.warning("%s client failed to connect: %s", self.__class__.__name__, exc)
+            return False
         # Wait until the protocol signals that the connection
         # is lost and close the transport.
         try:
@@ -240,12 +694,34 @@ class PyTestEventForwardEngine:
         except asyncio.TimeoutError:
             log.error("The client failed to connect to the server after 15 seconds")  # noqa: TRY400
             transport.close()
-        else:
-            try:
-                log.info("%s client started", self.__class__.__name__)
-                await self.client.wait_disconnected()
-            finally:
-                transport.close()
+            return False
+        try:
+            log.info("%s client started", self.__class__.__name__)
+            await self.client.wait_disconnected()
+        finally:
+            transport.close()
+        return True
+
+    def _handle_control_payload(self, payload):
+        if payload.get("ctl") == "filter":
+            self.keep_tags = tuple(
+                pattern for daemon_id, pattern in payload.get("keep") or () if daemon_id == self.id
+            )
+            self.drop_tags = tuple(payload.get("drop") or ())
+            log.debug(
+                "%s updated the forward filter. Drop: %s; Keep: %s",
+                self,
+                self.drop_tags,
+                self.keep_tags,
+            )
+
+    def _should_forward(self, tag):
+        """
+        Check if the event tag should be forwarded to the event listener.
+        """
+        if not any(fnmatch.fnmatch(tag, pattern) for pattern in self.drop_tags):
+            return True
+        return any(fnmatch.fnmatch(tag, pattern) for pattern in self.keep_tags)
 
     def __repr__(self):  # noqa: D105
         return "<{} role={!r} id={!r}, returner_address='{}:{}' running={!r}>".format(
@@ -272,6 +748,8 @@ class PyTestEventForwardEngine:
         while True:
             log.info("Waiting for %s.client to start...", self.__class__.__name__)
             if time.time() > timeout_at:
+                # Stop the client from trying to reconnect
+                self.running_event.clear()
                 msg = "Failed to start client"
                 raise RuntimeError(msg)
             if self.client is None:
@@ -301,10 +779,13 @@ class PyTestEventForwardEngine:
                         if not event:
                             continue
                         tag = event["tag"]
+                        if not self._should_forward(tag):
+                            continue
                         data = event["data"]
                         log.debug("%s Received Event; TAG: %r DATA: %r", self, tag, data)
                         forward = {"id": self.id, "tag": tag, "data": data}
                         self.queue.append(forward)
+                        self.client.notify()
         finally:
             if self.running_event.is_set():
                 # Some exception happened, unset
@@ -321,5 +802,7 @@ class PyTestEventForwardEngine:
         self.running_event.clear()
         self.queue.append(None)
         self.client_running_event.clear()
+        if self.client is not None:
+            self.client.notify()
         self.running_thread.join()
         log.info("%s stopped", self)
@@ -8,8 +8,10 @@ import pprint
 import socket
 import subprocess
 import sys
+import threading
 import time
 import traceback
+from collections import deque
 
 try:
     from salt.utils.stringutils import to_unicode
@@ -43,6 +45,11 @@ __virtualname__ = "pytest_log_handler"
 
 log = logging.getLogger(__name__)
 
+# The log record arguments which can be sent as is, to be formatted by the log server
+MSGPACK_SAFE_TYPES = (str, int, float, bool, type(None))
+# The first frame of the log record batches meant for a pytest-xdist worker, followed by its ID
+TOPIC_PREFIX = b"topic:"
+
 
 def __virtual__():
     if HAS_MSGPACK is False:
@@ -117,7 +124,16 @@ def setup_handlers():
         level = LOG_LEVELS[(log_opts.get("level") or "error").lower()]
     except KeyError:
         level = logging.ERROR
-    handler = ZMQHandler(host=host_addr, port=host_port, log_prefix=pytest_log_prefix, level=level)
+    handler = ZMQHandler(
+        host=host_addr,
+        port=host_port,
+        log_prefix=pytest_log_prefix,
+        level=level,
+        control_port=log_opts.get("control_port"),
+        daemon_id=__opts__.get("id"),
+        defer_formatting=log_opts.get("defer_formatting", False),
+        worker_id=log_opts.get("worker_id"),
+    )
     handler.setLevel(level)
     handler.start()
     return handler
@@ -126,6 +142,24 @@ def setup_handlers():
 class ZMQHandler(ExcInfoOnLogLevelFormatMixin, logging.Handler):
     """
     ZMQ logging handler implementation.
+
+    Log records are formatted on the thread which logged them and queued. A background thread
+    serializes the queued records and sends them to the log server in batches of up to
+    ``batch_size`` records. At most ``socket_hwm`` records are queued, newer ones get dropped.
+
+    When ``control_port`` is passed, the handler subscribes to the log level published there by
+    the log server, and uses it instead of the log level it was created with, until the log
+    server publishes ``None``.
+
+    When ``daemon_id`` is passed, it's added to the log records as ``pytest_daemon_id``, which the
+    log server uses to tell which salt daemon each log record comes from.
+
+    With ``defer_formatting=True``, the log records whose arguments can be msgpack serialized as
+    is, and which carry no exception or stack information, are sent unformatted. The log message
+    then only gets formatted in the test process, if a logging handler there accepts the record.
+
+    When ``worker_id`` is passed, the log record batches are sent with a topic frame telling a
+    broker log server to only publish them to that pytest-xdist worker.
     """
 
     # We implement a lazy start approach which is deferred until sending the
@@ -137,18 +171,38 @@ class ZMQHandler(ExcInfoOnLogLevelFormatMixin, logging.Handler):
     # pid attribute against the current process pid. If it's not a match, we
     # reconnect the ZMQ machinery.
 
-    def __init__(
-        self, host="127.0.0.1", port=3330, log_prefix=None, level=logging.NOTSET, socket_hwm=100000
+    def __init__(  # noqa: PLR0913
+        self,
+        host="127.0.0.1",
+        port=3330,
+        log_prefix=None,
+        level=logging.NOTSET,
+        socket_hwm=100000,
+        batch_size=100,
+        control_port=None,
+        daemon_id=None,
+        defer_formatting=False,
+        worker_id=None,
     ):
         super().__init__(level=level)
         self.host = host
         self.port = port
         self._log_prefix = log_prefix
         self.socket_hwm = socket_hwm
+        self.batch_size = batch_size
+        self.control_port = control_port
+        self.daemon_id = daemon_id
+        self.defer_formatting = defer_formatting
+        self.worker_id = worker_id
+        self.configured_level = level
         self.log_prefix = self._get_log_prefix(log_prefix)
         self.context = self.pusher = None
         self._exiting = False
         self.dropped_messages_count = 0
+        self._sending = self._stopping = False
+        self._sender = self._controller = None
+        self._dropped_to_report = 0
+        self._reset_sender()
         # We set the formatter so that we only include the actual log message and not any other
         # fields found in the log record
         self.__formatter = logging.Formatter("%(message)s")
@@ -180,8 +234,13 @@ class ZMQHandler(ExcInfoOnLogLevelFormatMixin, logging.Handler):
             "host": self.host,
             "port": self.port,
             "log_prefix": self._log_prefix,
-            "level": self.level,
+            "level": self.configured_level,
             "socket_hwm": self.socket_hwm,
+            "batch_size": self.batch_size,
+            "control_port": self.control_port,
+            "daemon_id": self.daemon_id,
+            "defer_formatting": self.defer_formatting,
+            "worker_id": self.worker_id,
         }
 
     def __setstate__(self, state):  # noqa: D105
@@ -194,6 +253,16 @@ class ZMQHandler(ExcInfoOnLogLevelFormatMixin, logging.Handler):
             self.__class__.__name__, self.host, self.port, logging.getLevelName(self.level)
         )
 
+    def _reset_sender(self):
+        # The sender thread does not survive a fork, and the lock might have been held by it
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._sending = False
+        self._stopping = False
+        self._sender = None
+        self._controller = None
+        self._dropped_to_report = 0
+
     def _get_log_prefix(self, log_prefix):
         if log_prefix is None:
             return None
@@ -209,6 +278,7 @@ class ZMQHandler(ExcInfoOnLogLevelFormatMixin, logging.Handler):
         Start the handler.
         """
         if self.pid != os.getpid():
+            self._reset_sender()
             self.stop()
             self._exiting = False
 
@@ -254,6 +324,19 @@ class ZMQHandler(ExcInfoOnLogLevelFormatMixin, logging.Handler):
             return
 
         self.pid = os.getpid()
+        self._stopping = False
+        self._sender = threading.Thread(
+            target=self._process_queue, name="{}Sender".format(self.__class__.__name__)
+        )
+        self._sender.daemon = True
+        self._sender.start()
+        if self.control_port:
+            self._controller = threading.Thread(
+                target=self._process_log_levels,
+                name="{}Controller".format(self.__class__.__name__),
+            )
+            self._controller.daemon = True
+            self._controller.start()
 
     def stop(self, flush=True):
         """
@@ -264,6 +347,19 @@ class ZMQHandler(ExcInfoOnLogLevelFormatMixin, logging.Handler):
 
         self._exiting = True
 
+        if self._sender is not None:
+            if flush:
+                self.flush()
+            with self._cond:
+                self._stopping = True
+                self._cond.notify_all()
+            self._sender.join()
+            self._sender = None
+            self._queue.clear()
+        if self._controller is not None:
+            self._controller.join()
+            self._controller = None
+
         if self.dropped_messages_count:
             sys.stderr.write(
                 "Dropped {} messages from getting forwarded. High water mark reached...\n".format(
@@ -314,34 +410,74 @@ class ZMQHandler(ExcInfoOnLogLevelFormatMixin, logging.Handler):
     def prepare(self, record):
         """
         Prepare the log record.
+
+        Returns the log record attributes to serialize.
         """
-        msg = self.format(record)
+        if self.defer_formatting and self._can_defer_formatting(record):
+            msg = record.msg
+            args = record.args
+            if self.log_prefix:
+                prefix = to_unicode(self.log_prefix)
+                if args:
+                    prefix = prefix.replace("%", "%%")
+                msg = "[{}] {}".format(prefix, msg)
+        else:
+            msg = self.format(record)
+            args = None
         record = copy.copy(record)
         record.msg = msg
         # Reduce network bandwidth, we don't need these any more
-        record.args = None
+        record.args = args
         record.exc_info = None
         record.exc_text = None
         record.message = None  # redundant with msg
         # On Python >= 3.5 we also have stack_info, but we've formatted already so, reset it
         record.stack_info = None
+        if self.daemon_id is not None:
+            record.pytest_daemon_id = self.daemon_id
+        return record.__dict__
+
+    @staticmethod
+    def _can_defer_formatting(record):
+        """
+        Return ``True`` if the log record can be sent unformatted.
+        """
+        if not isinstance(record.msg, str):
+            return False
+        if record.exc_info or record.exc_text or record.stack_info:
+            return False
+        if getattr(record, "exc_info_on_loglevel", None):
+            # Salt adds the exception information when formatting the log record
+            return False
+        args = record.args
+        if isinstance(args, dict):
+            return all(
+                isinstance(key, str) and isinstance(value, MSGPACK_SAFE_TYPES)
+                for key, value in args.items()
+            )
+        return all(isinstance(arg, MSGPACK_SAFE_TYPES) for arg in args or ())
+
+    def serialize(self, record_dict):
+        """
+        Serialize the prepared log record.
+        """
         try:
-            return msgpack.dumps(record.__dict__, use_bin_type=True)
+            return msgpack.dumps(record_dict, use_bin_type=True)
         except TypeError as exc:
             # Failed to serialize something with msgpack
             sys.stderr.write(
                 "Failed to serialize log record:{}.\n{}\nLog Record:\n{}\n".format(
-                    exc, traceback.format_exc(), pprint.pformat(record.__dict__)
+                    exc, traceback.format_exc(), pprint.pformat(record_dict)
                 )
             )
             sys.stderr.flush()
-            self.handleError(record)
+            self.handleError(logging.makeLogRecord(record_dict))
 
     def emit(self, record):
         """
         Emit a record.
 
-        Writes the LogRecord to the queue, preparing it for pickling first.
+        Queues the LogRecord, preparing it for serialization first.
         """
         # Python's logging machinery acquires a lock before calling this method
         # that's why it's safe to call the start method without an explicit acquire
@@ -356,19 +492,21 @@ class ZMQHandler(ExcInfoOnLogLevelFormatMixin, logging.Handler):
             sys.stderr.flush()
             return
         try:
-            msg = self.prepare(record)
-            if msg:
-                try:
-                    self._send_message(msg)
-                except zmq.error.Again:
-                    # Sleep a little and give up
-                    time.sleep(0.001)
-                    try:
-                        self._send_message(msg)
-                    except zmq.error.Again:
-                        # We can't send it nor queue it for send.
-                        # Drop it, otherwise, this call blocks until we can at least queue the message
-                        self.dropped_messages_count += 1
+            record_dict = self.prepare(record)
+            with self._cond:
+                dropped_messages_count, self._dropped_to_report = self._dropped_to_report, 0
+                if len(self._queue) >= self.socket_hwm:
+                    # Drop it, otherwise, this call blocks until the queue gets drained
+                    self.dropped_messages_count += 1
+                    return
+                self._queue.append(record_dict)
+                if not self._sending:
+                    self._cond.notify()
+            if dropped_messages_count:
+                logging.getLogger(__name__).debug(
+                    "Dropped %s messages from getting forwarded. High water mark reached...",
+                    dropped_messages_count,
+                )
         except (SystemExit, KeyboardInterrupt):  # pragma: no cover pylint: disable=try-except-raise
             # Catch and raise SystemExit and KeyboardInterrupt so that we can handle
             # all other exception below
@@ -377,14 +515,81 @@ class ZMQHandler(ExcInfoOnLogLevelFormatMixin, logging.Handler):
         except Exception:  # pragma: no cover pylint: disable=broad-except
             self.handleError(record)
 
-    def _send_message(self, msg):
-        self.pusher.send(msg, flags=zmq.NOBLOCK)  # pylint: disable=no-member
-        if self.dropped_messages_count:
-            logging.getLogger(__name__).debug(
-                "Dropped %s messages from getting forwarded. High water mark reached...",
-                self.dropped_messages_count,
-            )
-            self.dropped_messages_count = 0
+    def flush(self):
+        """
+        Wait, for up to 1.5 seconds, for the queued log records to be sent.
+        """
+        if self._sender is None or self._sender is threading.current_thread():
+            return
+        with self._cond:
+            self._cond.wait_for(lambda: not self._queue and not self._sending, timeout=1.5)
+
+    def _process_queue(self):
+        """
+        Serialize and send the queued log records, in batches, until stopped.
+        """
+        while True:
+            with self._cond:
+                self._sending = False
+                self._cond.notify_all()
+                self._cond.wait_for(lambda: self._queue or self._stopping)
+                if self._stopping:
+                    return
+                batch = [
+                    self._queue.popleft() for _ in range(min(len(self._queue), self.batch_size))
+                ]
+                self._sending = True
+            msgs = [msg for msg in map(self.serialize, batch) if msg]
+            if msgs:
+                self._send_messages(msgs)
+
+    def _process_log_levels(self):
+        """
+        Apply the log levels published by the log server until stopped.
+        """
+        subscriber = self.context.socket(zmq.SUB)  # pylint: disable=no-member
+        try:
+            subscriber.setsockopt(zmq.SUBSCRIBE, b"")  # pylint: disable=no-member
+            subscriber.connect("tcp://{}:{}".format(self.host, self.control_port))
+            while not self._stopping:
+                if not subscriber.poll(250):
+                    continue
+                level = msgpack.loads(subscriber.recv())
+                if level is None:
+                    level = self.configured_level
+                if level != self.level:
+                    self.setLevel(level)
+        except zmq.ZMQError:  # pragma: no cover
+            # The context got terminated under us
+            pass
+        finally:
+            subscriber.close(0)
+
+    def _send_messages(self, msgs):
+        frames = msgs
+        if self.worker_id is not None:
+            frames = [TOPIC_PREFIX + self.worker_id.encode() + b"/", *msgs]
+        # Unlike the threads logging, the sender can wait a little for the queue to be drained
+        for delay in (0.001, 0.01, 0.1, 0.5, None):
+            try:
+                self.pusher.send_multipart(frames, flags=zmq.NOBLOCK)  # pylint: disable=no-member
+            except zmq.error.Again:
+                if delay is None or self._stopping:
+                    break
+                time.sleep(delay)
+            except zmq.ZMQError:  # pragma: no cover
+                # The socket got closed under us
+                break
+            else:
+                with self._cond:
+                    # Reported by the next emit call, logging from this thread could deadlock
+                    # with logging.shutdown() waiting for it to stop while holding our lock
+                    self._dropped_to_report += self.dropped_messages_count
+                    self.dropped_messages_count = 0
+                return
+        # We can't send them nor queue them for send. Drop them.
+        with self._cond:
+            self.dropped_messages_count += len(msgs)
 
     def close(self):
         """
@@ -0,0 +1,3 @@
+# pylint: skip-file
+
+__version__ = "0.1.dev14+gfea373a5f.d20261016"
@@ -0,0 +1,15 @@
+"""
+Tests related to the event listener pytest plugin.
+"""
+
+
+def test_plugin_loads(pytester):
+    pytester.makepyfile(
+        """
+        def test_one(event_listener):
+            assert event_listener.store is not None
+        """
+    )
+    res = pytester.runpytest("-vv")
+    res.assert_outcomes(passed=1)
+    res.stdout.no_fnmatch_line("*INTERNALERROR*")
@@ -0,0 +1,698 @@
+"""
+Unit tests for the event listener.
+"""
+import asyncio
+import socket
+import threading
+import time
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+
+import msgpack
+import pytest
+
+from saltfactories.plugins.event_listener import DaemonHeartbeatLostError
+from saltfactories.plugins.event_listener import Event
+from saltfactories.plugins.event_listener import EventJournal
+from saltfactories.plugins.event_listener import EventListener
+from saltfactories.plugins.event_listener import EventStore
+from saltfactories.utils.saltext.engines.pytest_engine import pack_event
+
+
+def _stamp(timestamp=None):
+    if timestamp is None:
+        timestamp = time.time()
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).replace(tzinfo=None).isoformat()
+
+
+def _payload(daemon_id, tag, timestamp=None, **data):
+    data["_stamp"] = _stamp(timestamp)
+    return {"id": daemon_id, "tag": tag, "data": data}
+
+
+def _event(daemon_id, tag, timestamp=None, expire_seconds=120, test_nodeid=None):
+    return Event(
+        daemon_id=daemon_id,
+        tag=tag,
+        stamp=_stamp(timestamp),
+        full_data={},
+        expire_seconds=expire_seconds,
+        test_nodeid=test_nodeid,
+    )
+
+
+@pytest.fixture
+def listener():
+    return EventListener()
+
+
+def test_store_query_by_daemon_and_tag_pattern():
+    store = EventStore()
+    start_time = time.time()
+    master_start = _event("master-1", "salt/master/master-1/start", start_time)
+    job_ret = _event("master-1", "salt/job/123/ret/minion-1", start_time + 1)
+    other_master_start = _event("master-2", "salt/master/master-2/start", start_time)
+    for event in (master_start, job_ret, other_master_start):
+        store.append(event)
+
+    after_time = datetime.fromtimestamp(start_time - 1, tz=timezone.utc)
+    assert store.query("master-1", "salt/master/*/start", after_time) == [master_start]
+    assert store.query("master-1", "salt/job/*/ret/*", after_time) == [job_ret]
+    assert store.query("master-1", "*", after_time) == [master_start, job_ret]
+    assert store.query("master-1", "salt/master/master-1/start", after_time) == [master_start]
+    assert store.query("master-2", "salt/job/*", after_time) == []
+    assert store.query("master-3", "*", after_time) == []
+
+
+def test_store_query_after_time():
+    store = EventStore()
+    start_time = time.time()
+    old_event = _event("master-1", "salt/test", start_time - 10)
+    new_event = _event("master-1", "salt/test", start_time)
+    store.append(new_event)
+    store.append(old_event)
+
+    after_time = datetime.fromtimestamp(start_time - 5, tz=timezone.utc)
+    assert store.query("master-1", "salt/*", after_time) == [new_event]
+    after_time = datetime.fromtimestamp(start_time - 20, tz=timezone.utc)
+    assert store.query("master-1", "salt/*", after_time) == [old_event, new_event]
+
+
+def test_store_maxlen():
+    store = EventStore(maxlen=2)
+    start_time = time.time()
+    events = [_event("master-1", f"salt/test/{idx}", start_time + idx) for idx in range(3)]
+    for event in events:
+        store.append(event)
+    assert len(store) == 2
+    assert list(store) == events[1:]
+    after_time = datetime.fromtimestamp(start_time - 1, tz=timezone.utc)
+    assert store.query("master-1", "salt/test/*", after_time) == events[1:]
+
+
+def test_store_expire():
+    store = EventStore()
+    start_time = time.time()
+    expired_event = _event("master-1", "salt/test", start_time - 10, expire_seconds=5)
+    event = _event("master-1", "salt/test", start_time)
+    store.append(expired_event)
+    store.append(event)
+    assert len(store) == 1
+    assert list(store) == [event]
+    store.expire(now=event.expire_at)
+    assert len(store) == 0
+    after_time = datetime.fromtimestamp(start_time - 20, tz=timezone.utc)
+    assert store.query("master-1", "salt/*", after_time) == []
+
+
+def test_get_events(listener):
+    start_time = time.time()
+    listener._process_event_payload(_payload("master-1", "salt/test/1", start_time))
+    listener._process_event_payload(_payload("master-1", "salt/test/2", start_time))
+    listener._process_event_payload(_payload("master-1", "salt/other", start_time))
+    events = listener.get_events([("master-1", "salt/test/*")], after_time=start_time - 1)
+    assert {event.tag for event in events} == {"salt/test/1", "salt/test/2"}
+
+
+def test_wait_for_events(listener):
+    start_time = time.time()
+    listener._process_event_payload(_payload("master-1", "salt/test/1", start_time))
+    matched_events = listener.wait_for_events(
+        [("master-1", "salt/test/*"), ("master-1", "salt/missing")],
+        after_time=start_time - 1,
+        timeout=0.1,
+    )
+    assert matched_events.found_all_events is False
+    assert [event.tag for event in matched_events] == ["salt/test/1"]
+    assert matched_events.missed == {("master-1", "salt/missing")}
+
+
+def test_wait_for_events_wakes_on_event_arrival(listener):
+    start_time = time.time()
+    timer = threading.Timer(
+        0.2, listener._process_event_payload, args=(_payload("master-1", "salt/test/1"),)
+    )
+    timer.start()
+    try:
+        matched_events = listener.wait_for_events(
+            [("master-1", "salt/test/*")], after_time=start_time - 1, timeout=30
+        )
+    finally:
+        timer.join()
+    assert matched_events.found_all_events is True
+    assert time.time() - start_time < 5
+    assert not listener.waiters
+
+
+def test_event_stamps():
+    stamp = "2023-06-01T10:20:30.123456"
+    event = Event(
+        daemon_id="minion-1", tag="salt/test", stamp=stamp, full_data={}, expire_seconds=1.5
+    )
+    expected = datetime(2023, 6, 1, 10, 20, 30, 123456, tzinfo=timezone.utc)
+    assert event.stamp_ns == int(expected.timestamp()) * 1_000_000_000 + 123456000
+    assert event.stamp == expected
+    assert event.expire_at_ns - event.stamp_ns == 1_500_000_000
+    assert event.expire_at == expected + timedelta(seconds=1.5)
+    assert event.expired
+    assert event == Event(
+        daemon_id="minion-1", tag="salt/test", stamp=expected, full_data={}, expire_seconds=1.5
+    )
+
+
+def test_packed_event_payload(listener):
+    start_time = time.time()
+    payload = _payload("master-1", "salt/test/1", start_time, foo="bar")
+    listener._process_event_payload(msgpack.unpackb(pack_event(payload), raw=False))
+    event = listener.get_events([("master-1", "salt/test/*")], after_time=start_time - 1).pop()
+    assert event.raw_data is not None
+    assert event.full_data == payload["data"]
+    assert "_stamp" in event.full_data
+    assert event.data == {"foo": "bar"}
+    assert "_stamp" not in event.data
+    with pytest.raises(KeyError):
+        event.data["_stamp"]  # pylint: disable=pointless-statement
+    # Like before the payload was kept packed, the data is a dictionary
+    event.data["foo"] = "baz"
+    assert event.data == {"foo": "baz"}
+
+
+def test_event_equality():
+    stamp = _stamp()
+
+    def _packed_event(**data):
+        return Event(
+            daemon_id="master-1",
+            tag="salt/test",
+            stamp=stamp,
+            raw_data=msgpack.packb(dict(data, _stamp=stamp)),
+            expire_seconds=120,
+        )
+
+    assert _packed_event(foo="bar") == _packed_event(foo="bar")
+    # Same daemon ID, tag and stamp, but a different payload
+    assert _packed_event(foo="bar") != _packed_event(foo="baz")
+    assert len({_packed_event(foo="bar"), _packed_event(foo="baz")}) == 2
+    assert _packed_event(foo="bar") == Event(
+        daemon_id="master-1",
+        tag="salt/test",
+        stamp=stamp,
+        full_data={"foo": "bar", "_stamp": stamp},
+        expire_seconds=120,
+    )
+
+
+def test_event_data_keyword():
+    event = Event(
+        daemon_id="master-1",
+        tag="salt/test",
+        stamp=_stamp(),
+        data={"foo": "bar"},
+        full_data={"foo": "bar", "_stamp": _stamp()},
+        expire_seconds=120,
+    )
+    assert event.data == {"foo": "bar"}
+    assert "_stamp" in event.full_data
+
+
+@pytest.fixture
+def running_listener():
+    with EventListener() as _listener:
+        yield _listener
+
+
+def test_wait_for_events_async(running_listener):
+    start_time = time.time()
+
+    async def _wait():
+        loop = asyncio.get_running_loop()
+        loop.call_later(
+            0.2, running_listener._process_event_payload, _payload("master-1", "salt/test/1")
+        )
+        return await running_listener.wait_for_events_async(
+            [("master-1", "salt/test/*")], after_time=start_time - 1, timeout=30
+        )
+
+    matched_events = asyncio.run(_wait())
+    assert matched_events.found_all_events is True
+    assert time.time() - start_time < 5
+    assert not running_listener.waiters
+
+
+def test_wait_for_events_async_timeout(running_listener):
+    matched_events = asyncio.run(
+        running_listener.wait_for_events_async([("master-1", "salt/test/*")], timeout=0.1)
+    )
+    assert matched_events.found_all_events is False
+    assert matched_events.missed == {("master-1", "salt/test/*")}
+    assert not running_listener.waiters
+
+
+def test_subscribe(running_listener):
+    async def _consume():
+        tags = []
+        subscription = running_listener.subscribe([("master-1", "salt/test/*")])
+        async with subscription:
+            for tag in ("salt/test/1", "salt/other", "salt/test/2"):
+                running_listener._process_event_payload(_payload("master-1", tag))
+            async for event in subscription:
+                tags.append(event.tag)
+                if len(tags) == 2:
+                    break
+        assert subscription.closed is True
+        return tags
+
+    assert asyncio.run(_consume()) == ["salt/test/1", "salt/test/2"]
+    assert not running_listener.waiters
+
+
+def test_subscribe_blocking_iteration(listener):
+    subscription = listener.subscribe([("master-1", "salt/test/*")])
+    timer = threading.Timer(
+        0.2, listener._process_event_payload, args=(_payload("master-1", "salt/test/1"),)
+    )
+    timer.start()
+    try:
+        with subscription:
+            event = subscription.get(timeout=30)
+    finally:
+        timer.join()
+    assert event.tag == "salt/test/1"
+    assert subscription.closed is True
+    assert subscription.get(timeout=0) is None
+    assert list(subscription) == []
+    assert not listener.waiters
+
+
+def test_subscribe_maxsize(listener):
+    with listener.subscribe([("master-1", "salt/test/*")], maxsize=2) as subscription:
+        for idx in range(5):
+            listener._process_event_payload(_payload("master-1", f"salt/test/{idx}"))
+    assert subscription.dropped == 3
+    assert [event.tag for event in subscription] == ["salt/test/3", "salt/test/4"]
+
+
+def test_forward_filter():
+    listener = EventListener(drop_tags=["salt/job/*/prog/*"])
+    assert listener._get_forward_filter() == {
+        "ctl": "filter",
+        "drop": ["salt/job/*/prog/*"],
+        "keep": [],
+    }
+    with listener.subscribe([("master-1", "salt/job/123/*")]):
+        assert listener._get_forward_filter()["keep"] == [("master-1", "salt/job/123/*")]
+        assert listener.forward_filter == listener._get_forward_filter()
+    assert listener._get_forward_filter()["keep"] == []
+
+
+def test_forward_stats(listener):
+    listener._process_control_payload(
+        {
+            "ctl": "stats",
+            "id": "minion-1",
+            "capacity": 1000,
+            "overflow": "drop-oldest",
+            "dropped": 3,
+            "spilled": 0,
+        }
+    )
+    assert listener.forward_stats == {
+        "minion-1": {"capacity": 1000, "overflow": "drop-oldest", "dropped": 3, "spilled": 0}
+    }
+
+
+class _Connection:
+    def __init__(self):
+        self.sent = []
+
+    def send_payload(self, payload):
+        self.sent.append(payload)
+
+
+def test_forward_sequence_gaps(listener):
+    connection = _Connection()
+    hello = {"ctl": "hello", "id": "minion-1", "session": "abc"}
+    listener._process_control_payload(hello, connection)
+    assert connection.sent == [{"ctl": "resume", "seq": 0}]
+    for seq in (1, 2, 2, 5):
+        listener._process_event_payload(
+            dict(_payload("minion-1", f"salt/test/{seq}"), seq=seq), connection
+        )
+    # The event forwarded twice is only stored once
+    assert len(listener.store) == 3
+    assert listener.forward_gaps == {"minion-1": 2}
+    # Reconnecting resumes after the last received event
+    listener._process_control_payload(hello, connection)
+    assert connection.sent[-1] == {"ctl": "resume", "seq": 5}
+    # Unless the daemon restarted
+    listener._process_control_payload(dict(hello, session="def"), connection)
+    assert connection.sent[-1] == {"ctl": "resume", "seq": 0}
+
+
+def test_forward_sequences_of_engines_sharing_a_daemon_id(listener):
+    # A syndic's master, minion and syndic engines all forward events under the syndic's ID
+    master_connection = _Connection()
+    minion_connection = _Connection()
+    hello = {"ctl": "hello", "id": "syndic-1"}
+    listener._process_control_payload(dict(hello, session="master"), master_connection)
+    listener._process_control_payload(dict(hello, session="minion"), minion_connection)
+    for seq in (1, 2, 3):
+        listener._process_event_payload(
+            dict(_payload("syndic-1", f"salt/master/{seq}"), seq=seq), master_connection
+        )
+    for seq in (1, 2):
+        listener._process_event_payload(
+            dict(_payload("syndic-1", f"salt/minion/{seq}"), seq=seq), minion_connection
+        )
+    assert len(listener.store) == 5
+    assert listener.forward_gaps == {}
+    # Each engine resumes from its own last event
+    listener._process_control_payload(dict(hello, session="master"), master_connection)
+    assert master_connection.sent[-1] == {"ctl": "resume", "seq": 3}
+    listener._process_control_payload(dict(hello, session="minion"), minion_connection)
+    assert minion_connection.sent[-1] == {"ctl": "resume", "seq": 2}
+
+
+def test_heartbeat_lost():
+    with EventListener() as listener:
+        heartbeat = {"ctl": "heartbeat", "id": "minion-1", "interval": 0.05}
+        listener._process_control_payload(heartbeat)
+        assert "minion-1" in listener.heartbeats
+        start = time.monotonic()
+        with pytest.raises(DaemonHeartbeatLostError, match="'minion-1'") as excinfo:
+            listener.wait_for_events([("minion-1", "salt/test")], timeout=30)
+        assert time.monotonic() - start < 5
+        assert excinfo.value.daemon_ids == ["minion-1"]
+        # Waits on other daemons are not affected
+        matched_events = listener.wait_for_events([("minion-2", "salt/test")], timeout=0.1)
+        assert not matched_events.found_all_events
+        # New waits fail right away
+        start = time.monotonic()
+        with pytest.raises(DaemonHeartbeatLostError):
+            listener.wait_for_events([("minion-1", "salt/test")], timeout=30)
+        assert time.monotonic() - start < 1
+        # Until the daemon sends heartbeats again, or is forgotten
+        listener._process_control_payload(heartbeat)
+        assert "minion-1" not in listener.lost_heartbeats
+        listener.forget_heartbeat("minion-1")
+        matched_events = listener.wait_for_events([("minion-1", "salt/test")], timeout=0.1)
+        assert not matched_events.found_all_events
+
+
+@pytest.mark.skip_on_windows
+def test_unix_socket(tmp_path):
+    socket_path = tmp_path / "events.sock"
+    with EventListener() as listener:
+        # Not enabled
+        listener.start_unix_server(socket_path)
+        assert listener.unix_socket_path is None
+    with EventListener(unix_socket=True) as listener:
+        # Too long to bind to
+        listener.start_unix_server(tmp_path / ("x" * 110) / "events.sock")
+        assert listener.unix_socket_path is None
+        listener.start_unix_server(socket_path)
+        assert listener.unix_socket_path == socket_path
+        start_time = time.time()
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(str(socket_path))
+            sock.sendall(msgpack.packb(_payload("minion-1", "salt/test")))
+            matched_events = listener.wait_for_events(
+                [("minion-1", "salt/test")], after_time=start_time - 1, timeout=5
+            )
+        assert matched_events.found_all_events
+    assert not socket_path.exists()
+
+
+def test_journal_replay(tmp_path):
+    journal_path = tmp_path / "events.journal"
+    start_time = time.time()
+    with EventListener(journal_path=journal_path) as listener:
+        listener._process_event_payload(
+            msgpack.unpackb(pack_event(_payload("minion-1", "salt/test/1", start_time)), raw=False)
+        )
+        listener._process_event_payload(_payload("minion-1", "salt/job/123/ret/minion-1"))
+        listener._process_event_payload(_payload("master-1", "salt/test/2"))
+    assert not listener.store
+
+    journal = EventJournal(path=journal_path)
+    assert journal.index_path.exists()
+    assert [entry[:2] for entry in journal.entries([("minion-1", "salt/test/*")])] == [
+        ("minion-1", "salt/test/1")
+    ]
+    assert [payload["tag"] for payload in journal.payloads()] == [
+        "salt/test/1",
+        "salt/job/123/ret/minion-1",
+        "salt/test/2",
+    ]
+    # Timestamps are accepted too
+    assert len(list(journal.entries(after_time=start_time - 1))) == 3
+    assert not list(journal.entries(after_time=time.time() + 60))
+
+    with EventListener() as listener:
+        assert listener.replay_journal(journal_path, after_time=time.time() + 60) == 0
+        assert listener.replay_journal(journal_path, patterns=[("minion-1", "*")]) == 2
+        matched_events = listener.wait_for_events(
+            [("minion-1", "salt/test/1"), ("minion-1", "salt/job/*/ret/*")],
+            after_time=start_time - 1,
+            timeout=1,
+        )
+        assert matched_events.found_all_events
+        assert not listener.get_events([("master-1", "*")], after_time=start_time - 1)
+
+
+def test_store_release():
+    store = EventStore()
+    start_time = time.time()
+    test_event = _event("master-1", "salt/test", start_time, test_nodeid="test_a")
+    session_event = _event("master-1", "salt/test", start_time)
+    store.append(test_event)
+    store.append(session_event)
+    assert store.release("test_b") == 0
+    assert store.release("test_a") == 1
+    after_time = datetime.fromtimestamp(start_time - 1, tz=timezone.utc)
+    assert store.query("master-1", "salt/*", after_time) == [session_event]
+
+
+def test_test_events_are_released(listener):
+    listener.start_test("test_a")
+    listener._process_event_payload(_payload("master-1", "salt/test", time.time() + 1))
+    # Defaults to the test window
+    assert listener.get_events([("master-1", "salt/test")])
+    listener.finish_test("test_a")
+    assert listener.current_test is None
+    assert not listener.store
+
+
+def test_test_events_are_kept():
+    listener = EventListener(release_test_events=False)
+    listener.start_test("test_a")
+    listener._process_event_payload(_payload("master-1", "salt/test"))
+    listener.finish_test("test_a")
+    assert len(listener.store) == 1
+
+
+def test_stats(listener):
+    listener._process_event_payload(_payload("minion-1", "salt/test"))
+    listener._process_event_payload(
+        msgpack.unpackb(pack_event(_payload("minion-1", "salt/test")), raw=False)
+    )
+    listener._process_event_payload(_payload("master-1", "salt/test"))
+    listener.wait_for_events([("master-1", "salt/other")], timeout=0.1)
+    stats = listener.stats()
+    assert stats["events"]["minion-1"]["count"] == 2
+    assert stats["events"]["master-1"]["count"] == 1
+    assert stats["latency"]["count"] == 3
+    assert sum(stats["latency"]["buckets"].values()) == 3
+    assert stats["store"]["size"] == 3
+    assert stats["store"]["bytes"] > 0
+    assert stats["waiters"] == 0
+    assert stats["waiter_blocked"]["count"] == 1
+    assert stats["waiter_blocked"]["max"] >= 0.1
+
+
+def test_wait_for_events_data_predicate(listener):
+    start_time = time.time()
+    listener._process_event_payload(
+        _payload(
+            "master-1", "salt/job/1/ret/minion-1", start_time, retcode=1, ret={"result": False}
+        )
+    )
+    listener._process_event_payload(
+        _payload("master-1", "salt/job/2/ret/minion-1", start_time, retcode=0, ret={"result": True})
+    )
+    matched_events = listener.wait_for_events(
+        [
+            ("master-1", "salt/job/*/ret/*", {"ret:result": True}),
+            ("master-1", "salt/job/*/ret/*", lambda data: data["retcode"] == 1),
+        ],
+        after_time=start_time - 1,
+        timeout=0.1,
+    )
+    assert matched_events.found_all_events
+    assert {event.tag for event in matched_events} == {
+        "salt/job/1/ret/minion-1",
+        "salt/job/2/ret/minion-1",
+    }
+    events = listener.get_events(
+        [("master-1", "salt/job/*/ret/*", {"retcode": 2})], after_time=start_time - 1
+    )
+    assert not events
+
+
+def test_wait_for_events_data_predicate_wakes_on_match(listener):
+    start_time = time.time()
+
+    def _fire_events():
+        time.sleep(0.2)
+        listener._process_event_payload(_payload("master-1", "salt/test", retcode=1))
+        listener._process_event_payload(_payload("master-1", "salt/test", retcode=0))
+
+    thread = threading.Thread(target=_fire_events)
+    thread.start()
+    matched_events = listener.wait_for_events(
+        [("master-1", "salt/test", {"retcode": 0})], after_time=start_time - 1, timeout=5
+    )
+    thread.join()
+    assert matched_events.found_all_events
+    assert [event.data["retcode"] for event in matched_events] == [0]
+
+
+def test_wait_for_sequence(listener):
+    start_time = time.time()
+    # Stored before waiting, and out of order
+    listener._process_event_payload(_payload("master-1", "salt/job/1/ret/minion-2", start_time + 2))
+    listener._process_event_payload(_payload("master-1", "salt/job/1/new", start_time + 1))
+    # Happened before the job was published, does not count
+    listener._process_event_payload(_payload("master-1", "salt/job/1/ret/minion-1", start_time))
+
+    def _fire_events():
+        time.sleep(0.2)
+        listener._process_event_payload(_payload("master-1", "salt/run/2/ret", start_time + 3))
+        listener._process_event_payload(
+            _payload("master-1", "salt/job/1/ret/minion-1", start_time + 4)
+        )
+        listener._process_event_payload(_payload("master-1", "salt/run/2/ret", start_time + 5))
+
+    thread = threading.Thread(target=_fire_events)
+    thread.start()
+    matched_events = listener.wait_for_sequence(
+        [
+            ("master-1", "salt/job/*/new"),
+            {("master-1", "salt/job/*/ret/minion-1"), ("master-1", "salt/job/*/ret/minion-2")},
+            ("master-1", "salt/run/*/ret"),
+        ],
+        after_time=start_time - 1,
+        timeout=5,
+    )
+    thread.join()
+    assert matched_events.found_all_events
+    assert [event.tag for event in matched_events] == [
+        "salt/job/1/new",
+        "salt/job/1/ret/minion-2",
+        "salt/job/1/ret/minion-1",
+        "salt/run/2/ret",
+    ]
+    assert matched_events.matches[-1].stamp.timestamp() == pytest.approx(start_time + 5)
+
+
+def test_wait_for_sequence_missed(listener):
+    start_time = time.time()
+    listener._process_event_payload(_payload("master-1", "salt/b", start_time))
+    listener._process_event_payload(_payload("master-1", "salt/a", start_time + 1))
+    matched_events = listener.wait_for_sequence(
+        [("master-1", "salt/a"), ("master-1", "salt/b")], after_time=start_time - 1, timeout=0.1
+    )
+    assert not matched_events.found_all_events
+    assert [event.tag for event in matched_events] == ["salt/a"]
+    assert matched_events.missed == [("master-1", "salt/b")]
+
+
+def test_wait_for_sequence_out_of_order_arrival(listener):
+    start_time = time.time()
+
+    def _fire_events():
+        time.sleep(0.2)
+        listener._process_event_payload(_payload("master-1", "salt/job/1/new", start_time))
+        listener._process_event_payload(_payload("minion-1", "salt/job/1/ret", start_time + 1))
+        # The second step's event arrives before the last event of the first step
+        listener._process_event_payload(_payload("master-1", "salt/run/2/ret", start_time + 3))
+        listener._process_event_payload(_payload("minion-2", "salt/job/1/ret", start_time + 2))
+
+    thread = threading.Thread(target=_fire_events)
+    thread.start()
+    matched_events = listener.wait_for_sequence(
+        [
+            {
+                ("master-1", "salt/job/*/new"),
+                ("minion-1", "salt/job/*/ret"),
+                ("minion-2", "salt/job/*/ret"),
+            },
+            ("master-1", "salt/run/*/ret"),
+        ],
+        after_time=start_time - 1,
+        timeout=5,
+    )
+    thread.join()
+    assert matched_events.found_all_events
+    assert [(event.daemon_id, event.tag) for event in matched_events] == [
+        ("master-1", "salt/job/1/new"),
+        ("minion-1", "salt/job/1/ret"),
+        ("minion-2", "salt/job/1/ret"),
+        ("master-1", "salt/run/2/ret"),
+    ]
+
+
+def test_broker(tmp_path):
+    with EventListener(broker=True, journal_path=tmp_path / "events.journal") as broker:
+        with EventListener(broker_address=("127.0.0.1", broker.port)) as subscriber:
+            assert subscriber.port == broker.port
+            start_time = time.time()
+            # Wait for the subscription to reach the broker
+            timeout_at = start_time + 5
+            while not broker.event_broker.subscribers and time.time() < timeout_at:
+                time.sleep(0.05)
+            assert broker.event_broker.subscribers
+            with socket.create_connection(("127.0.0.1", broker.port)) as sock:
+                sock.sendall(msgpack.packb(_payload("minion-1", "salt/test")))
+                matched_events = subscriber.wait_for_events(
+                    [("minion-1", "salt/test")], after_time=start_time - 1, timeout=5
+                )
+            assert matched_events.found_all_events
+            # The broker only relays events
+            assert not broker.store
+    assert [
+        payload["tag"] for payload in EventJournal(path=tmp_path / "events.journal").payloads()
+    ] == ["salt/test"]
+
+
+def test_broker_routes_events_to_their_worker():
+    with EventListener(broker=True) as broker:
+        broker_address = ("127.0.0.1", broker.port)
+        gw0 = EventListener(broker_address=broker_address, worker_id="gw0")
+        gw1 = EventListener(broker_address=broker_address, worker_id="gw1")
+        with gw0, gw1:
+            start_time = time.time()
+            # Wait for the subscriptions to reach the broker
+            timeout_at = start_time + 5
+            while len(broker.event_broker.subscribers) < 2 and time.time() < timeout_at:
+                time.sleep(0.05)
+            assert sorted(broker.event_broker.subscribers.values()) == ["gw0", "gw1"]
+            hello = {"ctl": "hello", "id": "minion-1", "session": "1", "worker": "gw0"}
+            with socket.create_connection(("127.0.0.1", broker.port)) as sock:
+                # A salt daemon started by the gw0 worker
+                sock.sendall(msgpack.packb(hello))
+                sock.sendall(msgpack.packb(_payload("minion-1", "salt/test")))
+                with socket.create_connection(("127.0.0.1", broker.port)) as unclaimed_sock:
+                    # The events of the daemons not started by a worker are relayed to all of them
+                    unclaimed_sock.sendall(msgpack.packb(_payload("master-1", "salt/test")))
+                    for subscriber in (gw0, gw1):
+                        matched_events = subscriber.wait_for_events(
+                            [("master-1", "salt/test")], after_time=start_time - 1, timeout=5
+                        )
+                        assert matched_events.found_all_events
+            matched_events = gw0.wait_for_events(
+                [("minion-1", "salt/test")], after_time=start_time - 1, timeout=5
+            )
+            assert matched_events.found_all_events
+            assert not gw1.get_events([("minion-1", "salt/test")], after_time=start_time - 1)
@@ -0,0 +1,233 @@
+"""
+Unit tests for the log server.
+"""
+import logging
+import time
+
+import msgpack
+import pytest
+import zmq
+
+from saltfactories.plugins.log_server import LogServer
+from saltfactories.utils.saltext.log_handlers.pytest_log_handler import ZMQHandler
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_broker():
+    handler = _ListHandler()
+    logger = logging.getLogger("saltfactories.test.broker")
+    logger.addHandler(handler)
+    broker = LogServer(log_host="127.0.0.1", log_level="debug", broker=True)
+    subscriber = LogServer(
+        log_level="debug",
+        broker_address=("127.0.0.1", broker.log_port, broker.publish_port, broker.control_port),
+    )
+    broker.start()
+    subscriber.start()
+    context = zmq.Context()
+    sender = context.socket(zmq.PUSH)  # pylint: disable=no-member
+    sender.connect(f"tcp://127.0.0.1:{broker.log_port}")
+    record = logging.makeLogRecord(
+        {"name": logger.name, "levelno": logging.INFO, "levelname": "INFO", "msg": "Relayed"}
+    )
+    try:
+        # The subscription might not have reached the broker yet
+        timeout_at = time.time() + 5
+        while not handler.records and time.time() < timeout_at:
+            sender.send(msgpack.dumps(record.__dict__))
+            time.sleep(0.1)
+        assert handler.records
+        assert handler.records[0].getMessage() == "Relayed"
+    finally:
+        logger.removeHandler(handler)
+        sender.close(1000)
+        context.term()
+        subscriber.stop()
+        broker.stop()
+
+
+def test_broker_publishes_log_records_to_their_worker():
+    broker = LogServer(log_host="127.0.0.1", log_level="debug", broker=True)
+    broker_address = ("127.0.0.1", broker.log_port, broker.publish_port, broker.control_port)
+    subscribers = {
+        worker_id: LogServer(
+            log_level="debug",
+            broker_address=broker_address,
+            consumer_id=worker_id,
+            buffer_size=10,
+        )
+        for worker_id in ("gw0", "gw1")
+    }
+    broker.start()
+    for subscriber in subscribers.values():
+        subscriber.start()
+    # The log handler of a salt daemon started by the gw0 worker
+    handler = ZMQHandler(port=broker.log_port, daemon_id="minion-1", worker_id="gw0")
+    handler.start()
+    context = zmq.Context()
+    sender = context.socket(zmq.PUSH)  # pylint: disable=no-member
+    sender.connect(f"tcp://127.0.0.1:{broker.log_port}")
+    record = logging.makeLogRecord(
+        {"name": "saltfactories.test.route", "levelno": logging.INFO, "levelname": "INFO"}
+    )
+    try:
+        # The subscriptions might not have reached the broker yet
+        timeout_at = time.time() + 5
+        while time.time() < timeout_at:
+            handler.handle(record)
+            # The log records of the daemons not started by a worker are published to all of them
+            sender.send(msgpack.dumps(dict(record.__dict__, pytest_daemon_id="master-1")))
+            time.sleep(0.1)
+            if "minion-1" in subscribers["gw0"].log_buffers and all(
+                "master-1" in subscriber.log_buffers for subscriber in subscribers.values()
+            ):
+                break
+        assert "minion-1" in subscribers["gw0"].log_buffers
+        assert "master-1" in subscribers["gw1"].log_buffers
+        assert "minion-1" not in subscribers["gw1"].log_buffers
+    finally:
+        handler.close()
+        sender.close(1000)
+        context.term()
+        for subscriber in subscribers.values():
+            subscriber.stop()
+        broker.stop()
+
+
+@pytest.mark.parametrize("dispatch_thread", [False, True])
+def test_drains_log_record_batches(dispatch_thread):
+    handler = _ListHandler()
+    logger = logging.getLogger("saltfactories.test.drain")
+    logger.addHandler(handler)
+    log_server = LogServer(
+        log_host="127.0.0.1", log_level="debug", max_batch_size=7, dispatch_thread=dispatch_thread
+    )
+    log_server.start()
+    context = zmq.Context()
+    sender = context.socket(zmq.PUSH)  # pylint: disable=no-member
+    sender.connect(f"tcp://127.0.0.1:{log_server.log_port}")
+    try:
+        for batch in range(10):
+            sender.send_multipart(
+                [
+                    msgpack.dumps(
+                        logging.makeLogRecord(
+                            {
+                                "name": logger.name,
+                                "levelno": logging.INFO,
+                                "levelname": "INFO",
+                                "msg": f"Record {batch * 5 + idx}",
+                            }
+                        ).__dict__
+                    )
+                    for idx in range(5)
+                ]
+            )
+        timeout_at = time.time() + 5
+        while len(handler.records) < 50 and time.time() < timeout_at:
+            time.sleep(0.1)
+        assert [record.getMessage() for record in handler.records] == [
+            f"Record {idx}" for idx in range(50)
+        ]
+    finally:
+        logger.removeHandler(handler)
+        sender.close(1000)
+        context.term()
+        log_server.stop()
+
+
+def test_log_level_pushdown_disabled():
+    log_server = LogServer(log_host="127.0.0.1", log_level="debug")
+    assert log_server.control_port is None
+    log_server.start()
+    try:
+        # Without a control socket, the log level requests are just recorded
+        log_server.set_log_level("info")
+    finally:
+        log_server.stop()
+
+
+def test_log_level_pushdown():
+    log_server = LogServer(log_host="127.0.0.1", log_level="debug", log_level_pushdown=True)
+    subscriber = LogServer(
+        log_level="debug",
+        broker_address=("127.0.0.1", log_server.log_port, None, log_server.control_port),
+        consumer_id="gw0",
+    )
+    log_server.start()
+    handler = ZMQHandler(
+        port=log_server.log_port, level=logging.ERROR, control_port=log_server.control_port
+    )
+    handler.start()
+
+    def wait_for_level(level):
+        timeout_at = time.time() + 5
+        while handler.level != level and time.time() < timeout_at:
+            time.sleep(0.1)
+        return handler.level
+
+    try:
+        log_server.set_log_level("info")
+        assert wait_for_level(logging.INFO) == logging.INFO
+        # The lowest log level requested by any consumer wins
+        subscriber.set_log_level(logging.DEBUG)
+        assert wait_for_level(logging.DEBUG) == logging.DEBUG
+        subscriber.reset_log_level()
+        assert wait_for_level(logging.INFO) == logging.INFO
+        log_server.reset_log_level()
+        assert wait_for_level(logging.ERROR) == logging.ERROR
+    finally:
+        handler.close()
+        log_server.stop()
+
+
+def test_buffers_daemon_log_records():
+    handler = _ListHandler()
+    logger = logging.getLogger("saltfactories.test.buffer")
+    logger.addHandler(handler)
+    log_server = LogServer(log_host="127.0.0.1", log_level="debug", buffer_size=3)
+    log_server.start()
+    context = zmq.Context()
+    sender = context.socket(zmq.PUSH)  # pylint: disable=no-member
+    sender.connect(f"tcp://127.0.0.1:{log_server.log_port}")
+
+    def record(msg, daemon_id=None):
+        record_dict = logging.makeLogRecord(
+            {"name": logger.name, "levelno": logging.INFO, "levelname": "INFO", "msg": msg}
+        ).__dict__
+        if daemon_id is not None:
+            record_dict["pytest_daemon_id"] = daemon_id
+        return msgpack.dumps(record_dict)
+
+    try:
+        sender.send_multipart(
+            [record(f"Minion {idx}", daemon_id="minion-1") for idx in range(5)]
+            + [record("Master", daemon_id="master-1"), record("Not buffered")]
+        )
+        timeout_at = time.time() + 5
+        while not handler.records and time.time() < timeout_at:
+            time.sleep(0.1)
+        # Only the log records which don't come from a salt daemon are handled right away
+        assert [record.getMessage() for record in handler.records] == ["Not buffered"]
+        # The oldest log records are dropped once the buffer is full
+        assert [record.getMessage() for record in log_server.get_log_records("minion-1")] == [
+            "Minion 2",
+            "Minion 3",
+            "Minion 4",
+        ]
+        assert log_server.get_log_records("minion-1") == []
+        log_server.flush_log_records()
+        assert [record.getMessage() for record in handler.records] == ["Not buffered", "Master"]
+    finally:
+        logger.removeHandler(handler)
+        sender.close(1000)
+        context.term()
+        log_server.stop()
@@ -0,0 +1,266 @@
+import asyncio
+import threading
+import time
+from datetime import datetime
+from datetime import timezone
+
+import msgpack
+import pytest
+
+from saltfactories.plugins.event_listener import EventListener
+from saltfactories.utils.saltext.engines.pytest_engine import PyTestEventForwardClient
+from saltfactories.utils.saltext.engines.pytest_engine import PyTestEventForwardEngine
+from saltfactories.utils.saltext.engines.pytest_engine import PyTestEventForwardQueue
+from saltfactories.utils.saltext.engines.pytest_engine import PyTestEventForwardReplayBuffer
+from saltfactories.utils.saltext.engines.pytest_engine import pack_event
+
+
+@pytest.fixture
+def engine():
+    opts = {
+        "id": "minion-1",
+        "__role": "minion",
+        "pytest-minion": {"returner_address": {"host": "127.0.0.1", "port": 1234}},
+    }
+    _engine = PyTestEventForwardEngine(opts=opts)
+    try:
+        yield _engine
+    finally:
+        _engine.loop.close()
+
+
+def test_forward_filter(engine):
+    assert engine._should_forward("salt/job/123/prog/minion-1/0") is True
+    engine._handle_control_payload(
+        {
+            "ctl": "filter",
+            "drop": ["salt/job/*/prog/*", "minion_refresh"],
+            "keep": [["minion-1", "salt/job/123/*"], ["minion-2", "salt/job/456/*"]],
+        }
+    )
+    assert engine._should_forward("salt/job/123/prog/minion-1/0") is True
+    assert engine._should_forward("salt/job/456/prog/minion-1/0") is False
+    assert engine._should_forward("minion_refresh") is False
+    assert engine._should_forward("salt/job/456/ret/minion-1") is True
+
+
+def test_client_wakes_up_on_notify():
+    received = []
+
+    class Server(asyncio.Protocol):
+        def __init__(self, got_event):
+            self.got_event = got_event
+
+        def data_received(self, data):
+            received.append(msgpack.unpackb(data))
+            self.got_event.set()
+
+    async def _run():
+        loop = asyncio.get_running_loop()
+        got_event = asyncio.Event()
+        server = await loop.create_server(lambda: Server(got_event), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        queue = PyTestEventForwardQueue("minion-1")
+        client = PyTestEventForwardClient(queue, threading.Event())
+        transport, _ = await loop.create_connection(lambda: client, "127.0.0.1", port)
+        try:
+            await client.wait_connected()
+            # Let the queue processing task find the queue empty and go idle
+            while not client._idle:
+                await asyncio.sleep(0.01)
+            start = time.perf_counter()
+            payload = {"id": "minion-1", "tag": "foo", "data": {"_stamp": "2024"}}
+            thread = threading.Thread(target=lambda: (queue.append(payload), client.notify()))
+            thread.start()
+            await asyncio.wait_for(got_event.wait(), timeout=5)
+            thread.join()
+            # The old implementation polled the queue every second
+            assert time.perf_counter() - start < 0.5
+        finally:
+            transport.close()
+            server.close()
+            await server.wait_closed()
+
+    asyncio.run(_run())
+    assert received[0]["tag"] == "foo"
+
+
+def test_client_drains_queue_in_batches():
+    async def _run():
+        queue = PyTestEventForwardQueue("minion-1")
+        client = PyTestEventForwardClient(queue, threading.Event(), flush_window=0.01)
+        for idx in range(3):
+            queue.append({"id": "minion-1", "tag": f"foo/{idx}", "data": {"_stamp": "2024"}})
+        queue.append(None)
+        queue.append({"id": "minion-1", "tag": "bar", "data": {}})
+        batch, stop = client._drain_queue()
+        assert stop is True
+        assert [msgpack.unpackb(packed)["tag"] for packed in batch] == ["foo/0", "foo/1", "foo/2"]
+        batch, stop = client._drain_queue()
+        assert stop is False
+        assert len(batch) == 1
+        assert not queue
+
+    asyncio.run(_run())
+
+
+def test_engine_flush_window(engine):
+    assert engine.flush_window == 0
+    opts = engine.opts.copy()
+    opts["pytest-minion"] = dict(opts["pytest-minion"], engine={"flush_window": 0.05})
+    other_engine = PyTestEventForwardEngine(opts=opts)
+    try:
+        assert other_engine.flush_window == 0.05
+    finally:
+        other_engine.loop.close()
+
+
+def _forward(tag):
+    return {"id": "minion-1", "tag": tag, "data": {"_stamp": "2024-01-01T00:00:00.000000"}}
+
+
+def test_queue_drop_oldest():
+    queue = PyTestEventForwardQueue("minion-1", capacity=2)
+    for tag in ("a", "b", "c"):
+        queue.append(_forward(tag))
+    assert len(queue) == 2
+    assert queue.dropped == 1
+    assert [queue.popleft()["tag"], queue.popleft()["tag"]] == ["b", "c"]
+    stats = queue.get_stats()
+    assert stats == {
+        "ctl": "stats",
+        "id": "minion-1",
+        "capacity": 2,
+        "overflow": "drop-oldest",
+        "dropped": 1,
+        "spilled": 0,
+    }
+    # Only reported again once it changes
+    assert queue.get_stats() is None
+
+
+def test_queue_block():
+    queue = PyTestEventForwardQueue("minion-1", capacity=1, overflow="block", block_timeout=0.1)
+    queue.append(_forward("a"))
+    # Nothing makes room in the queue, the event is dropped after the timeout
+    queue.append(_forward("b"))
+    assert queue.dropped == 1
+    timer = threading.Timer(0.05, queue.popleft)
+    timer.start()
+    queue.append(_forward("c"))
+    timer.join()
+    assert queue.dropped == 1
+    assert queue.popleft()["tag"] == "c"
+
+
+def test_queue_spill(tmp_path):
+    spill_path = tmp_path / "events.spill"
+    queue = PyTestEventForwardQueue(
+        "minion-1", capacity=2, overflow="spill", spill_path=str(spill_path)
+    )
+    for idx in range(5):
+        queue.append(_forward(str(idx)))
+    assert len(queue) == 5
+    assert queue.spilled == 3
+    assert queue.dropped == 0
+    assert spill_path.exists()
+    tags = []
+    while queue:
+        payload = queue.popleft()
+        if isinstance(payload, bytes):
+            payload = msgpack.unpackb(payload)
+        tags.append(payload["tag"])
+    assert tags == ["0", "1", "2", "3", "4"]
+    assert not spill_path.exists()
+
+
+def test_queue_spill_stops_after_spilled_events(tmp_path):
+    spill_path = tmp_path / "events.spill"
+    queue = PyTestEventForwardQueue(
+        "minion-1", capacity=2, overflow="spill", spill_path=str(spill_path)
+    )
+    for idx in range(5):
+        queue.append(_forward(str(idx)))
+    queue.append(None)
+    assert len(queue) == 6
+    tags = []
+    while True:
+        payload = queue.popleft()
+        if payload is None:
+            break
+        if isinstance(payload, bytes):
+            payload = msgpack.unpackb(payload)
+        tags.append(payload["tag"])
+    assert tags == ["0", "1", "2", "3", "4"]
+    assert not queue
+    assert not spill_path.exists()
+
+
+def test_queue_bad_overflow_policy():
+    with pytest.raises(ValueError, match="Unknown overflow policy"):
+        PyTestEventForwardQueue("minion-1", overflow="foo")
+
+
+def test_replay_buffer():
+    replay = PyTestEventForwardReplayBuffer(size=2)
+    packed = [replay.add(_forward("a")), replay.add(pack_event(_forward("b")))]
+    assert [msgpack.unpackb(frame)["seq"] for frame in packed] == [1, 2]
+    assert msgpack.unpackb(packed[1])["tag"] == "b"
+    replay.add(_forward("c"))
+    assert replay.last_seq == 3
+    assert [msgpack.unpackb(frame)["tag"] for frame in replay.since(0)] == ["b", "c"]
+    assert [msgpack.unpackb(frame)["tag"] for frame in replay.since(2)] == ["c"]
+    assert replay.since(3) == []
+
+
+def _forward_now(tag):
+    stamp = datetime.now(tz=timezone.utc).replace(tzinfo=None).isoformat()
+    return {"id": "minion-1", "tag": tag, "data": {"_stamp": stamp}}
+
+
+def test_engine_reconnects(engine):
+    with EventListener() as listener:
+        engine.returner_address_port = listener.port
+        engine.running_event.set()
+        engine.running_thread.start()
+        try:
+            start_time = time.time()
+            engine.queue.append(_forward_now("salt/test/1"))
+            while engine.client is None:
+                time.sleep(0.01)
+            engine.client.notify()
+            matched = listener.wait_for_events(
+                [("minion-1", "salt/test/1")], after_time=start_time - 1, timeout=5
+            )
+            assert matched.found_all_events
+            assert listener.heartbeats["minion-1"]["interval"] == engine.heartbeat_interval
+            # Simulate the event listener server crashing
+            for connection in list(listener.connections):
+                listener.loop.call_soon_threadsafe(connection.transport.close)
+            while not engine.client._disconnected.done():
+                time.sleep(0.01)
+            engine.queue.append(_forward_now("salt/test/2"))
+            matched = listener.wait_for_events(
+                [("minion-1", "salt/test/2")], after_time=start_time - 1, timeout=5
+            )
+            assert matched.found_all_events
+            assert engine.replay.last_seq == 2
+            assert listener.forward_sequences[("minion-1", engine.replay.session)] == 2
+            assert listener.forward_gaps == {}
+        finally:
+            engine.stop()
+
+
+def test_engine_tells_the_broker_its_worker(engine):
+    with EventListener(broker=True) as broker:
+        engine.returner_address_port = broker.port
+        engine.worker_id = "gw0"
+        engine.running_event.set()
+        engine.running_thread.start()
+        try:
+            timeout_at = time.time() + 5
+            while not broker.event_broker.engine_workers and time.time() < timeout_at:
+                time.sleep(0.01)
+            assert list(broker.event_broker.engine_workers.values()) == ["gw0"]
+        finally:
+            engine.stop()
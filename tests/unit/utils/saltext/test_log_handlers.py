@@ -1,8 +1,23 @@
+import logging
+import time
+
+import msgpack
 import pytest
+import zmq
 
+from saltfactories.plugins.log_server import LogServer
 from saltfactories.utils.saltext.log_handlers.pytest_log_handler import ZMQHandler
 
 
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
 def test_zmqhandler_immutable_formatter_attribute(subtests):
     handler = ZMQHandler()
     formatter = handler.formatter
@@ -20,3 +35,78 @@ def test_zmqhandler_immutable_formatter_attribute(subtests):
             del handler.formatter
 
     assert handler.formatter is formatter
+
+
+def test_zmqhandler_sends_queued_records_in_batches():
+    context = zmq.Context()
+    puller = context.socket(zmq.PULL)  # pylint: disable=no-member
+    port = puller.bind_to_random_port("tcp://127.0.0.1")
+    handler = ZMQHandler(port=port, batch_size=10)
+    logger = logging.getLogger("saltfactories.test.batches")
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        for idx in range(25):
+            logger.error("Foo %s", idx)
+        handler.flush()
+        messages = []
+        while len(messages) < 25 and puller.poll(5000):
+            batch = puller.recv_multipart()
+            assert len(batch) <= handler.batch_size
+            messages.extend(msgpack.loads(msg, raw=False)["msg"] for msg in batch)
+        assert messages == [f"Foo {idx}" for idx in range(25)]
+    finally:
+        logger.removeHandler(handler)
+        logger.propagate = True
+        handler.close()
+        puller.close(0)
+        context.term()
+
+
+def test_zmqhandler_defer_formatting():
+    handler = ZMQHandler(log_prefix="100%", defer_formatting=True)
+    record = logging.makeLogRecord({"msg": "Foo %s %d", "args": ("bar", 1)})
+    record_dict = handler.prepare(record)
+    assert record_dict["msg"] == "[100%%] Foo %s %d"
+    assert record_dict["args"] == ("bar", 1)
+
+    # Log records which can't be sent unformatted are formatted in place
+    record = logging.makeLogRecord({"msg": "Foo %s", "args": (object,)})
+    record_dict = handler.prepare(record)
+    assert record_dict["msg"] == f"[100%] Foo {object}"
+    assert record_dict["args"] is None
+
+
+def test_zmqhandler_deferred_formatting_through_log_server():
+    list_handler = _ListHandler()
+    logger = logging.getLogger("saltfactories.test.defer")
+    logger.addHandler(list_handler)
+    log_server = LogServer(log_host="127.0.0.1", log_level="debug")
+    log_server.start()
+    handler = ZMQHandler(port=log_server.log_port, log_prefix="100%", defer_formatting=True)
+    handler.start()
+    try:
+        handler.handle(
+            logging.makeLogRecord(
+                {
+                    "name": logger.name,
+                    "levelno": logging.INFO,
+                    "levelname": "INFO",
+                    "msg": "Foo %s %d",
+                    "args": ("bar", 1),
+                }
+            )
+        )
+        handler.flush()
+        timeout_at = time.time() + 5
+        while not list_handler.records and time.time() < timeout_at:
+            time.sleep(0.05)
+        assert list_handler.records
+        # The log record was only formatted by the log server
+        record = list_handler.records[0]
+        assert record.msg == "[100%%] Foo %s %d"
+        assert record.getMessage() == "[100%] Foo bar 1"
+    finally:
+        logger.removeHandler(list_handler)
+        handler.close()
+        log_server.stop()